@@ -0,0 +1,37 @@
+import argparse
+import json
+import sys
+
+from backend.benchmark import suite
+
+
+def main(arguments=None) -> int:
+    """
+    Runs the benchmark suite and writes the results as JSON, e.g.
+    ```python -m backend.benchmark --profile quick --output quick.json --compare baseline.json```
+    :return: The exit code, 1 if a regression compared to the baseline was found.
+    """
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmark",
+                                     description="Benchmarks the recommender engines on synthetic companies.")
+    parser.add_argument("--profile", choices=sorted(suite.PROFILES), default="quick")
+    parser.add_argument("--engines", nargs="+", help="The engines to benchmark (default: those of the profile).")
+    parser.add_argument("--output", help="The JSON file the results are written to "
+                                         "(default: benchmark-<profile>-<commit>.json).")
+    parser.add_argument("--compare", help="The JSON file of a baseline run to compare the median latencies with.")
+    arguments = parser.parse_args(arguments)
+
+    results = suite.run(arguments.profile, arguments.engines)
+    output = arguments.output or f"benchmark-{arguments.profile}-{results['environment']['commit'] or 'unknown'}.json"
+    suite.save(results, output)
+    print(f"Results written to {output}")
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)
+        if suite.compare(baseline, results):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+
+# Executed in a fresh interpreter, such that the measurements only contain the measured query.
+# Prints the time in seconds, the increase of the resident memory and the traced peak in MB,
+# and the number of memory blocks allocated by the query which are still alive afterwards.
+MEASURE = """
+import json, os, sys, time, tracemalloc
+
+def rss():
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+from backend.benchmark.synthetic import generate_companies, SECTORS
+from backend.code.company_store import CompanyStore
+from backend.code.location_recommender import LocationRecommender
+from backend.code.query import RecommendationQuery
+
+n, sample_size, kind = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+recommender = LocationRecommender(CompanyStore.from_companies(generate_companies(n)), download_model=False)
+tags = SECTORS[:3]
+query = RecommendationQuery(tags=tags, k=10, sample_size=sample_size, seed=0)
+# warm up the region masks and spatial indices
+recommender.recommend(RecommendationQuery(tags=tags, k=10, sample_size=1000, seed=1))
+
+before, blocks = rss(), sys.getallocatedblocks()
+tracemalloc.start()
+start = time.perf_counter()
+if kind == "query":
+    result = recommender.recommend(query)
+else:
+    # the legacy API materializes the target companies and attributes them to the recommendations
+    recommender.set_sample_size(sample_size)
+    recommender.set_target_tags(tags)
+    result = recommender.get_attributed_location_recommendations(max_companies=10)
+seconds = time.perf_counter() - start
+_, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+print(json.dumps({"seconds": seconds, "rss_mb": rss() - before, "peak_mb": peak / 2 ** 20,
+                  "blocks": sys.getallocatedblocks() - blocks}))
+"""
+
+KINDS = ["query", "legacy"]
+
+
+def measure(kind: str, n: int, sample_size: int) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run([sys.executable, "-c", MEASURE, str(n), str(sample_size), kind], cwd=root, check=True,
+                            capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=root)).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(n: int = 100000, sample_size: int = 100000):
+    """
+    Measures the time and memory of a query with sample_size Monte Carlo samples, once through
+    LocationRecommender.recommend and once through the legacy API (set_target_tags and
+    get_attributed_location_recommendations), each in a fresh process.
+    :param n: The number of (synthetic) companies.
+    :param sample_size: The number of Monte Carlo samples.
+    :return: Dictionary with the measurements of both kinds.
+    """
+    results = {"n": n, "sample_size": sample_size}
+    for kind in KINDS:
+        results[kind] = measure(kind, n, sample_size)
+        print(f"{kind:>7}: {results[kind]['seconds']:.3f} s, {results[kind]['rss_mb']:.1f} MB resident, "
+              f"{results[kind]['peak_mb']:.1f} MB traced peak, {results[kind]['blocks']} blocks retained")
+    return results
+
+
+if __name__ == '__main__':
+    run(*[int(argument) for argument in sys.argv[1:3]])
@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+
+from backend.benchmark.synthetic import generate_companies
+from backend.code.location_recommender import LocationRecommender
+from backend.code.query import RecommendationQuery, SAMPLER_UNIFORM, SAMPLER_ADAPTIVE
+
+
+def quality(recommendations) -> float:
+    """
+    :param recommendations: The recommendations of a query.
+    :return: The sum of the values of the recommendations, which the selection maximizes greedily.
+    """
+    return sum(recommendation.value for recommendation in recommendations)
+
+
+def run(n_companies: int = 20000, tags=("IT", "Finanzen"), k: int = 20, delta: float = 20,
+        sample_sizes=(1000, 3000, 10000, 30000), reference_size: int = 300000, seeds=range(5)):
+    """
+    Compares the uniform and the adaptive sampler at an equal number of value evaluations.
+    The quality of a result is the sum of the values of its recommendations, relative to the result of
+    the uniform sampler with a very large sample size.
+    :param n_companies: The number of synthetic companies.
+    :param tags: The target tags.
+    :param k: The number of recommendations.
+    :param delta: The minimum distance in km between recommendations.
+    :param sample_sizes: The numbers of samples (= value evaluations) to compare.
+    :param reference_size: The number of samples of the reference result.
+    :param seeds: The seeds each configuration is averaged over.
+    :return: List of (sampler, sample size, mean relative quality, mean seconds).
+    """
+    recommender = LocationRecommender(generate_companies(n_companies), download_model=False)
+    reference = quality(recommender.recommend(RecommendationQuery(tags=tags, delta=delta, k=k,
+                                                                  sample_size=reference_size, seed=0)))
+
+    results = []
+    print(f"{'sampler':>10} {'samples':>8} {'quality':>8} {'time [s]':>9}")
+    for sample_size in sample_sizes:
+        for sampler in (SAMPLER_UNIFORM, SAMPLER_ADAPTIVE):
+            qualities, seconds = [], []
+            for seed in seeds:
+                query = RecommendationQuery(tags=tags, delta=delta, k=k, sample_size=sample_size, seed=seed,
+                                            sampler=sampler)
+                start = time.perf_counter()
+                qualities.append(quality(recommender.recommend(query)) / reference)
+                seconds.append(time.perf_counter() - start)
+            results.append((sampler, sample_size, float(np.mean(qualities)), float(np.mean(seconds))))
+            print(f"{sampler:>10} {sample_size:>8} {results[-1][2]:>8.3f} {results[-1][3]:>9.3f}")
+
+    return results
+
+
+if __name__ == '__main__':
+    run()
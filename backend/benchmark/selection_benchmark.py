@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+
+from backend.code.location_recommender import GERMANY_LAT_MIN, GERMANY_LAT_MAX, GERMANY_LON_MIN, GERMANY_LON_MAX
+from backend.code.selection import select_distinct, select_distinct_naive
+
+
+def run(sample_size: int = 10000, delta: float = 20, max_companies=(1, 5, 10, 20, 50, 100), seed: int = 42):
+    """
+    Compares the cost of the original selection loop and the spatial non-maximum suppression.
+    The values are drawn from a smooth random surface, such that good samples are clustered as in real queries.
+    :param sample_size: The number of sampled locations.
+    :param delta: The minimum distance in km between two recommendations.
+    :param max_companies: The numbers of recommendations to benchmark.
+    :param seed: The seed of the random samples.
+    :return: List of (max_companies, naive seconds, nms seconds).
+    """
+    rng = np.random.default_rng(seed)
+    latitudes = np.round(rng.uniform(GERMANY_LAT_MIN, GERMANY_LAT_MAX, sample_size), 3)
+    longitudes = np.round(rng.uniform(GERMANY_LON_MIN, GERMANY_LON_MAX, sample_size), 3)
+    values = np.sin(latitudes * 3) + np.cos(longitudes * 2) + rng.normal(0, 0.1, sample_size)
+
+    results = []
+    print(f"{'k':>5} {'naive [s]':>10} {'nms [s]':>10} {'speedup':>8}")
+    for k in max_companies:
+        start = time.perf_counter()
+        expected = select_distinct_naive(latitudes, longitudes, values, k, delta)
+        naive = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = select_distinct(latitudes, longitudes, values, k, delta)
+        nms = time.perf_counter() - start
+
+        assert actual == expected, "selections differ"
+        results.append((k, naive, nms))
+        print(f"{k:>5} {naive:>10.4f} {nms:>10.4f} {naive / nms:>8.1f}")
+
+    return results
+
+
+if __name__ == '__main__':
+    run()
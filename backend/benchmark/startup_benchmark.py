@@ -0,0 +1,68 @@
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+
+from backend.benchmark.synthetic import generate_companies
+from backend.code.company_store import CompanyStore
+
+# Executed in a fresh interpreter, such that the memory of the measured process only contains the loaded companies.
+# Prints the loading time in seconds and the increase of the resident memory in MB.
+MEASURE = """
+import json, os, sys, time
+
+def rss():
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+from backend.code.company import Company
+from backend.code.company_store import CompanyStore
+import pickle
+
+before = rss()
+start = time.perf_counter()
+if sys.argv[1] == "pickle":
+    with open(sys.argv[2], "rb") as file:
+        companies = pickle.load(file)
+else:
+    companies = CompanyStore.load(sys.argv[2])
+    # touch the coordinates like the recommender does at startup
+    float(companies.latitudes.sum()) + float(companies.longitudes.sum())
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "rss_mb": rss() - before}))
+"""
+
+
+def measure(kind: str, path: str) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run([sys.executable, "-c", MEASURE, kind, path], cwd=root, check=True, capture_output=True,
+                            text=True, env=dict(os.environ, PYTHONPATH=root)).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(n: int = 50000):
+    """
+    Compares the startup time and resident memory of loading the companies from the pickle cache (list of Company)
+    and from the columnar CompanyStore.
+    :param n: The number of (synthetic) companies.
+    :return: Dictionary with the measurements of both formats.
+    """
+    companies = generate_companies(n)
+    with tempfile.TemporaryDirectory() as folder:
+        pickle_path = os.path.join(folder, "companies.pkl")
+        with open(pickle_path, "wb") as file:
+            pickle.dump(companies, file)
+        store_path = os.path.join(folder, "store")
+        CompanyStore.from_companies(companies).save(store_path)
+
+        results = {"n": n, "pickle": measure("pickle", pickle_path), "store": measure("store", store_path)}
+
+    for kind in ["pickle", "store"]:
+        print(f"{kind:>7}: {results[kind]['seconds']:.4f} s, {results[kind]['rss_mb']:.1f} MB resident")
+    return results
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
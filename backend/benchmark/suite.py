@@ -0,0 +1,198 @@
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from backend.benchmark.synthetic import generate_companies, SECTORS
+from backend.code import artifacts
+from backend.code.grid_recommender import GridRecommender
+from backend.code.location_recommender import LocationRecommender, ENGINE_REFERENCE, ENGINE_VECTORIZED, \
+    ENGINE_INDEXED
+from backend.code.query import RecommendationQuery, REGION_GERMANY, REGION_SAARLAND
+
+# Evaluates the value surface on a lattice instead of Monte Carlo samples (see grid_recommender.py).
+ENGINE_GRID = "grid"
+
+# A result is a regression if it is this much slower than the baseline.
+REGRESSION_THRESHOLD = 1.2
+
+# The benchmarked configurations vary one parameter at a time, starting from the baseline.
+BASELINE = {"sample_size": 10000, "tags": 1, "k": 10, "region": REGION_GERMANY, "engine": ENGINE_INDEXED}
+PROFILES = {
+    "quick": {
+        "companies": 20000,
+        "repeats": 3,
+        "sample_size": [1000, 10000],
+        "tags": [1, 3],
+        "k": [10],
+        "region": [REGION_SAARLAND, REGION_GERMANY],
+        "engine": [ENGINE_INDEXED, ENGINE_VECTORIZED, ENGINE_GRID],
+    },
+    "full": {
+        "companies": 100000,
+        "repeats": 5,
+        "sample_size": [1000, 10000, 100000],
+        "tags": [1, 3, 10],
+        "k": [1, 10, 50],
+        "region": [REGION_SAARLAND, "bavaria", REGION_GERMANY],
+        "engine": [ENGINE_INDEXED, ENGINE_VECTORIZED, ENGINE_GRID],
+    },
+}
+PARAMETERS = ["sample_size", "tags", "k", "region", "engine"]
+
+
+def configurations(profile: dict):
+    """
+    :param profile: The profile (see PROFILES).
+    :return: The configurations of the profile, i.e. the baseline and each parameter value of the profile
+    with all other parameters at their baseline value.
+    """
+    result = [dict(BASELINE)]
+    for parameter in PARAMETERS:
+        for value in profile[parameter]:
+            configuration = dict(BASELINE, **{parameter: value})
+            if configuration not in result:
+                result.append(configuration)
+    return result
+
+
+def key(configuration: dict):
+    return tuple(configuration[parameter] for parameter in PARAMETERS)
+
+
+def environment(recommender: LocationRecommender) -> dict:
+    """
+    :return: Everything the measurements depend on besides the configurations.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        # with a value predictor, the engines are not used
+        "value_predictor": bool(recommender.value_predictor.is_initialized()),
+        "artifacts": artifacts.registry().versions(),
+    }
+
+
+def measure(recommender: LocationRecommender, grid_recommender: GridRecommender, configuration: dict,
+            repeats: int) -> dict:
+    """
+    Measures the latency, throughput and peak memory of a configuration.
+    The first run is reported separately, as it fills the caches (e.g. the value surfaces of the grid search).
+    :param recommender: The recommender.
+    :param grid_recommender: The grid recommender used for ENGINE_GRID.
+    :param configuration: The configuration (see configurations).
+    :param repeats: The number of measured runs after the first one, each with another seed.
+    :return: The measurements.
+    """
+    if configuration["engine"] == ENGINE_GRID:
+        query_recommender = grid_recommender
+    else:
+        recommender.set_engine(configuration["engine"])
+        query_recommender = recommender
+
+    def run(seed: int) -> float:
+        query = RecommendationQuery(tags=SECTORS[:configuration["tags"]], region=configuration["region"], delta=20,
+                                    k=configuration["k"], sample_size=configuration["sample_size"], seed=seed)
+        start = time.perf_counter()
+        query_recommender.recommend(query)
+        return time.perf_counter() - start
+
+    first = run(0)
+    seconds = [run(seed) for seed in range(1, repeats + 1)]
+
+    # tracing slows down the allocations, hence the memory is measured in a separate run
+    tracemalloc.start()
+    run(0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = float(np.median(seconds))
+    return dict(configuration, **{
+        "first_seconds": first,
+        "median_seconds": median,
+        "p95_seconds": float(np.percentile(seconds, 95)),
+        "queries_per_second": 1 / median,
+        # the grid search does not sample
+        "samples_per_second": configuration["sample_size"] / median if query_recommender is recommender else None,
+        "peak_memory_mb": peak / 2 ** 20,
+    })
+
+
+def run(profile: str = "quick", engines=None) -> dict:
+    """
+    Runs the benchmark suite on synthetic companies (see synthetic.py), i.e. without network access.
+    :param profile: The name of the profile (see PROFILES).
+    :param engines: The engines to benchmark. Defaults to the engines of the profile.
+    ENGINE_REFERENCE is supported, but orders of magnitude slower.
+    :return: The environment and the measurements of all configurations.
+    """
+    settings = dict(PROFILES[profile])
+    if engines is not None:
+        settings["engine"] = list(engines)
+
+    recommender = LocationRecommender(generate_companies(settings["companies"]), download_model=False)
+    grid_recommender = GridRecommender(recommender)
+
+    results = []
+    print(f"{'samples':>8} {'tags':>4} {'k':>4} {'region':>10} {'engine':>10} {'first [s]':>10} {'median [s]':>10} "
+          f"{'queries/s':>10} {'peak [MB]':>10}")
+    for configuration in configurations(settings):
+        if configuration["engine"] == ENGINE_REFERENCE and configuration["sample_size"] > min(settings["sample_size"]):
+            continue
+        result = measure(recommender, grid_recommender, configuration, settings["repeats"])
+        results.append(result)
+        print(f"{result['sample_size']:>8} {result['tags']:>4} {result['k']:>4} {result['region']:>10} "
+              f"{result['engine']:>10} {result['first_seconds']:>10.4f} {result['median_seconds']:>10.4f} "
+              f"{result['queries_per_second']:>10.2f} {result['peak_memory_mb']:>10.1f}")
+
+    return {
+        "profile": profile,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "companies": settings["companies"],
+        "environment": environment(recommender),
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = REGRESSION_THRESHOLD):
+    """
+    Compares the median latencies of two benchmark runs.
+    :param baseline: The results of the baseline run (see run).
+    :param current: The results of the current run.
+    :param threshold: The slowdown factor above which a configuration is a regression.
+    :return: List of (configuration key, baseline median, current median) of the regressions.
+    """
+    baseline_results = {key(result): result for result in baseline["results"]}
+    regressions = []
+    print(f"Comparing with {baseline['environment'].get('commit')} ({baseline['timestamp']}):")
+    for result in current["results"]:
+        before = baseline_results.get(key(result))
+        if before is None:
+            continue
+        ratio = result["median_seconds"] / before["median_seconds"]
+        marker = "  REGRESSION" if ratio > threshold else ""
+        print(f"  {key(result)}: {before['median_seconds']:.4f}s -> {result['median_seconds']:.4f}s "
+              f"({ratio:.2f}x){marker}")
+        if ratio > threshold:
+            regressions.append((key(result), before["median_seconds"], result["median_seconds"]))
+    return regressions
+
+
+def save(results: dict, path: str):
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
@@ -0,0 +1,60 @@
+from typing import List
+
+import numpy as np
+
+from backend.code import config
+from backend.code.company import Company, CompanyType
+from backend.code.location_recommender import GERMANY_LAT_MIN, GERMANY_LAT_MAX, GERMANY_LON_MIN, GERMANY_LON_MAX
+
+# (latitude, longitude, relative weight) of large German cities, around which most companies are located.
+CITIES = [
+    (52.520, 13.405, 36),  # Berlin
+    (53.551, 9.994, 18),  # Hamburg
+    (48.137, 11.575, 15),  # Munich
+    (50.938, 6.960, 11),  # Cologne
+    (50.110, 8.682, 8),  # Frankfurt
+    (48.776, 9.183, 6),  # Stuttgart
+    (51.227, 6.774, 6),  # Düsseldorf
+    (51.514, 7.468, 6),  # Dortmund
+    (51.340, 12.375, 6),  # Leipzig
+    (53.079, 8.802, 6),  # Bremen
+    (51.050, 13.738, 6),  # Dresden
+    (52.376, 9.732, 5),  # Hanover
+    (49.453, 11.077, 5),  # Nuremberg
+    (49.240, 6.997, 2),  # Saarbrücken
+]
+
+# The sectors (CustomSector) of the dataset.
+SECTORS = ["Service", "Versicherung", "Immobilien", "Marketing", "Kultur / Sozial", "Vereine",
+           "Verwaltung / Beratung", "IT", "Logistik", "Einzelhandel", "Bau", "Großhandel", "Gesundheit / Fitness",
+           "Finanzen", "Tourismus / Gastro", "Maschinen / Ingenier", "Produzenten / Hersteller / Industrie",
+           "Handwerk", "Selbstständige", "Wissenschaft / Forschung"]
+
+
+def generate_companies(n: int, seed: int = 42, clustered: float = 0.7) -> List[Company]:
+    """
+    Generates synthetic companies, which are distributed similar to the dataset,
+    i.e. most companies are clustered around large cities and few sectors are much more common than others.
+    :param n: The number of companies.
+    :param seed: The seed of the random generator.
+    :param clustered: The share of companies located around cities, the others are spread over Germany.
+    :return: The list of companies.
+    """
+    rng = np.random.default_rng(seed)
+
+    weights = np.array([weight for _, _, weight in CITIES], dtype=np.float64)
+    cities = rng.choice(len(CITIES), size=n, p=weights / weights.sum())
+    latitudes = np.array([CITIES[city][0] for city in cities]) + rng.normal(0, 0.15, n)
+    longitudes = np.array([CITIES[city][1] for city in cities]) + rng.normal(0, 0.2, n)
+
+    spread = rng.random(n) >= clustered
+    latitudes[spread] = rng.uniform(GERMANY_LAT_MIN, GERMANY_LAT_MAX, spread.sum())
+    longitudes[spread] = rng.uniform(GERMANY_LON_MIN, GERMANY_LON_MAX, spread.sum())
+
+    # Zipf-like popularity of the sectors
+    popularity = 1 / np.arange(1, len(SECTORS) + 1)
+    sectors = rng.choice(len(SECTORS), size=n, p=popularity / popularity.sum())
+
+    return [Company(name=f"Company {i}", type=CompanyType.TARGET, tags=[SECTORS[sector]],
+                    latitude=config.rounding_policy(float(lat)), longitude=config.rounding_policy(float(lon)))
+            for i, (lat, lon, sector) in enumerate(zip(latitudes, longitudes, sectors))]
@@ -0,0 +1,238 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+from backend.code import config
+
+# The artifacts fetched from the hub by warmup.
+DATASET = "dataset"
+MODEL = "model"
+REPO_ID = "grasper/market-segmentation"
+REMOTE_FILES = {
+    DATASET: config.companies_table_to_load,
+    MODEL: "value_predictor_model.pkl",
+}
+
+# The folder of the artifacts and the manifest, which records the version and checksum of each artifact.
+ARTIFACTS_PATH = os.path.join(config.cache_path, "artifacts/")
+MANIFEST_FILE = "manifest.json"
+
+# The number of hex digits of the sha256 used as version (and in the file names).
+VERSION_LENGTH = 16
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactError(Exception):
+    """
+    Raised if an artifact is not available or does not match its checksum.
+    """
+
+
+def sha256(path: str) -> str:
+    """
+    :param path: The file.
+    :return: The sha256 of the file as hex string, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(2 ** 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactRegistry:
+    """
+    Local registry of the dataset and model files, such that the server starts without network access.
+    Each artifact is stored under a content-hashed file name, the manifest records its version, checksum and source.
+    The manifest is read on first use and each file is verified against its checksum the first time it is used.
+    Remote fetching only happens in fetch, i.e. in the explicit warmup command.
+    """
+
+    def __init__(self, folder: str = None):
+        """
+        :param folder: The folder of the artifacts. Defaults to the artifacts folder in the cache.
+        """
+        self.folder = folder or ARTIFACTS_PATH
+        self._manifest = None
+        # The files verified in this process, with the (size, mtime) they were verified at.
+        self._verified = {}
+        self.lock = threading.Lock()
+
+    def manifest(self) -> Dict[str, dict]:
+        """
+        :return: The entry of each artifact (file, version, sha256, size, source, added).
+        """
+        with self.lock:
+            if self._manifest is None:
+                path = os.path.join(self.folder, MANIFEST_FILE)
+                self._manifest = {}
+                if os.path.exists(path):
+                    with open(path) as file:
+                        self._manifest = json.load(file)
+            return self._manifest
+
+    def entry(self, name: str) -> Optional[dict]:
+        """
+        :param name: The name of the artifact, e.g. DATASET or MODEL.
+        :return: The manifest entry of the artifact or None, if it is not registered.
+        """
+        return self.manifest().get(name)
+
+    def version(self, name: str) -> Optional[str]:
+        """
+        :param name: The name of the artifact.
+        :return: The version of the artifact (a prefix of its sha256), or None if it is not registered.
+        Meant to be part of the keys of anything derived from the artifact.
+        """
+        entry = self.entry(name)
+        return entry["version"] if entry is not None else None
+
+    def versions(self) -> Dict[str, str]:
+        """
+        :return: The version of each registered artifact.
+        """
+        return {name: entry["version"] for name, entry in self.manifest().items()}
+
+    def add(self, name: str, path: str, source: str = None) -> dict:
+        """
+        Copies a file into the registry, replacing the previous version of the artifact.
+        :param name: The name of the artifact.
+        :param path: The file.
+        :param source: Where the file came from.
+        :return: The manifest entry of the artifact.
+        """
+        checksum = sha256(path)
+        version = checksum[:VERSION_LENGTH]
+        _, extension = os.path.splitext(os.path.basename(path))
+        file_name = f"{name}-{version}{extension}"
+        os.makedirs(self.folder, exist_ok=True)
+        target = os.path.join(self.folder, file_name)
+        if not os.path.exists(target):
+            shutil.copyfile(path, target + ".tmp")
+            os.replace(target + ".tmp", target)
+
+        entry = {"file": file_name, "version": version, "sha256": checksum, "size": os.path.getsize(target),
+                 "source": source or os.path.abspath(path), "added": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        manifest = dict(self.manifest())
+        previous = manifest.get(name)
+        manifest[name] = entry
+        self._write(manifest)
+        if previous is not None and previous["file"] != file_name:
+            os.remove(os.path.join(self.folder, previous["file"]))
+        logger.info("Registered %s version %s", name, version)
+        return entry
+
+    def path(self, name: str, verify: bool = True) -> str:
+        """
+        :param name: The name of the artifact.
+        :param verify: If True, the file is verified against its checksum (once per process, and again if it changed).
+        :return: The path of the artifact's file.
+        :raises ArtifactError: If the artifact is not registered, its file is missing or does not match its checksum.
+        """
+        entry = self.entry(name)
+        if entry is None:
+            raise ArtifactError(f"The artifact {name} is not available locally, "
+                                f"run python -m backend.code.artifacts warmup")
+        path = os.path.join(self.folder, entry["file"])
+        if not os.path.exists(path):
+            raise ArtifactError(f"The file of the artifact {name} is missing: {path}")
+        if verify:
+            stat = os.stat(path)
+            if self._verified.get(path) != (stat.st_size, stat.st_mtime):
+                if sha256(path) != entry["sha256"]:
+                    raise ArtifactError(f"The file of the artifact {name} does not match its checksum: {path}")
+                self._verified[path] = (stat.st_size, stat.st_mtime)
+        return path
+
+    def fetch(self, name: str) -> dict:
+        """
+        Downloads an artifact from the hub and registers it.
+        :param name: The name of the artifact (see REMOTE_FILES).
+        :return: The manifest entry of the artifact.
+        """
+        from huggingface_hub import hf_hub_download
+
+        path = hf_hub_download(repo_id=REPO_ID, filename=REMOTE_FILES[name])
+        return self.add(name, path, source=f"hf://{REPO_ID}/{REMOTE_FILES[name]}")
+
+    def _write(self, manifest: Dict[str, dict]):
+        path = os.path.join(self.folder, MANIFEST_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(path + ".tmp", path)
+        with self.lock:
+            self._manifest = manifest
+
+
+_registry = None
+
+
+def registry() -> ArtifactRegistry:
+    """
+    :return: The registry in the cache folder.
+    """
+    global _registry
+    if _registry is None:
+        _registry = ArtifactRegistry()
+    return _registry
+
+
+def warmup(names: List[str] = None):
+    """
+    Fetches the artifacts, which are not available locally, and prepares everything the server loads at startup
+    (the columnar company store and the exported value predictor), such that the server starts without network access.
+    :param names: The artifacts to fetch. Defaults to all of REMOTE_FILES.
+    """
+    from backend.code import preprocessing
+    from backend.code.value_predictor import load_value_predictor
+
+    for name in names or list(REMOTE_FILES):
+        if name not in REMOTE_FILES:
+            raise ArtifactError(f"Unknown artifact {name}, expected one of {list(REMOTE_FILES)}")
+        if name == DATASET and os.path.isfile(config.companies_path):
+            # a local dataset is preferred over the registry (see preprocessing.get_companies)
+            continue
+        if registry().entry(name) is None:
+            logger.info("Fetching %s...", name)
+            registry().fetch(name)
+        registry().path(name)
+
+    preprocessing.get_companies(config.companies_path)
+    load_value_predictor(download_model=True)
+
+
+def main(arguments: List[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m backend.code.artifacts",
+                                     description="Manages the local dataset and model files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warmup_parser = commands.add_parser("warmup", help="Fetch the missing artifacts and prepare the caches.")
+    warmup_parser.add_argument("names", nargs="*", help=f"The artifacts to fetch (default: {', '.join(REMOTE_FILES)}).")
+    add_parser = commands.add_parser("add", help="Register a local file as artifact.")
+    add_parser.add_argument("name")
+    add_parser.add_argument("path")
+    commands.add_parser("list", help="Show the registered artifacts.")
+    commands.add_parser("verify", help="Verify the checksums of all artifacts.")
+    arguments = parser.parse_args(arguments)
+
+    if arguments.command == "warmup":
+        warmup(arguments.names)
+    elif arguments.command == "add":
+        registry().add(arguments.name, arguments.path)
+    elif arguments.command == "verify":
+        for name in registry().manifest():
+            registry().path(name)
+            print(f"{name}: OK")
+    for name, entry in registry().manifest().items():
+        print(f"{name:10} {entry['version']} {entry['size']:>12} {entry['source']}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
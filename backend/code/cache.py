@@ -1,9 +1,12 @@
+import logging
 import os
 import pickle
 import time
 
 from backend.code import config
 
+logger = logging.getLogger(__name__)
+
 
 class Cache:
     """
@@ -14,7 +17,7 @@ class Cache:
         """
         :param id: The id of the cache. The cache will be saved in the cache folder with the name <id>.pkl
         :param default: The default value of what is stored in the cache if it does not exist yet.
-        :param verbose: If True, the cache will print information about its loading and saving.
+        :param verbose: If True, the cache will log information about its loading and saving.
         """
         cache_folder = config.cache_path
         self.hits = 0
@@ -29,15 +32,15 @@ class Cache:
 
         if os.path.exists(self.cache_file):
             if verbose:
-                print(f"Loading cache with id {id}...")
+                logger.info("Loading cache with id %s...", id)
             start = time.time()
             with open(self.cache_file, 'rb') as file:
                 self.value = pickle.load(file)
             if verbose:
-                print(f"Cache loaded in {config.rounding_policy(time.time() - start)} seconds")
+                logger.info("Cache loaded in %s seconds", config.rounding_policy(time.time() - start))
         else:
             if verbose:
-                print(f"Creating cache with id {id}...")
+                logger.info("Creating cache with id %s...", id)
             if default is None:
                 raise ValueError("default must not be None")
             self.value = default
@@ -64,11 +67,10 @@ class Cache:
 
     def report(self):
         """
-        Prints a report about the cache containing the total number of hits and misses and the hit rate.
+        Logs a report about the cache containing the total number of hits and misses and the hit rate.
         :note: Requires manuel counting of the number of hits and misses.
         """
-        print(f"Cache report for {self.cache_file}:")
-        print(f"  Hits: {self.hits}")
-        print(f"  Misses: {self.misses}")
-        print(f"  Hit rate: {self.hits / (self.hits + self.misses) * 100}%")
+        total = self.hits + self.misses
+        logger.info("Cache report for %s: hits: %d, misses: %d, hit rate: %.1f%%", self.cache_file, self.hits,
+                    self.misses, self.hits / total * 100 if total > 0 else 0)
 
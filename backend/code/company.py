@@ -1,6 +1,7 @@
 import json
+import sys
 from enum import Enum
-from typing import List
+from typing import List, Tuple
 
 
 class CompanyType(Enum):
@@ -15,11 +16,30 @@ class CompanyType(Enum):
     COMPETITOR = 3
 
 
+# The shared tuple of each combination of tags (see intern_tags).
+_interned_tags = {}
+
+
+def intern_tags(tags) -> Tuple[str, ...]:
+    """
+    :param tags: The tags of a company.
+    :return: The tags as tuple of interned strings, which is shared by all companies with the same tags.
+    """
+    tags = (tags,) if isinstance(tags, str) else tuple(tags)
+    interned = _interned_tags.get(tags)
+    if interned is None:
+        interned = _interned_tags.setdefault(tags, tuple(sys.intern(tag) for tag in tags))
+    return interned
+
+
 class Company:
     """
     A class representing a company.
+    Slotted, such that the many companies of the dataset and the recommendations take little memory.
     """
 
+    __slots__ = ("name", "type", "tags", "latitude", "longitude", "description", "targets", "color", "value")
+
     def __init__(self, name: str = None, type: CompanyType = None, tags: List[str] = None, latitude: float = None, longitude: float = None):
         """
         :param name: The companies name.
@@ -36,16 +56,14 @@ class Company:
         # ATTRIBUTES PROVIDED BY THE DATASET
         self.name: str = name
         self.type: CompanyType = type
-        # the tags of the company i.e. sectors
-        self.tags: List[str] = tags
+        # the tags of the company i.e. sectors, shared with the other companies with the same tags
+        self.tags: Tuple[str, ...] = intern_tags(tags or ())
         self.latitude: float = latitude
         self.longitude: float = longitude
-        # add more if needed...
+        # add more if needed (and add them to __slots__)...
 
         if self.name is None:
             self.name = "Unknown"
-        if self.tags is None:
-            self.tags: List[str] = []
 
         # ATTRIBUTES THAT ARE CALCULATED
         # meta information we might want to attach to the recommendation
@@ -60,7 +78,18 @@ class Company:
 
     def __str__(self):
         # print all attributes and their values
-        return str(self.__dict__)
+        return str({attribute: getattr(self, attribute) for attribute in self.__slots__})
+
+    def __setstate__(self, state):
+        # companies pickled before __slots__ have a __dict__ state, slotted ones a (None, slots) tuple
+        if isinstance(state, tuple):
+            state = state[1]
+        for attribute, value in state.items():
+            setattr(self, attribute, value)
+        self.tags = intern_tags(self.tags or ())
+        for attribute in self.__slots__:
+            if not hasattr(self, attribute):
+                setattr(self, attribute, None)
 
     def get_lat_long(self):
         return self.latitude, self.longitude
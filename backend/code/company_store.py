@@ -0,0 +1,266 @@
+import functools
+import json
+import logging
+import os
+import time
+from typing import List
+
+import numpy as np
+
+from backend.code import config
+from backend.code.company import Company, CompanyType
+
+ARRAYS = ["latitudes", "longitudes", "tag_offsets", "tag_ids", "name_offsets", "name_bytes"]
+# The inverted index from tags to companies, built when missing (e.g. in stores saved by previous versions).
+INDEX_ARRAYS = ["tag_row_offsets", "tag_rows"]
+TAGS_FILE = "tags.json"
+
+logger = logging.getLogger(__name__)
+
+
+class CompanyStore:
+    """
+    A columnar store of the companies table.
+    Coordinates, tags and names are kept in flat numpy arrays, which can be memory mapped from the cache folder,
+    such that forked workers share the pages and no Company objects are created at startup.
+    Behaves like a read-only list of Company objects, which are only materialized when accessed.
+    """
+
+    def __init__(self, latitudes, longitudes, tag_offsets, tag_ids, tags: List[str], name_offsets, name_bytes,
+                 tag_row_offsets=None, tag_rows=None):
+        """
+        :param latitudes: The latitude of each company (float32).
+        :param longitudes: The longitude of each company (float32).
+        :param tag_offsets: The tags of company i are tag_ids[tag_offsets[i]:tag_offsets[i + 1]].
+        :param tag_ids: The ids of the tags of all companies, i.e. indices into tags.
+        :param tags: The tag table, i.e. every distinct tag (sector) once.
+        :param name_offsets: The name of company i is name_bytes[name_offsets[i]:name_offsets[i + 1]] (UTF-8).
+        :param name_bytes: The names of all companies as UTF-8 encoded bytes.
+        :param tag_row_offsets: The companies with tag id t are tag_rows[tag_row_offsets[t]:tag_row_offsets[t + 1]].
+        :param tag_rows: The sorted indices of the companies with each tag. Built if not given (see build_index).
+        """
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.tag_offsets = tag_offsets
+        self.tag_ids = tag_ids
+        self.tags = list(tags)
+        self.tag_to_id = {tag: i for i, tag in enumerate(self.tags)}
+        self.name_offsets = name_offsets
+        self.name_bytes = name_bytes
+        if tag_row_offsets is None or tag_rows is None:
+            tag_row_offsets, tag_rows = self.build_index()
+        self.tag_row_offsets = tag_row_offsets
+        self.tag_rows = tag_rows
+
+    @staticmethod
+    def from_companies(companies: List[Company]):
+        """
+        Creates a store from a list of Company objects.
+        :param companies: The companies.
+        :return: The CompanyStore.
+        """
+        builder = CompanyStoreBuilder()
+        # a single string is a single tag
+        builder.append([company.latitude for company in companies], [company.longitude for company in companies],
+                       [[company.tags] if isinstance(company.tags, str) else company.tags for company in companies],
+                       [company.name for company in companies])
+        return builder.build()
+
+    def save(self, folder: str):
+        """
+        Saves the store as .npy files (and the tag table as JSON) into the given folder.
+        :param folder: The folder.
+        """
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        for name in ARRAYS + INDEX_ARRAYS:
+            np.save(os.path.join(folder, name + ".npy"), getattr(self, name))
+        # the tag table is written last, it marks the store as complete
+        with open(os.path.join(folder, TAGS_FILE), "w") as file:
+            json.dump(self.tags, file)
+
+    @staticmethod
+    def load(folder: str, mmap: bool = True):
+        """
+        Loads a store saved by ```save```. The index of a store saved without one is built and added to the folder,
+        if the folder is not writable the index is only kept in memory.
+        :param folder: The folder.
+        :param mmap: If True, the arrays are memory mapped instead of read into memory.
+        :return: The CompanyStore or None, if there is no (complete) store in the folder.
+        """
+        if not os.path.exists(os.path.join(folder, TAGS_FILE)):
+            return None
+        with open(os.path.join(folder, TAGS_FILE)) as file:
+            tags = json.load(file)
+        paths = {name: os.path.join(folder, name + ".npy") for name in ARRAYS + INDEX_ARRAYS}
+        # the index only exists if all of its files exist, they are written atomically
+        indexed = all(os.path.exists(paths[name]) for name in INDEX_ARRAYS)
+        arrays = {name: np.load(paths[name], mmap_mode="r" if mmap else None)
+                  for name in (ARRAYS + INDEX_ARRAYS if indexed else ARRAYS)}
+        store = CompanyStore(tags=tags, **arrays)
+        if not indexed:
+            # the index of a store saved by a previous version is built once and added to the store
+            try:
+                for name in INDEX_ARRAYS:
+                    # write to a temporary file first, such that concurrent loaders never see partial files
+                    with open(paths[name] + ".tmp", "wb") as file:
+                        np.save(file, getattr(store, name))
+                    os.replace(paths[name] + ".tmp", paths[name])
+            except OSError as e:
+                logger.warning("Could not add the index to the company store in %s: %s", folder, e)
+        return store
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def __getitem__(self, i: int) -> Company:
+        """
+        Materializes the i-th company.
+        :param i: The index of the company.
+        :return: The Company.
+        """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("company index out of range")
+        return Company(name=self.name(i),
+                       type=CompanyType.TARGET,
+                       tags=self.tags_of(i),
+                       latitude=config.rounding_policy(float(self.latitudes[i])),
+                       longitude=config.rounding_policy(float(self.longitudes[i])))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def name(self, i: int) -> str:
+        """
+        :param i: The index of the company.
+        :return: The name of the company.
+        """
+        name = self.name_bytes[self.name_offsets[i]:self.name_offsets[i + 1]]
+        return name.tobytes().decode("utf-8", errors="surrogatepass")
+
+    def tags_of(self, i: int) -> List[str]:
+        """
+        :param i: The index of the company.
+        :return: The tags of the company.
+        """
+        return [self.tags[tag_id] for tag_id in self.tag_ids[self.tag_offsets[i]:self.tag_offsets[i + 1]]]
+
+    def tag_owners(self) -> np.ndarray:
+        """
+        :return: For each entry of tag_ids the index of the company it belongs to.
+        """
+        return np.repeat(np.arange(len(self)), np.diff(self.tag_offsets))
+
+    def build_index(self):
+        """
+        Builds the inverted index from each tag to the sorted indices of the companies with the tag.
+        A company with a tag listed twice is indexed once.
+        :return: Tuple of (tag_row_offsets, tag_rows) (see __init__).
+        """
+        tag_ids = np.asarray(self.tag_ids, dtype=np.int64)
+        owners = self.tag_owners()
+        order = np.lexsort((owners, tag_ids))
+        tag_ids, owners = tag_ids[order], owners[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (tag_ids[1:] != tag_ids[:-1]) | (owners[1:] != owners[:-1])
+        tag_row_offsets = np.zeros(len(self.tags) + 1, dtype=np.int64)
+        tag_row_offsets[1:] = np.cumsum(np.bincount(tag_ids[first], minlength=len(self.tags)))
+        return tag_row_offsets, owners[first]
+
+    def rows_with_tag(self, tag: str) -> np.ndarray:
+        """
+        :param tag: The tag.
+        :return: The sorted indices of the companies with the tag (a view of the index).
+        """
+        tag_id = self.tag_to_id.get(tag)
+        if tag_id is None:
+            return np.zeros(0, dtype=np.int64)
+        return self.tag_rows[self.tag_row_offsets[tag_id]:self.tag_row_offsets[tag_id + 1]]
+
+    def rows_with_tags(self, tags) -> np.ndarray:
+        """
+        :param tags: The tags.
+        :return: The sorted indices of the companies with at least one of the tags, i.e. the union of their rows.
+        """
+        rows = [self.rows_with_tag(tag) for tag in set(tags)]
+        if not rows:
+            return np.zeros(0, dtype=np.int64)
+        return functools.reduce(np.union1d, rows) if len(rows) > 1 else np.asarray(rows[0])
+
+
+class CompanyStoreBuilder:
+    """
+    Builds a CompanyStore from chunks of columns, e.g. while streaming a dataset.
+    """
+
+    def __init__(self):
+        self.latitudes = []
+        self.longitudes = []
+        self.tag_counts = []
+        self.tag_ids = []
+        self.tag_to_id = {}
+        self.name_lengths = []
+        self.names = []
+
+    def __len__(self):
+        return sum(len(latitudes) for latitudes in self.latitudes)
+
+    def append(self, latitudes, longitudes, tags: List[List[str]], names: List[str]):
+        """
+        Appends a chunk of companies.
+        :param latitudes: The latitude of each company.
+        :param longitudes: The longitude of each company.
+        :param tags: The list of tags of each company.
+        :param names: The name of each company.
+        """
+        self.latitudes.append(np.asarray(latitudes, dtype=np.float32))
+        self.longitudes.append(np.asarray(longitudes, dtype=np.float32))
+
+        tag_ids = [self.tag_to_id.setdefault(tag, len(self.tag_to_id)) for company_tags in tags for tag in company_tags]
+        self.tag_ids.append(np.array(tag_ids, dtype=np.int32))
+        self.tag_counts.append(np.array([len(company_tags) for company_tags in tags], dtype=np.int64))
+
+        encoded = [str(name).encode("utf-8", errors="surrogatepass") for name in names]
+        self.name_lengths.append(np.array([len(name) for name in encoded], dtype=np.int64))
+        self.names.append(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    def build(self) -> CompanyStore:
+        """
+        :return: The CompanyStore containing all appended companies.
+        """
+        def concatenate(chunks, dtype):
+            return np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+
+        tag_offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        tag_offsets[1:] = np.cumsum(concatenate(self.tag_counts, np.int64))
+        name_offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        name_offsets[1:] = np.cumsum(concatenate(self.name_lengths, np.int64))
+        return CompanyStore(concatenate(self.latitudes, np.float32), concatenate(self.longitudes, np.float32),
+                            tag_offsets, concatenate(self.tag_ids, np.int32), list(self.tag_to_id),
+                            name_offsets, concatenate(self.names, np.uint8))
+
+
+def as_store(companies) -> CompanyStore:
+    """
+    :param companies: A CompanyStore or a list of Company objects.
+    :return: The companies as CompanyStore.
+    """
+    if isinstance(companies, CompanyStore):
+        return companies
+    return CompanyStore.from_companies(list(companies))
+
+
+def load_store(name: str):
+    """
+    Loads a store from the cache folder and reports the loading time.
+    :param name: The name of the store, i.e. its folder in the cache folder.
+    :return: The CompanyStore or None, if it does not exist.
+    """
+    start = time.time()
+    store = CompanyStore.load(os.path.join(config.cache_path, name))
+    if store is not None:
+        logger.info("Company store %s loaded in %s seconds", name, config.rounding_policy(time.time() - start))
+    return store
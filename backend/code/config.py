@@ -1,6 +1,8 @@
 # In case of changing the table, increment the version number and change the name of the table here.
 import os.path
 
+import numpy as np
+
 here = os.path.abspath(os.path.dirname(__file__))
 
 companies_table_to_load = "companies_germany.xlsx"
@@ -9,11 +11,37 @@ companies_table_to_load = "companies_germany.xlsx"
 resources_path = os.path.join(here, "../resources/")
 cache_path = os.path.join(here, "../cache/")
 companies_path = resources_path + companies_table_to_load
+# The boundaries of the federal states (see regions.py).
+regions_path = resources_path + "germany_states.geojson"
 
 
 # accuracy explained (numbers = digits after comma):
 # 1: ~11km distance between samples
 # 2: ~1km distance between samples
 # 3: <1m distance between samples
+rounding_digits = 3
+
+
 def rounding_policy(x):
-    return round(x, 3)
+    return round(x, rounding_digits)
+
+
+def rounding_policy_array(x):
+    # rounding_policy for numpy arrays
+    return np.round(x, rounding_digits)
+
+
+# Resolution (in degrees) of the precomputed value rasters (see value_raster.py).
+# 0.01 degrees are ~1km, the rounding_policy resolution (0.001 degrees) would require ~300MB per tag.
+raster_resolution = 0.01
+
+# Cell size (in degrees) of the lattice the GridRecommender evaluates the values on (see grid_recommender.py).
+grid_resolution = 0.01
+
+# The folder the shards of the generated training set are stored in (see training_set_generation.py).
+training_set_path = os.path.join(cache_path, "training_set/")
+
+# Size caps of the caches of the regular Monte Carlo simulation (see value_cache.py).
+# An entry of the values cache takes ~40 bytes on disk, an entry of the distances cache ~200 bytes in memory.
+value_cache_max_entries = 20000000
+distance_cache_max_entries = 1000000
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.code import config, preprocessing
+from backend.code.query import RecommendationQuery, REGION_GERMANY, REGION_SAARLAND
+from backend.code.scoring import haversine
+
+# The file the calibrated sample sizes are stored in.
+CALIBRATION_FILE = "sample_sizes.json"
+
+# The candidate sample sizes, the smallest one meeting the tolerances is calibrated.
+SAMPLE_SIZES = (1000, 2000, 5000, 10000, 20000, 50000, 100000)
+# The sample size of the reference result, which the results of the candidate sample sizes are compared to.
+REFERENCE_SIZE = 300000
+# The seed of the reference result, which differs from the seeds of the compared results.
+REFERENCE_SEED = 2 ** 31 - 1
+
+# A sample size meets the tolerances, if on average the values of its recommendations are at most
+# VALUE_TOLERANCE (relative) below the reference and at least MIN_STABILITY of the reference recommendations
+# are found (within half the minimum distance between recommendations).
+VALUE_TOLERANCE = 0.05
+MIN_STABILITY = 0.8
+
+logger = logging.getLogger(__name__)
+
+
+def value_error(recommendations, reference) -> float:
+    """
+    :param recommendations: The recommendations of a query.
+    :param reference: The recommendations of the same query with the reference sample size.
+    :return: How much lower the summed value of the recommendations is, relative to the reference.
+    """
+    reference_value = sum(recommendation.value for recommendation in reference)
+    if reference_value <= 0:
+        return 0.0
+    return max(1 - sum(recommendation.value for recommendation in recommendations) / reference_value, 0.0)
+
+
+def stability(recommendations, reference, radius: float) -> float:
+    """
+    :param recommendations: The recommendations of a query.
+    :param reference: The recommendations of the same query with the reference sample size.
+    :param radius: The distance in km within which a reference recommendation counts as found.
+    :return: The share of the reference recommendations that are found.
+    """
+    if not reference:
+        return 1.0
+    if not recommendations:
+        return 0.0
+    distances = haversine(np.array([r.latitude for r in reference])[:, None],
+                          np.array([r.longitude for r in reference])[:, None],
+                          np.array([r.latitude for r in recommendations])[None, :],
+                          np.array([r.longitude for r in recommendations])[None, :])
+    return float(np.mean(distances.min(axis=1) <= radius))
+
+
+def convergence(recommender, tags: List[str], region: str, k: int = 10, delta: float = 20,
+                sample_sizes=SAMPLE_SIZES, seeds=range(3), reference_size: int = REFERENCE_SIZE):
+    """
+    Measures how the error of the recommendations shrinks with the number of Monte Carlo samples.
+    :param recommender: The LocationRecommender.
+    :param tags: The target tags.
+    :param region: The region (see regions.names).
+    :param k: The number of recommendations.
+    :param delta: The minimum distance in km between recommendations.
+    :param sample_sizes: The sample sizes to measure.
+    :param seeds: The seeds each sample size is averaged over.
+    :param reference_size: The sample size of the reference result.
+    :return: List of (sample size, mean value error, mean stability) (see value_error and stability).
+    """
+    reference = recommender.recommend(RecommendationQuery(tags=tags, region=region, delta=delta, k=k,
+                                                          sample_size=reference_size, seed=REFERENCE_SEED))
+    curve = []
+    for sample_size in sample_sizes:
+        errors, stabilities = [], []
+        for seed in seeds:
+            recommendations = recommender.recommend(RecommendationQuery(tags=tags, region=region, delta=delta, k=k,
+                                                                        sample_size=sample_size, seed=seed))
+            errors.append(value_error(recommendations, reference))
+            stabilities.append(stability(recommendations, reference, delta / 2))
+        curve.append((sample_size, float(np.mean(errors)), float(np.mean(stabilities))))
+    return curve
+
+
+def calibrated_size(curve, value_tolerance: float = VALUE_TOLERANCE, min_stability: float = MIN_STABILITY) -> int:
+    """
+    :param curve: The convergence curve (see convergence).
+    :param value_tolerance: The maximum mean value error.
+    :param min_stability: The minimum mean stability.
+    :return: The smallest sample size meeting both tolerances, or the largest measured sample size.
+    """
+    for sample_size, error, stable in curve:
+        if error <= value_tolerance and stable >= min_stability:
+            return sample_size
+    return curve[-1][0]
+
+
+class SampleSizeCalibration:
+    """
+    The calibrated sample size of each tag and region, such that cheap queries are not oversampled
+    and hard ones are not undersampled (see LocationRecommender.resolve).
+    """
+
+    def __init__(self, sizes: Dict[str, Dict[str, int]], data: str = None, settings: dict = None,
+                 curves: dict = None):
+        """
+        :param sizes: The calibrated sample size per region and tag.
+        :param data: The fingerprint of the dataset the sizes were calibrated on.
+        :param settings: The parameters of the calibration (k, delta, tolerances).
+        :param curves: The convergence curves per region and tag (see convergence).
+        """
+        self.sizes = sizes
+        self.data = data
+        self.settings = settings or {}
+        self.curves = curves or {}
+
+    def sample_size(self, tags, region: str) -> Optional[int]:
+        """
+        :param tags: The target tags.
+        :param region: The region.
+        :return: The largest calibrated sample size of the tags, or None if a tag is not calibrated.
+        Regions without calibration use the sizes of Germany.
+        """
+        sizes = self.sizes.get(region, self.sizes.get(REGION_GERMANY, {}))
+        if not tags or any(tag not in sizes for tag in tags):
+            return None
+        return max(sizes[tag] for tag in tags)
+
+    def save(self, path: str = None):
+        """
+        :param path: The file. Defaults to the calibration file in the cache folder.
+        """
+        path = path or os.path.join(config.cache_path, CALIBRATION_FILE)
+        with open(path + ".tmp", "w") as file:
+            json.dump({"data": self.data, "settings": self.settings, "sizes": self.sizes, "curves": self.curves},
+                      file, indent=2)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def load(path: str = None) -> Optional["SampleSizeCalibration"]:
+        """
+        :param path: The file. Defaults to the calibration file in the cache folder.
+        :return: The calibration or None, if there is no calibration file.
+        """
+        path = path or os.path.join(config.cache_path, CALIBRATION_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            stored = json.load(file)
+        return SampleSizeCalibration(stored["sizes"], stored.get("data"), stored.get("settings"), stored.get("curves"))
+
+
+def calibrate(recommender, tags: List[str] = None, regions=(REGION_GERMANY, REGION_SAARLAND), k: int = 10,
+              delta: float = 20, value_tolerance: float = VALUE_TOLERANCE, min_stability: float = MIN_STABILITY,
+              **kwargs) -> SampleSizeCalibration:
+    """
+    Calibrates the sample size of each tag and region (see convergence and calibrated_size).
+    :param recommender: The LocationRecommender.
+    :param tags: The tags to calibrate. Defaults to all tags of the dataset.
+    :param regions: The regions to calibrate.
+    :param k: The number of recommendations.
+    :param delta: The minimum distance in km between recommendations.
+    :param value_tolerance: The maximum mean value error.
+    :param min_stability: The minimum mean stability.
+    :param kwargs: Passed to convergence (sample_sizes, seeds, reference_size).
+    :return: The calibration.
+    """
+    if tags is None:
+        tags = sorted(recommender.tag_to_coordinates)
+    sizes, curves = {}, {}
+    for region in regions:
+        sizes[region], curves[region] = {}, {}
+        for tag in tags:
+            start = time.perf_counter()
+            curve = convergence(recommender, [tag], region, k, delta, **kwargs)
+            curves[region][tag] = curve
+            sizes[region][tag] = calibrated_size(curve, value_tolerance, min_stability)
+            logger.info("%s in %s: %d samples (calibrated in %.1f seconds)", tag, region, sizes[region][tag],
+                        time.perf_counter() - start)
+
+    settings = {"k": k, "delta": delta, "value_tolerance": value_tolerance, "min_stability": min_stability}
+    return SampleSizeCalibration(sizes, recommender.data_fingerprint, settings, curves)
+
+
+if __name__ == '__main__':
+    from backend.code.location_recommender import LocationRecommender
+
+    logging.basicConfig(level=logging.INFO)
+    calibrate(LocationRecommender(preprocessing.get_companies(config.companies_path), download_model=False)).save()
@@ -7,6 +7,7 @@ from backend.code.location_recommender import LocationRecommender
 
 """
 DEPRECATED: THIS CODE IS UNCHECKED AND NOT ACTIVELY USED AS OF NOW
+The sample sizes are calibrated in convergence.py instead.
 """
 
 def calculate_variance_between_lists(list1, list2):
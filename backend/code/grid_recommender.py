@@ -0,0 +1,149 @@
+import threading
+from typing import Callable, Iterator, List
+
+import numpy as np
+
+from backend.code import config, regions
+from backend.code.company import Company, CompanyType
+from backend.code.location_recommender import LocationRecommender, Snapshot
+from backend.code.query import RecommendationQuery
+from backend.code.selection import select_distinct
+from backend.code.value_cache import LRUCache
+from backend.code.value_raster import value_raster
+
+# Values below this threshold are considered 0 (FFT round-off of empty cells).
+MIN_VALUE = 1e-6
+
+
+class GridRecommender:
+    """
+    Recommends founding locations without Monte Carlo sampling.
+    The value surface of a region is calculated on a regular lattice in one shot, by convolving the
+    target counts with the vicinity kernel (see value_raster.value_raster). The 𝛿-distinct local maxima
+    of the surface (greedily selected from all cells) are the recommendations,
+    their values are calculated exactly at the cell centers.
+    Hence, the result does not vary and the latency does not depend on the sample size.
+    Offers the same ```recommend``` and ```version``` API as the LocationRecommender.
+    """
+
+    def __init__(self, recommender: LocationRecommender, resolution: float = None, max_surfaces: int = 64):
+        """
+        :param recommender: The LocationRecommender, whose targets and M are used.
+        :param resolution: The cell size of the lattice in degrees. Defaults to config.grid_resolution.
+        :param max_surfaces: How many value surfaces (one per tag and region) are kept in memory.
+        """
+        self.recommender = recommender
+        self.resolution = resolution if resolution is not None else config.grid_resolution
+        self.surfaces = LRUCache(max_surfaces)
+        self.lock = threading.Lock()
+
+    def version(self) -> str:
+        """
+        :return: A fingerprint of everything the recommendations depend on besides the query.
+        """
+        return (f"{self.recommender.data_fingerprint}:grid:{self.resolution}:{self.recommender.M}:"
+                f"{regions.fingerprint()}")
+
+    def resolve(self, query: RecommendationQuery) -> RecommendationQuery:
+        """
+        :param query: The query.
+        :return: The query with a numeric sample size (see LocationRecommender.resolve).
+        """
+        return self.recommender.resolve(query)
+
+    def value_surface(self, tags: List[str], region: str) -> np.ndarray:
+        """
+        Calculates the (approximate) value of each cell of the lattice over the region.
+        The surfaces of the single tags are cached.
+        :param tags: The target tags.
+        :param region: The region (see regions.names).
+        :return: The value surface over the bounds of the region (rows = latitude, columns = longitude).
+        """
+        lat_min, lat_max, lon_min, lon_max = regions.get(region).bounds
+        surface = None
+        for tag in set(tags):
+            if tag not in self.recommender.tag_to_coordinates:
+                continue
+            key = (tag, region, self.recommender.M)
+            with self.lock:
+                tag_surface = self.surfaces.get(key)
+            if tag_surface is None:
+                tag_surface = value_raster(*self.recommender.tag_to_coordinates[tag], lat_min, lat_max, lon_min,
+                                           lon_max, self.resolution, self.recommender.M)
+                with self.lock:
+                    self.surfaces[key] = tag_surface
+            surface = tag_surface.copy() if surface is None else surface + tag_surface
+
+        if surface is None:
+            surface = value_raster([], [], lat_min, lat_max, lon_min, lon_max, self.resolution, self.recommender.M)
+        return surface
+
+    def cells(self, tags: List[str], region: str):
+        """
+        :param tags: The target tags.
+        :param region: The region (see regions.names).
+        :return: Tuple of (latitudes, longitudes, values) of the centers of all cells in the region
+        with a positive value. The latitudes and longitudes are rounded by the rounding policy.
+        """
+        surface = self.value_surface(tags, region)
+        rows, cols = np.nonzero(surface > MIN_VALUE)
+
+        lat_min, lat_max, lon_min, lon_max = regions.get(region).bounds
+        # the cells at the upper edges may reach beyond the bounds
+        latitudes = config.rounding_policy_array(np.minimum(lat_min + (rows + 0.5) * self.resolution, lat_max))
+        longitudes = config.rounding_policy_array(np.minimum(lon_min + (cols + 0.5) * self.resolution, lon_max))
+        inside = regions.get(region).contains(latitudes, longitudes)
+        return latitudes[inside], longitudes[inside], surface[rows[inside], cols[inside]]
+
+    def exact_values(self, latitudes, longitudes, tags: List[str]) -> np.ndarray:
+        """
+        Calculates the exact values of founding locations (see scoring.vicinity_sum).
+        :param latitudes: The latitudes of the founding locations.
+        :param longitudes: The longitudes of the founding locations.
+        :param tags: The target tags.
+        :return: The value of each founding location.
+        """
+        values = np.zeros(len(latitudes))
+        for tag in tags:
+            if tag in self.recommender.tag_to_index:
+                values += self.recommender.tag_to_index[tag].vicinity_sum(latitudes, longitudes, self.recommender.M)
+        return values
+
+    def recommend(self, query: RecommendationQuery,
+                  progress: Callable[[int, int, List[Company]], None] = None) -> List[Company]:
+        """
+        Generates a list of founding location recommendations for the given query.
+        The sample size, seed and sampler of the query are ignored (see ResultCache.normalize).
+        :param query: The parameters of the request.
+        :param progress: Optional callback, called once with (cells, cells, recommendations) at the end
+        (see LocationRecommender.recommend).
+        :return: The list of recommendations (as Company objects), ordered by value (descending).
+        """
+        latitudes, longitudes, surface_values = self.cells(list(query.tags), query.region)
+        # Each selected cell is the maximum of the remaining cells within 𝛿, i.e. a 𝛿-distinct local maximum.
+        selected = select_distinct(latitudes, longitudes, surface_values, query.k, query.delta)
+        values = self.exact_values(latitudes[selected], longitudes[selected], list(query.tags))
+
+        recommendations = []
+        for i, value in zip(selected, values):
+            recommendation = Company(latitude=float(latitudes[i]), longitude=float(longitudes[i]),
+                                     type=CompanyType.RECOMMENDATION)
+            recommendation.value = float(value)
+            recommendations.append(recommendation)
+        # the exact values may slightly change the order of the approximate surface
+        recommendations.sort(key=lambda recommendation: recommendation.value, reverse=True)
+        if progress is not None:
+            progress(len(latitudes), len(latitudes), recommendations)
+        return recommendations
+
+    def recommend_iter(self, query: RecommendationQuery, early_stop: bool = False) -> Iterator[Snapshot]:
+        """
+        The grid search is not progressive, i.e. only the final snapshot is yielded
+        (see LocationRecommender.recommend_iter).
+        :param query: The parameters of the request.
+        :param early_stop: Ignored.
+        :return: Iterator over the single snapshot.
+        """
+        query = self.resolve(query)
+        recommendations = self.recommend(query)
+        yield Snapshot(query.sample_size, query.sample_size, recommendations, 1.0, 1, True)
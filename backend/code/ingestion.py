@@ -0,0 +1,109 @@
+import os
+import time
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from backend.code import config
+from backend.code.company_store import CompanyStore, CompanyStoreBuilder
+
+# The columns of the dataset.
+NAME_COLUMN = "Company Name 1"
+COORDINATES_COLUMN = "PLZ_Coordinates"
+SECTOR_COLUMN = "CustomSector"
+
+# How many rows are read and parsed at once.
+CHUNK_SIZE = 10000
+
+
+def read_chunks(filepath: str, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Reads a dataset in chunks of rows, such that it never has to be loaded into memory as a whole.
+    Supports .xlsx (read with openpyxl in read-only mode), .csv and .parquet (requires pyarrow) files.
+    :param filepath: The path of the dataset.
+    :param chunk_size: The number of rows per chunk.
+    :return: Iterator over the chunks as DataFrames.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+
+    if extension in (".xlsx", ".xlsm"):
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    yield pd.DataFrame(chunk, columns=header)
+                    chunk = []
+            if chunk:
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            workbook.close()
+
+    elif extension == ".csv":
+        yield from pd.read_csv(filepath, chunksize=chunk_size)
+
+    elif extension == ".parquet":
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("pyarrow is required to read .parquet datasets (pip install pyarrow)")
+
+        for batch in pyarrow.parquet.ParquetFile(filepath).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+    else:
+        raise ValueError(f"unsupported dataset format {extension}, use .xlsx, .csv or .parquet")
+
+
+def parse_coordinates(coordinates: pd.Series):
+    """
+    Parses coordinates of the form "(lat, lon)" (see preprocessing.string_to_tuple) for a whole column at once.
+    :param coordinates: The column of coordinate strings.
+    :return: Tuple of (latitudes, longitudes) as numpy arrays, NaN where a coordinate could not be parsed.
+    """
+    parts = coordinates.astype(str).str.strip("() ").str.split(",", n=1, expand=True)
+    if parts.shape[1] < 2:
+        return np.full(len(coordinates), np.nan), np.full(len(coordinates), np.nan)
+    latitudes = pd.to_numeric(parts[0], errors="coerce").to_numpy(dtype=np.float64)
+    longitudes = pd.to_numeric(parts[1], errors="coerce").to_numpy(dtype=np.float64)
+    return latitudes, longitudes
+
+
+def ingest(filepath: str, chunk_size: int = CHUNK_SIZE) -> CompanyStore:
+    """
+    Streams a dataset into a CompanyStore.
+    Coordinates are parsed and validated per chunk, rows with invalid coordinates are skipped.
+    :param filepath: The path of the dataset (.xlsx, .csv or .parquet).
+    :param chunk_size: The number of rows parsed at once.
+    :return: The CompanyStore.
+    """
+    start = time.time()
+    builder = CompanyStoreBuilder()
+    skipped = 0
+
+    for chunk in read_chunks(filepath, chunk_size):
+        latitudes, longitudes = parse_coordinates(chunk[COORDINATES_COLUMN])
+        latitudes = config.rounding_policy_array(latitudes)
+        longitudes = config.rounding_policy_array(longitudes)
+
+        # verify that the coordinates are in valid range (comparisons with NaN are False)
+        valid = (latitudes >= -90) & (latitudes <= 90) & (longitudes >= -180) & (longitudes <= 180)
+        names = chunk[NAME_COLUMN].where(chunk[NAME_COLUMN].notna(), "Unknown")
+        for name in names[~valid]:
+            print(f"invalid coordinates for company {name} --> skipping")
+        skipped += int((~valid).sum())
+
+        # by default, we assume that all companies are targets of their sector
+        sectors = chunk[SECTOR_COLUMN][valid]
+        builder.append(latitudes[valid], longitudes[valid],
+                       [[sector] if isinstance(sector, str) else [] for sector in sectors],
+                       names[valid].tolist())
+
+    print(f"Ingested {len(builder)} companies (skipped {skipped}) in {config.rounding_policy(time.time() - start)} seconds")
+    return builder.build()
@@ -0,0 +1,328 @@
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List
+
+from backend.code.company import Company
+from backend.code.query import RecommendationQuery, REGION_GERMANY
+from backend.code.result_cache import ResultCache
+
+# The states of a job.
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = [DONE, FAILED, CANCELLED]
+
+# Lanes with separate workers, such that heavy (national or very large) queries cannot starve the interactive ones.
+LANE_INTERACTIVE = "interactive"
+LANE_HEAVY = "heavy"
+# Queries with at least this many samples are heavy, regardless of the region.
+HEAVY_SAMPLE_SIZE = 100000
+
+
+class QueueFullError(Exception):
+    """
+    Raised if a job is submitted to a lane whose queue is full.
+    """
+
+
+class JobCancelled(Exception):
+    """
+    Raised in the progress callback of a cancelled job to abort the recommendation.
+    """
+
+
+def lane_of(query: RecommendationQuery) -> str:
+    """
+    :param query: The query.
+    :return: The lane the query runs in (LANE_INTERACTIVE or LANE_HEAVY).
+    """
+    if query.region == REGION_GERMANY or query.sample_size >= HEAVY_SAMPLE_SIZE:
+        return LANE_HEAVY
+    return LANE_INTERACTIVE
+
+
+class Job:
+    """
+    A recommendation query running in the background.
+    The state, progress and result are updated by the worker and read by the API (see to_map and states).
+    """
+
+    def __init__(self, query: RecommendationQuery, lane: str, key, early_stop: bool = False):
+        """
+        :param query: The query.
+        :param lane: The lane the job runs in.
+        :param key: The key identical in-flight queries are de-duplicated by.
+        :param early_stop: If True, the job stops once the recommendations are stable (see recommend_iter).
+        """
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.lane = lane
+        self.key = key
+        self.early_stop = early_stop
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+        # progress, the recommendations are the current best ones until the job is done
+        self.scored = 0
+        self.total = query.sample_size
+        self.recommendations: List[Company] = []
+        self.stability = 0.0
+        self.error = None
+
+        self.future = None
+        self.cancel_requested = threading.Event()
+        self.lock = threading.Lock()
+        # notified with every update of the state, the version counts the updates (see states)
+        self.changed = threading.Condition(self.lock)
+        self.version = 0
+        # the number of open streams of the job, a job nobody else asked for is cancelled with its last stream
+        self.followers = 0
+        self.pinned = False
+
+    def report(self, scored: int, total: int, recommendations: List[Company], stability: float = None):
+        """
+        The progress callback of the recommender (see LocationRecommender.recommend).
+        :raises JobCancelled: If the job was cancelled.
+        """
+        if self.cancel_requested.is_set():
+            raise JobCancelled()
+        with self.lock:
+            self.scored = scored
+            self.total = total
+            self.recommendations = recommendations
+            if stability is not None:
+                self.stability = stability
+            self._changed()
+
+    def is_finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_map(self) -> dict:
+        """
+        :return: The state of the job as JSON serializable dict, a superset of Snapshot.to_map.
+        """
+        with self.lock:
+            return self._map()
+
+    def states(self) -> Iterator[dict]:
+        """
+        Yields the state of the job (see to_map) each time it changes, until the job is finished.
+        Updates that happen while the previous state is consumed are merged, i.e. a slow reader gets the latest one.
+        :return: Iterator over the states, the last one is finished.
+        """
+        version = -1
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.version != version)
+                version = self.version
+                state = self._map()
+                finished = self.is_finished()
+            yield state
+            if finished:
+                return
+
+    def _changed(self):
+        # requires the lock
+        self.version += 1
+        self.changed.notify_all()
+
+    def _map(self) -> dict:
+        # requires the lock
+        return {
+            "id": self.id,
+            "status": self.status,
+            "lane": self.lane,
+            "scored": self.scored,
+            "total": self.total,
+            "stability": self.stability,
+            "done": self.is_finished(),
+            "recommendations": [recommendation.to_map() for recommendation in self.recommendations],
+            "error": self.error,
+            "elapsed": (self.finished or time.time()) - (self.started or self.created),
+        }
+
+
+class JobManager:
+    """
+    Runs recommendation queries in the background and keeps their state, such that a request only submits
+    a query and polls its progress instead of blocking until the Monte Carlo simulation is done.
+    Each lane has its own bounded thread pool and queue limit (see lane_of).
+    Identical queries that are queued or running are de-duplicated, i.e. share one job.
+    """
+
+    def __init__(self, recommender, result_cache: ResultCache = None, lanes: Dict[str, int] = None,
+                 max_queued: int = 16, max_jobs: int = 1024):
+        """
+        :param recommender: The LocationRecommender or GridRecommender.
+        :param result_cache: The result cache the jobs use, if any.
+        :param lanes: The number of worker threads per lane.
+        :param max_queued: The maximum number of queued (not yet running) jobs per lane.
+        :param max_jobs: How many finished jobs are kept for polling.
+        """
+        self.recommender = recommender
+        self.result_cache = result_cache
+        if lanes is None:
+            lanes = {LANE_INTERACTIVE: 2, LANE_HEAVY: 1}
+        self.executors = {lane: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"jobs-{lane}")
+                          for lane, workers in lanes.items()}
+        self.max_queued = max_queued
+        self.max_jobs = max_jobs
+
+        self.jobs = OrderedDict()
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def submit(self, query: RecommendationQuery, early_stop: bool = False, followed: bool = False) -> Job:
+        """
+        Submits a query, or returns the job of an identical query that is queued or running.
+        :param query: The query.
+        :param early_stop: If True, the job stops once the recommendations are stable (see recommend_iter).
+        :param followed: If True, the caller follows the job (see follow) and it is cancelled
+        once nobody follows it anymore. Otherwise, the job runs until it is finished or cancelled explicitly.
+        :return: The job.
+        :raises QueueFullError: If the queue of the query's lane is full.
+        """
+        query = self.recommender.resolve(query)
+        lane = lane_of(query)
+        if lane not in self.executors:
+            lane = LANE_INTERACTIVE
+        # unseeded queries are random, i.e. never identical
+        key = None
+        key_query = ResultCache.normalize(self.recommender, query)
+        if key_query.seed is not None:
+            key = (ResultCache.key(key_query, self.recommender.version()), query.k, early_stop)
+
+        with self.lock:
+            if key is not None and key in self.in_flight:
+                job = self.in_flight[key]
+                job.pinned = job.pinned or not followed
+                return job
+
+            queued = sum(1 for job in self.jobs.values() if job.lane == lane and job.status == QUEUED)
+            if queued >= self.max_queued:
+                raise QueueFullError(f"The {lane} queue is full ({queued} jobs).")
+
+            job = Job(query, lane, key, early_stop)
+            job.pinned = not followed
+            self.jobs[job.id] = job
+            if key is not None:
+                self.in_flight[key] = job
+            self._evict()
+            job.future = self.executors[lane].submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """
+        :param job_id: The id of the job.
+        :return: The job or None, if there is no such job (anymore).
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def follow(self, job: Job) -> Iterator[dict]:
+        """
+        Yields the state of a job each time it changes, until it is finished (see Job.states).
+        If the last follower stops following a job submitted with followed=True before it is finished,
+        e.g. because the client closed the stream, the job is cancelled.
+        :param job: The job.
+        :return: Iterator over the states of the job, the last one is finished.
+        """
+        with self.lock:
+            job.followers += 1
+        try:
+            yield from job.states()
+        finally:
+            with self.lock:
+                job.followers -= 1
+                abandoned = job.followers == 0 and not job.pinned
+            if abandoned and not job.is_finished():
+                self.cancel(job.id)
+
+    def cancel(self, job_id: str) -> Job:
+        """
+        Cancels a job. A queued job never starts, a running job stops at its next progress report.
+        Identical queries submitted afterwards get a new job.
+        :param job_id: The id of the job.
+        :return: The job or None, if there is no such job (anymore).
+        """
+        job = self.get(job_id)
+        if job is None or job.is_finished():
+            return job
+        job.cancel_requested.set()
+        self._release(job)
+        if job.future.cancel():
+            self._finish(job, CANCELLED)
+        return job
+
+    def shutdown(self):
+        """
+        Cancels all queued jobs and waits for the running ones.
+        """
+        for executor in self.executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, job: Job):
+        if job.cancel_requested.is_set():
+            self._finish(job, CANCELLED)
+            return
+        with job.lock:
+            job.status = RUNNING
+            job.started = time.time()
+            job._changed()
+        try:
+            if job.early_stop:
+                recommendations = []
+                for snapshot in self._snapshots(job.query):
+                    job.report(snapshot.scored, snapshot.total, snapshot.recommendations, snapshot.stability)
+                    recommendations = snapshot.recommendations
+            elif self.result_cache is not None:
+                recommendations = self.result_cache.recommend(self.recommender, job.query, progress=job.report)
+            else:
+                recommendations = self.recommender.recommend(job.query, progress=job.report)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as e:
+            self._finish(job, FAILED, error=f"{type(e).__name__}: {e}")
+        else:
+            self._finish(job, DONE, recommendations=recommendations)
+
+    def _snapshots(self, query: RecommendationQuery):
+        if self.result_cache is not None:
+            return self.result_cache.recommend_iter(self.recommender, query, early_stop=True)
+        return self.recommender.recommend_iter(query, early_stop=True)
+
+    def _finish(self, job: Job, status: str, recommendations: List[Company] = None, error: str = None):
+        with job.lock:
+            job.status = status
+            job.finished = time.time()
+            job.error = error
+            if recommendations is not None:
+                job.recommendations = recommendations
+                # a job that stopped early reported how many samples it scored
+                if not job.early_stop:
+                    job.scored = job.total
+            job._changed()
+        self._release(job)
+
+    def _release(self, job: Job):
+        # the job no longer serves identical queries
+        with self.lock:
+            if job.key is not None and self.in_flight.get(job.key) is job:
+                del self.in_flight[job.key]
+
+    def _evict(self):
+        # only finished jobs are evicted, the oldest first
+        excess = len(self.jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in list(itertools.islice((job_id for job_id, job in self.jobs.items() if job.is_finished()),
+                                            excess)):
+            del self.jobs[job_id]
@@ -1,43 +1,140 @@
-import random
+import hashlib
+import logging
+import threading
 import time
-from typing import List
+from dataclasses import dataclass, replace
+from typing import Callable, Iterator, List
 
+import numpy as np
 from geopy.distance import geodesic
 
-from backend.code import config
-from backend.code.cache import Cache
+from backend.code import config, metrics, regions, sampling, scoring
 from backend.code.company import Company, CompanyType
-from backend.code.value_predictor import ValuePredictor
-
-# BoundingBox could be made a class in the future.
-# Rectangular bounds of Germany
+from backend.code.company_store import as_store
+from backend.code.parallel import ParallelSampler
+from backend.code.query import RecommendationQuery, REGION_GERMANY, REGION_SAARLAND, SAMPLER_UNIFORM, \
+    SAMPLER_ADAPTIVE, SAMPLE_SIZE_AUTO
+from backend.code.selection import select_distinct
+from backend.code.spatial_index import SpatialIndex
+from backend.code.value_cache import LRUCache, ValueCache, quantize
+from backend.code.value_predictor import load_value_predictor
+
+# Rectangular bounds of Germany, e.g. of the precomputed value rasters.
+# The regions themselves are given by their boundaries (see regions.py).
 GERMANY_LAT_MIN = 47.2701
 GERMANY_LAT_MAX = 55.0991
 GERMANY_LON_MIN = 5.8663
 GERMANY_LON_MAX = 15.0419
 
-# Rectangular bounds of Saarland
-SAARLAND_LAT_MIN = 49.1769
-SAARLAND_LAT_MAX = 49.657
-SAARLAND_LON_MIN = 6.2032
-SAARLAND_LON_MAX = 7.5014
+# Engines to calculate the value of the sampled founding locations (without a value predictor).
+# REFERENCE: Calculates the value per (sample, target) pair using the geodesic distance. Slow, but exact.
+# VECTORIZED: Calculates the values of all samples at once using the haversine distance (see scoring.py).
+# INDEXED: Like VECTORIZED, but each sample only visits the targets within M (see spatial_index.py).
+# RASTER: Looks up the values in precomputed per tag value rasters (see value_raster.py).
+ENGINE_REFERENCE = "reference"
+ENGINE_VECTORIZED = "vectorized"
+ENGINE_INDEXED = "indexed"
+ENGINE_RASTER = "raster"
+ENGINES = [ENGINE_REFERENCE, ENGINE_VECTORIZED, ENGINE_INDEXED, ENGINE_RASTER]
+
+logger = logging.getLogger(__name__)
+
+# Progressive recommendations (see recommend_iter): The first batch is small, such that the first result
+# is available quickly regardless of the sample size. Later batches are sized to take REPORT_INTERVAL seconds.
+FIRST_BATCH_SIZE = 1000
+REPORT_INTERVAL = 0.5  # seconds
+# With early stopping, the recommendation stops once the top-k did not change for this many batches.
+STABLE_BATCHES = 3
+
+
+@dataclass
+class Snapshot:
+    """
+    The intermediate result of a progressive recommendation (see LocationRecommender.recommend_iter).
+    """
+    # The number of samples scored so far and the sample size.
+    scored: int
+    total: int
+    # The best 𝛿-distinct recommendations among the scored samples.
+    recommendations: List[Company]
+    # Share of the recommendations that were already recommended in the previous snapshot (convergence estimate).
+    stability: float
+    # The number of snapshots in a row (including this one) in which the recommendations did not change.
+    stable_batches: int
+    # True for the last snapshot, i.e. if all samples are scored or the recommendation stopped early.
+    done: bool
+
+    def to_map(self) -> dict:
+        return {
+            "scored": self.scored,
+            "total": self.total,
+            "stability": self.stability,
+            "done": self.done,
+            "recommendations": [recommendation.to_map() for recommendation in self.recommendations],
+        }
 
 
 class LocationRecommender:
     """
     Recommends locations for a company based on the locations of companies with given tags.
+    The companies and everything derived from them (indexes, model) are only read after construction,
+    such that ```recommend``` can be called from multiple threads in parallel.
+    The setters only configure the legacy ```get_location_recommendations``` API.
     """
 
-    def __init__(self, companies: List[Company], sample_size: int = 100000, download_model=True):
+    def __init__(self, companies: List[Company], sample_size: int = 100000, download_model=True,
+                 engine: str = ENGINE_INDEXED, record_values: bool = False):
         """
         :param companies: All companies in the dataset, which influence the value of a founding location.
+        Either a CompanyStore or a list of Company objects.
         :param sample_size: How many Monte Carlo samples to use for the recommendations.
         :param download_model: If True, download the model from the cloud. If False, use a self trained model.
+        :param engine: The engine used to calculate values if no value predictor is available (see ENGINES).
+        :param record_values: If True, the calculated values are stored in the values cache,
+        which is the training set of the value predictor. Not thread-safe.
         """
-        self.companies = companies
+        self.companies = as_store(companies)
         self.target_tags = []
         self.targets = []
-        self.target_tag_to_companies = {}
+
+        # The indices of the companies with a tag, their coordinates and a spatial index over them.
+        self.tag_to_company_indices = {}
+        self.tag_to_coordinates = {}
+        self.tag_to_index = {}
+        for tag in self.companies.tags:
+            # the inverted index of the store, i.e. the sorted indices of the companies with the tag
+            self.tag_to_company_indices[tag] = self.companies.rows_with_tag(tag)
+            self.tag_to_coordinates[tag] = (
+                np.asarray(self.companies.latitudes[self.tag_to_company_indices[tag]], dtype=np.float64),
+                np.asarray(self.companies.longitudes[self.tag_to_company_indices[tag]], dtype=np.float64))
+            self.tag_to_index[tag] = SpatialIndex(*self.tag_to_coordinates[tag])
+        # The companies with a tag as Company objects, only materialized for the reference engine.
+        self.tag_to_companies = {}
+
+        # Fingerprint of the dataset, used to key cached results (see version).
+        data_hash = hashlib.sha1()
+        for tag in sorted(self.tag_to_coordinates):
+            data_hash.update(tag.encode())
+            for coordinates in self.tag_to_coordinates[tag]:
+                data_hash.update(coordinates.tobytes())
+        self.data_fingerprint = data_hash.hexdigest()
+
+        self.record_values = record_values
+
+        # The number of worker processes the Monte Carlo samples are sharded across (see parallel.ParallelSampler).
+        self.workers = 1
+        self.parallel_sampler = None
+        self.parallel_lock = threading.Lock()
+
+        # The densities of the adaptive sampler (see density), shared by the threads serving requests.
+        self.densities = LRUCache(64)
+        self.densities_lock = threading.Lock()
+
+        # The precomputed value rasters used by ENGINE_RASTER (see value_raster.ValueRasters).
+        self.value_rasters = None
+
+        self.engine = None
+        self.set_engine(engine)
 
         # How far recommendations should be apart from each other.
         # 𝛿-distinctiveness in the paper
@@ -48,10 +145,8 @@ class LocationRecommender:
         self.display_radius = 1  # in km
 
         self.sample_size = sample_size
-        self.miss_time = 0
-
-        self.hits = 0
-        self.misses = 0
+        # The calibrated sample sizes per tag and region (see convergence.py and resolve).
+        self.sample_size_calibration = None
 
         self.M = 30
 
@@ -60,32 +155,68 @@ class LocationRecommender:
 
         # The predictor for the value of a founding location.
         # If available, we use MLP assisted Monte Carlo. Otherwise, we use the simple Monte Carlo.
-        self.value_predictor: ValuePredictor = ValuePredictor(download_model=download_model)
-        if not self.value_predictor.is_initialized():
-            # Speedup Monte Carlo by caching distances and values.
-            self.cache = Cache("distances", {})
-            self.distances = self.cache.value
-            self.value_cache = Cache("values", {})
-            self.values = self.value_cache.value
-        else:
-            self.distances = {}
+        self.value_predictor = load_value_predictor(download_model=download_model)
+        # Speedup Monte Carlo by caching distances and values, the values cache is opened on first use (see values).
+        self._values = None
+        self.values_lock = threading.Lock()
+        self.distances = LRUCache(config.distance_cache_max_entries)
+
+    @property
+    def values(self) -> ValueCache:
+        """
+        The persistent values cache, used by the reference engine and to record values (see record_values).
+        It is opened on first use, such that recommenders which never use it do not create it in the cache folder.
+        """
+        with self.values_lock:
+            if self._values is None:
+                self._values = ValueCache("values")
+            return self._values
+
+    @values.setter
+    def values(self, values: ValueCache):
+        with self.values_lock:
+            self._values = values
+
+    def version(self) -> str:
+        """
+        :return: A fingerprint of everything the recommendations depend on besides the query,
+        i.e. the dataset, the value predictor, the engine, M and the regions. Used to key cached results.
+        """
+        version = f"{self.data_fingerprint}:{self.value_predictor.fingerprint()}:{self.engine}:{self.M}"
+        version += f":{regions.fingerprint()}"
+        if self.engine == ENGINE_RASTER:
+            version += f":{self.value_rasters.resolution}"
+        # the samples depend on the number of shards
+        if self.uses_workers():
+            version += f":workers={self.workers}"
+        return version
 
     def set_target_tags(self, target_tags: List[str]):
         """
         Sets the target tags, i.e. sectors of companies that are considered for the recommendations.
         :param target_tags: The list of target tags.
         """
-        self.target_tags = target_tags
+        self.target_tags = list(target_tags)
         # all companies that have at least one of the target tags
-        self.targets = [company for company in self.companies if set(company.tags).intersection(set(target_tags))]
+        self.targets = [self.companies[i] for i in self.target_indices(self.target_tags)]
 
-        for company in self.targets:
-            for tag in company.tags:
-                if tag not in self.target_tag_to_companies:
-                    self.target_tag_to_companies[tag] = []
-                self.target_tag_to_companies[tag].append(company)
+        logger.debug("Found %d target companies", len(self.targets))
 
-        print("Found", len(self.targets), "target companies")
+    def companies_with_tag(self, tag: str) -> List[Company]:
+        """
+        :param tag: The tag.
+        :return: All companies with the tag as Company objects.
+        """
+        if tag not in self.tag_to_companies:
+            self.tag_to_companies[tag] = [self.companies[i] for i in self.tag_to_company_indices.get(tag, [])]
+        return self.tag_to_companies[tag]
+
+    def target_indices(self, target_tags) -> np.ndarray:
+        """
+        :param target_tags: The target tags.
+        :return: The sorted indices of all companies that have at least one of the target tags.
+        """
+        return self.companies.rows_with_tags(target_tags)
 
     def set_detailed_view_radius(self, radius: int):
         """
@@ -108,6 +239,50 @@ class LocationRecommender:
         """
         self.saarland_only = saarland_only
 
+    def set_engine(self, engine: str):
+        """
+        Sets the engine used to calculate the values of the sampled founding locations.
+        :param engine: One of ENGINES.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}, got {engine}")
+        if engine == ENGINE_RASTER and self.value_rasters is None:
+            raise ValueError("value rasters must be set before using the raster engine")
+        self.engine = engine
+
+    def set_value_rasters(self, value_rasters):
+        """
+        Sets the precomputed value rasters and switches to the raster engine.
+        :param value_rasters: The value rasters (see value_raster.ValueRasters).
+        """
+        if value_rasters.M != self.M:
+            raise ValueError(f"value rasters were built with M={value_rasters.M}, but M={self.M} is used")
+        self.value_rasters = value_rasters
+        self.set_engine(ENGINE_RASTER)
+
+    def set_workers(self, workers: int):
+        """
+        Sets the number of worker processes the Monte Carlo samples are sharded across.
+        The recommendations are deterministic for a given seed and number of workers,
+        but differ from the recommendations of a single process.
+        :param workers: The number of worker processes. 1 disables the process pool.
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if self.parallel_sampler is not None:
+            self.parallel_sampler.close()
+            self.parallel_sampler = None
+        self.workers = workers
+
+    def uses_workers(self) -> bool:
+        """
+        :return: True, if the samples are sharded across worker processes.
+        The reference and raster engines and recording values always run in this process.
+        """
+        if self.workers <= 1 or self.record_values:
+            return False
+        return self.value_predictor.is_initialized() or self.engine in (ENGINE_VECTORIZED, ENGINE_INDEXED)
+
     def set_M(self, M: int):
         """
         Sets the maximum distance in km to consider for the value of a founding location.
@@ -115,36 +290,41 @@ class LocationRecommender:
         """
         self.M = M
 
-    def value(self, recommended_company, target_company: Company = None) -> float:
+    def value(self, recommended_company, target_company: Company = None, target_tags: List[str] = None) -> float:
         """
         Calculates the value of the founding location of a company.
         :param recommended_company: The company for which the value of the founding location is calculated.
         :param target_company: If given, we only calculate how much value the target company contributes.
+        :param target_tags: The target tags. Defaults to the tags set by ```set_target_tags```.
         :return: The value of the founding location.
         """
+        if target_tags is None:
+            target_tags = self.target_tags
+
         # For the value of the cluster (= value of the founding location),
         # we sum up the values each target company contributes.
         if target_company is None:
             # If we have a value predictor, use it instead of calculating the value explicitly.
             if self.value_predictor.is_initialized():
-                value_per_target = [self.value_predictor.predict_single(*recommended_company.get_lat_long(), tag) for tag in self.target_tags]
+                value_per_target = [self.value_predictor.predict_single(*recommended_company.get_lat_long(), tag) for tag in target_tags]
                 return sum(value_per_target)
 
             value_per_target = []
 
-            for tag in self.target_tags:
+            for tag in target_tags:
                 # Check if the value is already cached.
-                if (recommended_company.get_lat_long(), tag) in self.values:
-                    self.value_cache.hit()
-                    value_per_target.append(self.values[recommended_company.get_lat_long(), tag])
+                cached_value = self.values.get((recommended_company.get_lat_long(), tag))
+                if cached_value is not None:
+                    value_per_target.append(cached_value)
                 else:
                     # If not, calculate it.
-                    start = time.time()
-                    tag_value = sum([self.value(recommended_company, target_company) for target_company in self.target_tag_to_companies[tag]])
+                    start = time.perf_counter()
+                    tag_companies = self.companies_with_tag(tag)
+                    tag_value = sum([self.value(recommended_company, target_company) for target_company in tag_companies])
                     self.values[recommended_company.get_lat_long(), tag] = tag_value
                     value_per_target.append(tag_value)
-                    self.miss_time += time.time() - start
-                    self.value_cache.miss()
+                    metrics.DISTANCE_COMPUTATIONS.inc(len(tag_companies))
+                    metrics.REFERENCE_MISS_SECONDS.inc(time.perf_counter() - start)
 
             return sum(value_per_target)
 
@@ -154,6 +334,55 @@ class LocationRecommender:
         value = self.vicinity(recommended_company, target_company) * self.potential(target_company)
         return value
 
+    def values_of(self, latitudes: np.ndarray, longitudes: np.ndarray, target_tags: List[str] = None) -> np.ndarray:
+        """
+        Calculates the values of many founding locations at once.
+        :param latitudes: The latitudes of the founding locations.
+        :param longitudes: The longitudes of the founding locations.
+        :param target_tags: The target tags. Defaults to the tags set by ```set_target_tags```.
+        :return: The value of each founding location.
+        """
+        if target_tags is None:
+            target_tags = self.target_tags
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+
+        # If we have a value predictor, predict the values of all (sample, tag) pairs in one batch.
+        if self.value_predictor.is_initialized():
+            n_tags = len(target_tags)
+            if n_tags == 0:
+                return np.zeros(len(latitudes))
+            labels = np.repeat(target_tags, len(latitudes))
+            predictions = self.value_predictor.predict_arrays(np.tile(latitudes, n_tags), np.tile(longitudes, n_tags),
+                                                              labels)
+            return predictions.reshape(n_tags, len(latitudes)).sum(axis=0)
+
+        if self.engine == ENGINE_REFERENCE:
+            companies = [Company(latitude=lat, longitude=lon, type=CompanyType.RECOMMENDATION)
+                         for lat, lon in zip(latitudes, longitudes)]
+            return np.array([self.value(company, target_tags=target_tags) for company in companies], dtype=np.float64)
+
+        if self.engine == ENGINE_RASTER:
+            return self.value_rasters.lookup(latitudes, longitudes, target_tags)
+
+        values = np.zeros(len(latitudes))
+        for tag in target_tags:
+            if tag not in self.tag_to_coordinates:
+                continue
+            if self.engine == ENGINE_INDEXED:
+                tag_values = self.tag_to_index[tag].vicinity_sum(latitudes, longitudes, self.M)
+            else:
+                target_lats, target_lons = self.tag_to_coordinates[tag]
+                tag_values = scoring.vicinity_sum(latitudes, longitudes, target_lats, target_lons, self.M)
+                metrics.DISTANCE_COMPUTATIONS.inc(len(latitudes) * len(target_lats))
+            values += tag_values
+
+            # The values cache is the training set for the value predictor.
+            if self.record_values:
+                self.values.put_many(latitudes, longitudes, tag, tag_values)
+
+        return values
+
     def vicinity(self, origin_company: Company, target_company: Company = None) -> float:
         """
         Calculates the vicinity of a target company in relation to the origin company.
@@ -178,19 +407,20 @@ class LocationRecommender:
         coordinate1 = (company1.latitude, company1.longitude)
         coordinate2 = (company2.latitude, company2.longitude)
 
-        # Check if distance is already cached
-        if (coordinate1, coordinate2) in self.distances:
-            self.hits += 1
-            return self.distances[(coordinate1, coordinate2)]
-        if (coordinate2, coordinate1) in self.distances:
-            self.hits += 1
-            return self.distances[(coordinate2, coordinate1)]
+        # Check if distance is already cached.
+        # The key is symmetric and consists of the quantized coordinates.
+        key = (quantize(company1.latitude), quantize(company1.longitude),
+               quantize(company2.latitude), quantize(company2.longitude))
+        if key[2:] < key[:2]:
+            key = key[2:] + key[:2]
+        distance = self.distances.get(key)
+        if distance is not None:
+            return distance
 
         # Calculate distance using geodesic distance
         distance = geodesic(coordinate1, coordinate2).kilometers
 
-        self.distances[(coordinate1, coordinate2)] = distance
-        self.misses += 1
+        self.distances[key] = distance
 
         return distance
 
@@ -203,119 +433,213 @@ class LocationRecommender:
         """
         return 1
 
-    def get_random_point_in_germany(self):
-        """
-        Generates a random point in the rectangular bounding box of Germany.
-        :return: A random point in the bounding box of Germany.
-        :note: The point is not necessarily in Germany.
-        """
-        # Generate random latitude and longitude
-        if self.saarland_only:
-            latitude = random.uniform(SAARLAND_LAT_MIN, SAARLAND_LAT_MAX)
-            longitude = random.uniform(SAARLAND_LON_MIN, SAARLAND_LON_MAX)
+    def sample_locations(self, rng: np.random.Generator, region: str, n: int):
+        """
+        Samples random founding locations uniformly in a region.
+        :param rng: The random number generator.
+        :param region: The region (see regions.names).
+        :param n: The number of locations to sample.
+        :return: Tuple of (latitudes, longitudes) as numpy arrays, rounded by the rounding policy.
+        """
+        return regions.get(region).sample(rng, n)
+
+    def density(self, tags, region: str) -> np.ndarray:
+        """
+        The density of the adaptive sampler, i.e. a coarse estimate of the values in the region (see sampling.py).
+        Cached per tags and region.
+        :param tags: The target tags.
+        :param region: The region (see regions.names).
+        :return: The density raster.
+        """
+        key = (tuple(sorted(set(tags))), region, self.M)
+        with self.densities_lock:
+            density = self.densities.get(key)
+        if density is None:
+            coordinates = [self.tag_to_coordinates[tag] for tag in key[0] if tag in self.tag_to_coordinates]
+            density = sampling.density_raster(coordinates, regions.get(region).bounds, self.M)
+            with self.densities_lock:
+                self.densities[key] = density
+        return density
+
+    def recommend(self, query: RecommendationQuery,
+                  progress: Callable[[int, int, List[Company]], None] = None) -> List[Company]:
+        """
+        Generates a list of founding location recommendations for the given query.
+        Does not modify the recommender, i.e. can be called from multiple threads in parallel
+        (unless the values are recorded, see ```record_values```).
+        :param query: The parameters of the request.
+        :param progress: Optional callback, called with (samples scored, sample size, current recommendations)
+        after every batch of the uniform sampler and once at the end (see recommend_iter).
+        The recommendation can be aborted by raising an exception in the callback.
+        The result does not depend on whether progress is reported.
+        :return: The list of recommendations (as Company objects), ordered by value (descending).
+        """
+        query = self.resolve(query)
+        if progress is not None:
+            for snapshot in self.recommend_iter(query):
+                progress(snapshot.scored, snapshot.total, snapshot.recommendations)
+            return snapshot.recommendations
+
+        if self.uses_workers() and query.sampler == SAMPLER_UNIFORM:
+            # the samples are drawn, scored and preselected in the worker processes
+            with metrics.stage("scoring"):
+                latitudes, longitudes, values, selected, evaluated = self._recommend_parallel(query)
         else:
-            latitude = random.uniform(GERMANY_LAT_MIN, GERMANY_LAT_MAX)
-            longitude = random.uniform(GERMANY_LON_MIN, GERMANY_LON_MAX)
-
-        latitude = config.rounding_policy(latitude)
-        longitude = config.rounding_policy(longitude)
-
-        # API call is too expensive, another verification method is needed.
-        # if not self.is_in_germany(latitude, longitude):
-        #     return self.get_random_point_in_germany()
-
-        return latitude, longitude
-
-    def get_random_possible_company_location(self):
-        """
-        Generates a random company location in Germany.
-        :return: The random company at a random location in Germany.
-        """
-        latitude, longitude = self.get_random_point_in_germany()
-        company = Company(latitude=latitude, longitude=longitude, type=CompanyType.RECOMMENDATION)
-        return company
+            rng = np.random.default_rng(query.seed)
+
+            # Sample locations and calculate their values
+            if query.sampler == SAMPLER_ADAPTIVE:
+                # the rounds of the adaptive sampler alternate between sampling and scoring
+                with metrics.stage("scoring"):
+                    latitudes, longitudes, values = sampling.adaptive_sample(
+                        rng, self.density(query.tags, query.region), regions.get(query.region), query.sample_size,
+                        lambda lats, lons: self.values_of(lats, lons, list(query.tags)), query.k, query.delta)
+            else:
+                with metrics.stage("sampling"):
+                    latitudes, longitudes = self.sample_locations(rng, query.region, query.sample_size)
+                with metrics.stage("scoring"):
+                    values = self.values_of(latitudes, longitudes, list(query.tags))
+
+            # Greedily select the best samples, which are not too close to a better one (𝛿-distinctiveness).
+            with metrics.stage("selection"):
+                selected = select_distinct(latitudes, longitudes, values, query.k, query.delta)
+            # the region may provide fewer samples than requested (see Region.sample)
+            evaluated = len(latitudes)
+
+        metrics.RECOMMENDATIONS.inc()
+        metrics.SAMPLES_EVALUATED.inc(evaluated)
+        return self._to_recommendations(latitudes, longitudes, values, selected)
+
+    def recommend_iter(self, query: RecommendationQuery, early_stop: bool = False,
+                       report_interval: float = REPORT_INTERVAL) -> Iterator[Snapshot]:
+        """
+        Generates the recommendations of a query progressively: The samples are scored in batches and after each
+        batch, the best 𝛿-distinct recommendations so far are yielded. The last snapshot of a complete run
+        equals the result of ```recommend```. Only the uniform sampler without workers is progressive,
+        otherwise a single (final) snapshot is yielded.
+        :param query: The parameters of the request.
+        :param early_stop: If True, stop once the recommendations did not change for STABLE_BATCHES batches.
+        The result is then based on fewer samples than the sample size.
+        :param report_interval: The targeted time between two snapshots in seconds.
+        :return: Iterator over the snapshots, the last one is done.
+        """
+        query = self.resolve(query)
+        if query.sampler != SAMPLER_UNIFORM or self.uses_workers():
+            recommendations = self.recommend(query)
+            yield Snapshot(query.sample_size, query.sample_size, recommendations, 1.0, 1, True)
+            return
+
+        rng = np.random.default_rng(query.seed)
+        with metrics.stage("sampling"):
+            latitudes, longitudes = self.sample_locations(rng, query.region, query.sample_size)
+        values = np.zeros(len(latitudes))
+
+        scored = 0
+        batch_size = FIRST_BATCH_SIZE
+        previous = None
+        stable_batches = 0
+        while True:
+            start_time = time.perf_counter()
+            end = min(scored + batch_size, len(latitudes))
+            with metrics.stage("scoring"):
+                values[scored:end] = self.values_of(latitudes[scored:end], longitudes[scored:end], list(query.tags))
+            metrics.SAMPLES_EVALUATED.inc(end - scored)
+            scored = end
+
+            with metrics.stage("selection"):
+                selected = select_distinct(latitudes[:scored], longitudes[:scored], values[:scored], query.k,
+                                           query.delta)
+            stability = len(set(selected) & set(previous)) / len(selected) if previous and selected else 0.0
+            stable_batches = stable_batches + 1 if previous is not None and selected == previous else 1
+            previous = selected
+            done = scored == len(latitudes) or (early_stop and stable_batches >= STABLE_BATCHES)
+            if done:
+                metrics.RECOMMENDATIONS.inc()
+            yield Snapshot(scored, len(latitudes), self._to_recommendations(latitudes, longitudes, values, selected),
+                           stability, stable_batches, done)
+            if done:
+                return
+
+            # size the next batch to take report_interval seconds (including the selection)
+            elapsed = max(time.perf_counter() - start_time, 1e-6)
+            batch_size = max(int(batch_size * report_interval / elapsed), FIRST_BATCH_SIZE)
+
+    @staticmethod
+    def _to_recommendations(latitudes, longitudes, values, selected) -> List[Company]:
+        recommendations = []
+        for i in selected:
+            recommendation = Company(latitude=float(latitudes[i]), longitude=float(longitudes[i]),
+                                     type=CompanyType.RECOMMENDATION)
+            recommendation.value = float(values[i])
+            recommendations.append(recommendation)
+        return recommendations
 
-    def get_random_possible_company_locations(self, n: int):
+    def _recommend_parallel(self, query: RecommendationQuery):
         """
-        Generates a list of random company locations in Germany.
-        :param n: The number of random companies at random locations to generate.
-        :return: The list of random companies at random locations in Germany.
+        Samples, evaluates and selects the founding locations of a query in the worker processes.
+        :param query: The parameters of the request.
+        :return: Tuple of (latitudes, longitudes, values, selected, scored) of the candidates, the selected indices
+        and the number of samples scored (see ParallelSampler.sample_and_select).
         """
-        recommendations = []
-        for _ in range(n):
-            recommendations.append(self.get_random_possible_company_location())
-        return recommendations
+        with self.parallel_lock:
+            if self.parallel_sampler is None:
+                predictor = self.value_predictor if self.value_predictor.is_initialized() else None
+                self.parallel_sampler = ParallelSampler(self.tag_to_coordinates, self.workers, predictor)
+        return self.parallel_sampler.sample_and_select(query.seed, query.region, query.sample_size,
+                                                       list(query.tags), self.M, self.engine == ENGINE_INDEXED,
+                                                       query.k, query.delta)
 
     def get_location_recommendations(self, max_companies: int):
         """
-        Generates a list of founding location recommendations.
+        Generates a list of founding location recommendations using the parameters set by the setters.
         :param max_companies: The maximum number of recommendations to generate.
         :return: The list of recommendations (as Company objects).
         """
+        logger.info("Performing location recommendations (max: %d) using %d monte carlo samples.",
+                    max_companies, self.sample_size)
 
-        SAMPLING_SIZE = self.sample_size
-        print()
-        print(f"Performing location recommendations (max: {max_companies}) using {SAMPLING_SIZE} monte carlo samples.")
-
-        # Sample locations
-        sampled_locations = self.get_random_possible_company_locations(SAMPLING_SIZE)
+        query = RecommendationQuery(tags=self.target_tags,
+                                    region=REGION_SAARLAND if self.saarland_only else REGION_GERMANY,
+                                    delta=self.min_recommendation_distance, k=max_companies,
+                                    sample_size=self.sample_size)
+        recommendations = self.recommend(query)
 
-        # Calculate values for sampled locations
-        for company in sampled_locations:
-            company.value = self.value(company)
-
-        # Sort sampled locations by value
-        sampled_locations.sort(key=lambda x: x.value, reverse=True)
-
-        recommendations = []
-
-        # Repeat until max_companies recommendations are found.
-        for _ in range(max_companies):
-            if len(sampled_locations) == 0:
-                break
-
-            print("Sampled locations:", len(sampled_locations), end="\r")
-
-            # Find the best recommendation
-            best_recommendation = sampled_locations[0]
-
-            # Add the best recommendation to the list of recommendations
-            recommendations.append(best_recommendation)
-
-            found_next_best = False
-
-            # Remove samples that are too close to the best recommendation
-            # Does not remove all samples, but only up to the point that
-            # the first element of the ordered list is not too close.
-            # Thus, this first element is the next best recommendation.
-            next_sampled_locations = []
-            total = 0
-            for company in sampled_locations:
-                total += 1
-                if not found_next_best:
-                    not_too_close = True
-                    for recommendation in recommendations:
-                        if self.distance(recommendation, company) <= self.min_recommendation_distance:
-                            not_too_close = False
-                            break
-                    if not_too_close:
-                        found_next_best = True
-                if found_next_best:
-                    next_sampled_locations.append(company)
-
-            sampled_locations = next_sampled_locations
-
-        # If we use regular Monte Carlo sampling, print the cache report.
+        # If we use regular Monte Carlo sampling, log the cache report.
         if not self.value_predictor.is_initialized():
-            # self.cache.save()
-            self.value_cache.save()
-            self.value_cache.report()
-            print(f"Cache hits: {self.hits / (self.hits + self.misses) * 100}%")
-            print(f"recommendation: {[str(r) for r in recommendations]}")
-            print(f"miss time: {self.miss_time}")
+            if self.record_values or self.engine == ENGINE_REFERENCE:
+                self.values.flush()
+                self.values.report()
+            if self.engine == ENGINE_REFERENCE:
+                self.distances.report("distances")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("recommendation: %s", [str(r) for r in recommendations])
 
         return recommendations
 
+    def targets_within(self, recommendations: List[Company], target_tags: List[str], radius: float):
+        """
+        Finds the target companies within a radius of each recommendation.
+        :param recommendations: The recommendations.
+        :param target_tags: The target tags.
+        :param radius: The radius in km.
+        :return: For each recommendation, the list of target companies within the radius.
+        """
+        latitudes = [recommendation.latitude for recommendation in recommendations]
+        longitudes = [recommendation.longitude for recommendation in recommendations]
+        found = [[] for _ in recommendations]
+        for tag in set(target_tags):
+            if tag not in self.tag_to_index:
+                continue
+            indices, _ = self.tag_to_index[tag].query_radius(latitudes, longitudes, radius)
+            for i, tag_indices in enumerate(indices):
+                found[i].append(self.tag_to_company_indices[tag][tag_indices])
+
+        targets = []
+        for company_indices in found:
+            company_indices = np.unique(np.concatenate(company_indices)) if company_indices else []
+            targets.append([self.companies[i] for i in company_indices])
+        return targets
+
     def get_attributed_location_recommendations(self, max_companies: int):
         """
         Generates a list of recommendations add adds the targets that are within the display radius as an attribute.
@@ -323,12 +647,13 @@ class LocationRecommender:
         :return: The list of attributed recommendations (as Company objects).
         """
         recommendations = self.get_location_recommendations(max_companies)
-        for recommendation in recommendations:
-            recommendation.targets = [target for target in self.targets if
-                                      self.distance(recommendation, target) <= self.display_radius]
+        targets = self.targets_within(recommendations, self.target_tags, self.display_radius)
+        for recommendation, recommendation_targets in zip(recommendations, targets):
+            recommendation.targets = recommendation_targets
 
-        for recommendation in recommendations:
-            print(self.value(recommendation))
+        if logger.isEnabledFor(logging.DEBUG):
+            for recommendation in recommendations:
+                logger.debug("value: %s", self.value(recommendation))
         return recommendations
 
     def set_sample_size(self, sample_size: int):
@@ -337,3 +662,26 @@ class LocationRecommender:
         :param sample_size: The new sample size.
         """
         self.sample_size = sample_size
+
+    def set_sample_size_calibration(self, calibration):
+        """
+        Sets the calibrated sample sizes used for queries with SAMPLE_SIZE_AUTO (see resolve).
+        :param calibration: The calibration (see convergence.SampleSizeCalibration) or None.
+        """
+        if calibration is not None and calibration.data != self.data_fingerprint:
+            logger.warning("The sample sizes were calibrated on another dataset.")
+        self.sample_size_calibration = calibration
+
+    def resolve(self, query: RecommendationQuery) -> RecommendationQuery:
+        """
+        Replaces SAMPLE_SIZE_AUTO by the calibrated sample size of the query's tags and region,
+        or by the sample size of the recommender if they are not calibrated.
+        :param query: The query.
+        :return: The query with a numeric sample size.
+        """
+        if query.sample_size != SAMPLE_SIZE_AUTO:
+            return query
+        sample_size = None
+        if self.sample_size_calibration is not None:
+            sample_size = self.sample_size_calibration.sample_size(query.tags, query.region)
+        return replace(query, sample_size=sample_size or self.sample_size)
@@ -0,0 +1,228 @@
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+# Upper bounds of the histogram buckets of durations (in seconds) and batch sizes.
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple, extra: str = "") -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    """
+    A monotonically increasing value per label combination.
+    """
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        :param amount: The amount to add.
+        :param labels: The value of each label (see label_names).
+        """
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self.lock:
+            return self.values.get(key, 0)
+
+    def render(self):
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {value}"
+
+
+class Histogram:
+    """
+    Counts observations (e.g. durations) per bucket and label combination.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...] = (), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # per label combination: (count per bucket, sum, count)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        """
+        :param value: The observed value.
+        :param labels: The value of each label (see label_names).
+        """
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total, count = self.values.get(key) or ([0] * (len(self.buckets) + 1), 0, 0)
+            counts[bucket] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels) -> int:
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self.lock:
+            return self.values[key][2] if key in self.values else 0
+
+    def render(self):
+        with self.lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {count}"
+
+
+class Collector:
+    """
+    A metric whose values are read on demand, e.g. the hit counts a cache already keeps.
+    """
+
+    def __init__(self, name: str, help: str, type: str, label_names: Tuple[str, ...],
+                 collect: Callable[[], Dict[Tuple, float]]):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.label_names = label_names
+        self.collect = collect
+
+    def render(self):
+        for key, value in sorted(self.collect().items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {value}"
+
+
+class Registry:
+    """
+    The metrics of the process, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, label_names))
+
+    def histogram(self, name: str, help: str, label_names: Tuple[str, ...] = (), buckets=SECONDS_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, label_names, buckets))
+
+    def render(self) -> str:
+        """
+        :return: All metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Stages of a recommendation: sampling, scoring, selection (see LocationRecommender.recommend) and serialization.
+STAGE_SECONDS = REGISTRY.histogram("recommendation_stage_seconds", "Time spent per stage of a recommendation.",
+                                   ("stage",))
+RECOMMENDATIONS = REGISTRY.counter("recommendations_total", "Number of recommendations (queries) calculated.")
+SAMPLES_EVALUATED = REGISTRY.counter("samples_evaluated_total", "Number of Monte Carlo samples scored.")
+DISTANCE_COMPUTATIONS = REGISTRY.counter("distance_computations_total",
+                                         "Number of (sample, target) distances calculated.")
+MODEL_BATCH_SIZE = REGISTRY.histogram("model_batch_size", "Number of feature vectors per model prediction.",
+                                      buckets=SIZE_BUCKETS)
+REFERENCE_MISS_SECONDS = REGISTRY.counter("reference_value_miss_seconds_total",
+                                          "Time spent calculating values missing in the values cache "
+                                          "(reference engine).")
+
+# The caches whose hits and misses are exported, by name (see register_cache).
+_caches = {}
+
+
+def register_cache(name: str, cache):
+    """
+    Exports the hits and misses of a cache, i.e. an object with ```hits``` and ```misses``` counters.
+    :param name: The name of the cache (label value).
+    :param cache: The cache.
+    """
+    _caches[name] = cache
+
+
+REGISTRY.register(Collector("cache_hits_total", "Number of cache hits.", "counter", ("cache",),
+                            lambda: {(name,): cache.hits for name, cache in list(_caches.items())}))
+REGISTRY.register(Collector("cache_misses_total", "Number of cache misses.", "counter", ("cache",),
+                            lambda: {(name,): cache.misses for name, cache in list(_caches.items())}))
+
+# The stage timings of the current request, if collected (see collect_timings).
+_timings = contextvars.ContextVar("timings", default=None)
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """
+    Measures the duration of a stage (see STAGE_SECONDS), also for the timings of the current request.
+    :param name: The name of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0) + elapsed
+
+
+@contextlib.contextmanager
+def collect_timings():
+    """
+    Collects the durations of the stages in the current context (thread), e.g. of one request.
+    :return: Context manager yielding a dict of stage name -> seconds, which is filled while the context is active.
+    """
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """
+    :param timings: The durations of the stages in seconds (see collect_timings).
+    :return: The value of a Server-Timing header, which browsers display in their developer tools.
+    """
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
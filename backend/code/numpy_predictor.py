@@ -0,0 +1,119 @@
+import hashlib
+
+import numpy as np
+
+from backend.code import metrics
+
+# How many feature vectors are passed through the network at once.
+PREDICTION_CHUNK_SIZE = 65536
+
+
+class NumpyValuePredictor:
+    """
+    A lightweight replacement of the ValuePredictor for inference.
+    Runs the forward pass of the exported MLP (see ValuePredictor.export) in NumPy, i.e. without importing sklearn.
+    """
+
+    def __init__(self, weights, biases, labels, label_offsets):
+        """
+        :param weights: The weight matrices of the layers. The first layer only covers (lat, lon).
+        :param biases: The bias vectors of the layers.
+        :param labels: The labels (sectors) known to the model.
+        :param label_offsets: The contribution of each label to the first layer, one row per label.
+        """
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.labels = list(labels)
+        self.label_to_index = {label: i for i, label in enumerate(self.labels)}
+        self.label_offsets = np.asarray(label_offsets, dtype=np.float32)
+
+    @staticmethod
+    def load(path: str):
+        """
+        Loads a model exported by ValuePredictor.export.
+        The feature scaling is fused into the first layer:
+        ((x - mean) / scale) @ W + b = x @ (W / scale) + (b - (mean / scale) @ W).
+        Since the label embedding only depends on the label, its part of the first layer is precomputed per label.
+        :param path: The path of the .npz file.
+        :return: The NumpyValuePredictor.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            n_layers = int(data["n_layers"])
+            weights = [data[f"weight_{i}"].astype(np.float64) for i in range(n_layers)]
+            biases = [data[f"bias_{i}"].astype(np.float64) for i in range(n_layers)]
+            mean, scale = data["scaler_mean"], data["scaler_scale"]
+            labels = data["labels"].tolist()
+            embedding_matrix = data["embedding_matrix"]
+
+        first = weights[0] / scale[:, None]
+        biases[0] = biases[0] - (mean / scale) @ weights[0]
+        weights[0] = first[:2]
+        label_offsets = embedding_matrix @ first[2:]
+
+        return NumpyValuePredictor(weights, biases, labels, label_offsets)
+
+    def is_initialized(self):
+        """
+        Checks if the NumpyValuePredictor is initialized.
+        :return: Always True, since it can only be created from an exported model.
+        """
+        return True
+
+    def fingerprint(self) -> str:
+        """
+        :return: A hash of the model, which changes whenever the predictions may change.
+        """
+        model_hash = hashlib.sha1()
+        for array in self.weights + self.biases + [self.label_offsets]:
+            model_hash.update(array.tobytes())
+        model_hash.update(",".join(self.labels).encode())
+        return model_hash.hexdigest()
+
+    def predict(self, data):
+        """
+        Predicts the value of the given data.
+        :param data: Tuple of (lat, lon, label) to predict the value for.
+        :return: The predicted value.
+        """
+        latitudes = [lat for lat, _, _ in data]
+        longitudes = [lon for _, lon, _ in data]
+        labels = [label for _, _, label in data]
+        return self.predict_arrays(latitudes, longitudes, labels)
+
+    def predict_arrays(self, latitudes, longitudes, labels, chunk_size: int = PREDICTION_CHUNK_SIZE):
+        """
+        Predicts the values of many (lat, lon, label) triples given as arrays.
+        :param latitudes: The latitudes of the founding locations.
+        :param longitudes: The longitudes of the founding locations.
+        :param labels: The label of each founding location.
+        :param chunk_size: How many feature vectors are passed through the network at once.
+        :return: The predicted values as numpy array.
+        """
+        coordinates = np.column_stack((np.asarray(latitudes, dtype=np.float32),
+                                       np.asarray(longitudes, dtype=np.float32)))
+        unique_labels, inverse = np.unique(np.asarray(labels), return_inverse=True)
+        label_indices = np.array([self.label_to_index[label] for label in unique_labels], dtype=np.intp)[inverse]
+
+        predictions = np.zeros(len(coordinates))
+        for start in range(0, len(coordinates), chunk_size):
+            end = start + chunk_size
+            metrics.MODEL_BATCH_SIZE.observe(len(coordinates[start:end]))
+            # first layer: fused scaling and precomputed label contributions
+            x = coordinates[start:end] @ self.weights[0] + self.label_offsets[label_indices[start:end]] + self.biases[0]
+            # hidden layers use relu (the MLPRegressor default), the output layer is linear
+            for weight, bias in zip(self.weights[1:], self.biases[1:]):
+                np.maximum(x, 0, out=x)
+                x = x @ weight + bias
+            predictions[start:end] = x[:, 0]
+
+        return predictions
+
+    def predict_single(self, lat, lon, label):
+        """
+        Predicts the value of founding a company at the given location with the given label.
+        :param lat: The latitude of the founding location.
+        :param lon: The longitude of the founding location.
+        :param label: The label of the company.
+        :return: The predicted value.
+        """
+        return self.predict([(lat, lon, label)])[0]
@@ -0,0 +1,247 @@
+import os
+import weakref
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from backend.code import regions, scoring
+from backend.code.selection import select_distinct
+from backend.code.spatial_index import SpatialIndex
+
+# How many candidates each shard returns per requested recommendation.
+# If the merged candidates cannot guarantee the result of the selection, the shards are asked for more.
+CANDIDATES_PER_RECOMMENDATION = 64
+MIN_CANDIDATES = 1024
+
+# The state of a worker process, set by _init_worker.
+_worker = {}
+
+
+def shard_sizes(sample_size: int, workers: int) -> List[int]:
+    """
+    :param sample_size: The total number of samples.
+    :param workers: The number of shards.
+    :return: The number of samples of each shard.
+    """
+    return [len(shard) for shard in np.array_split(np.arange(sample_size), workers)]
+
+
+def shard_seeds(seed, workers: int) -> List[np.random.SeedSequence]:
+    """
+    :param seed: The seed of the query (None for random samples).
+    :param workers: The number of shards.
+    :return: The independent seed of each shard.
+    """
+    return np.random.SeedSequence(seed).spawn(workers)
+
+
+def sample_shard(seed: np.random.SeedSequence, region: str, n: int):
+    """
+    Samples the locations of a shard like LocationRecommender.sample_locations.
+    :param seed: The seed of the shard.
+    :param region: The region (see regions.names).
+    :param n: The number of samples.
+    :return: Tuple of (latitudes, longitudes) as numpy arrays.
+    """
+    return regions.get(region).sample(np.random.default_rng(seed), n)
+
+
+def _init_worker(shm_name: str, n_targets: int, tag_slices: Dict[str, Tuple[int, int]], predictor):
+    """
+    Attaches a worker process to the shared target coordinates.
+    """
+    # The workers share the resource tracker of the parent, which unlinks the block if the parent dies.
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["shm"] = shm
+    _worker["coordinates"] = np.ndarray((2, n_targets), dtype=np.float64, buffer=shm.buf)
+    _worker["tag_slices"] = tag_slices
+    _worker["predictor"] = predictor
+    _worker["indexes"] = {}
+
+
+def _shard_values(latitudes, longitudes, tags: List[str], M: float, indexed: bool) -> np.ndarray:
+    """
+    Calculates the values of the samples of a shard like LocationRecommender.values_of.
+    """
+    predictor = _worker["predictor"]
+    if predictor is not None:
+        if not tags:
+            return np.zeros(len(latitudes))
+        labels = np.repeat(tags, len(latitudes))
+        predictions = predictor.predict_arrays(np.tile(latitudes, len(tags)), np.tile(longitudes, len(tags)), labels)
+        return predictions.reshape(len(tags), len(latitudes)).sum(axis=0)
+
+    values = np.zeros(len(latitudes))
+    for tag in tags:
+        if tag not in _worker["tag_slices"]:
+            continue
+        start, end = _worker["tag_slices"][tag]
+        target_lats, target_lons = _worker["coordinates"][:, start:end]
+        if indexed:
+            if tag not in _worker["indexes"]:
+                _worker["indexes"][tag] = SpatialIndex(target_lats, target_lons)
+            values += _worker["indexes"][tag].vicinity_sum(latitudes, longitudes, M)
+        else:
+            values += scoring.vicinity_sum(latitudes, longitudes, target_lats, target_lons, M)
+    return values
+
+
+def _run_shard(seed, region: str, n: int, tags: List[str], M: float, indexed: bool, candidates: int):
+    """
+    Samples and evaluates a shard and returns its best candidates.
+    :return: Tuple of (latitudes, longitudes, values, truncated, scored) of the candidates in sample order.
+    truncated is None if all samples are returned, otherwise the value of the worst returned candidate.
+    scored is the number of samples scored, less than n if the region could not provide enough samples.
+    """
+    latitudes, longitudes = sample_shard(seed, region, n)
+    values = _shard_values(latitudes, longitudes, tags, M, indexed)
+    # the region may provide fewer than n samples (see Region.sample), possibly none
+    if candidates >= len(values):
+        return latitudes, longitudes, values, None, len(values)
+    # keep the sample order, such that ties are broken as if all samples were selected from
+    best = np.sort(np.argpartition(-values, candidates - 1)[:candidates])
+    return latitudes[best], longitudes[best], values[best], float(values[best].min()), len(values)
+
+
+def _label_shard(seed, region: str, sizes: List[int], tags: List[str], M: float, path: str) -> int:
+    """
+    Samples the rows of a shard of the training set and writes them to a .npy file
+    (see training_set_generation.generate). Each tag gets its own samples, whose exact value is calculated
+    with the spatial index of the tag, i.e. a value predictor is never used.
+    :param sizes: The number of rows of each tag.
+    :param tags: The tags, the tag id of a row is the position of its tag in this list.
+    :return: The number of rows written, less than the sum of sizes if the region could not provide
+    enough samples (see Region.sample).
+    """
+    from backend.code.training_set_generation import ROW_DTYPE
+
+    rng = np.random.default_rng(seed)
+    rows = np.empty(sum(sizes), dtype=ROW_DTYPE)
+    start = 0
+    for tag_id, (tag, size) in enumerate(zip(tags, sizes)):
+        if size == 0:
+            continue
+        latitudes, longitudes = regions.get(region).sample(rng, size)
+        end = start + len(latitudes)
+        rows["latitude"][start:end] = latitudes
+        rows["longitude"][start:end] = longitudes
+        rows["tag"][start:end] = tag_id
+        if tag in _worker["tag_slices"]:
+            if tag not in _worker["indexes"]:
+                first, last = _worker["tag_slices"][tag]
+                _worker["indexes"][tag] = SpatialIndex(*_worker["coordinates"][:, first:last])
+            rows["value"][start:end] = _worker["indexes"][tag].vicinity_sum(latitudes, longitudes, M)
+        else:
+            rows["value"][start:end] = 0
+        start = end
+    rows = rows[:start]
+    # the tags of a shard are mixed, such that mini-batches read in order are balanced as well
+    rng.shuffle(rows)
+    with open(path + ".tmp", "wb") as file:
+        np.save(file, rows)
+    os.replace(path + ".tmp", path)
+    return len(rows)
+
+
+class ParallelSampler:
+    """
+    Shards the Monte Carlo samples of a query across a pool of worker processes.
+    The coordinates of the target companies are shared with the workers through shared memory
+    instead of being pickled to each of them. Each shard returns its best candidates, which are merged
+    before the 𝛿-distinct selection. The result is deterministic for a given seed and number of workers.
+    """
+
+    def __init__(self, tag_to_coordinates: Dict[str, Tuple[np.ndarray, np.ndarray]], workers: int, predictor=None):
+        """
+        :param tag_to_coordinates: The (latitudes, longitudes) of the target companies of each tag.
+        :param workers: The number of worker processes (and shards).
+        :param predictor: The value predictor, if the values are predicted instead of calculated.
+        """
+        self.workers = workers
+
+        tag_slices = {}
+        n_targets = 0
+        for tag, (latitudes, _) in tag_to_coordinates.items():
+            tag_slices[tag] = (n_targets, n_targets + len(latitudes))
+            n_targets += len(latitudes)
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(2 * n_targets * 8, 1))
+        coordinates = np.ndarray((2, n_targets), dtype=np.float64, buffer=self.shm.buf)
+        for tag, (latitudes, longitudes) in tag_to_coordinates.items():
+            start, end = tag_slices[tag]
+            coordinates[0, start:end] = latitudes
+            coordinates[1, start:end] = longitudes
+        del coordinates
+
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(self.shm.name, n_targets, tag_slices, predictor))
+        self._finalizer = weakref.finalize(self, ParallelSampler._release, self.pool, self.shm)
+
+    @staticmethod
+    def _release(pool: ProcessPoolExecutor, shm: shared_memory.SharedMemory):
+        pool.shutdown()
+        shm.close()
+        shm.unlink()
+
+    def close(self):
+        """
+        Stops the workers and frees the shared memory.
+        """
+        self._finalizer()
+
+    def label(self, seed, region: str, sizes: List[int], tags: List[str], M: float, path: str) -> Future:
+        """
+        Generates a shard of the training set in a worker process (see training_set_generation.generate).
+        The sampler must be created without value predictor, such that the exact values are calculated.
+        :param seed: The seed of the shard.
+        :param region: The sampled region (see regions.names).
+        :param sizes: The number of rows of each tag.
+        :param tags: The tags, the tag id of a row is the position of its tag in this list.
+        :param M: The maximum distance in km.
+        :param path: The .npy file the rows are written to.
+        :return: Future of the number of rows written.
+        """
+        return self.pool.submit(_label_shard, seed, region, sizes, tags, M, path)
+
+    def sample_and_select(self, seed, region: str, sample_size: int, tags: List[str], M: float, indexed: bool, k: int,
+                          delta: float):
+        """
+        Samples and evaluates the locations in parallel and selects the best 𝛿-distinct ones.
+        The selection equals the selection from all samples of all shards: The candidates of the shards contain
+        every sample better than the worst candidate of a truncated shard. If the selection reaches such a
+        candidate before it is complete, the shards are asked for more candidates.
+        :param seed: The seed of the query.
+        :param region: The sampled region (see regions.names).
+        :param sample_size: The total number of samples.
+        :param tags: The target tags.
+        :param M: The maximum distance in km.
+        :param indexed: If True, use the spatial index, otherwise the dense vectorized engine.
+        :param k: The maximum number of recommendations.
+        :param delta: The minimum distance in km between recommendations.
+        :return: Tuple of (latitudes, longitudes, values, selected, scored) of the candidates, the selected indices
+        and the number of samples scored by all shards.
+        """
+        if k <= 0:
+            return np.zeros(0), np.zeros(0), np.zeros(0), [], 0
+        seeds = shard_seeds(seed, self.workers)
+        sizes = shard_sizes(sample_size, self.workers)
+        candidates = max(k * CANDIDATES_PER_RECOMMENDATION, MIN_CANDIDATES)
+
+        while True:
+            shards = list(self.pool.map(_run_shard, seeds, [region] * self.workers, sizes,
+                                        [tags] * self.workers, [M] * self.workers, [indexed] * self.workers,
+                                        [candidates] * self.workers))
+            latitudes = np.concatenate([shard[0] for shard in shards])
+            longitudes = np.concatenate([shard[1] for shard in shards])
+            values = np.concatenate([shard[2] for shard in shards])
+            selected = select_distinct(latitudes, longitudes, values, k, delta)
+            scored = sum(shard[4] for shard in shards)
+
+            thresholds = [shard[3] for shard in shards if shard[3] is not None]
+            if not thresholds:
+                return latitudes, longitudes, values, selected, scored
+            if len(selected) == k and values[selected[-1]] > max(thresholds):
+                return latitudes, longitudes, values, selected, scored
+            candidates *= 8
@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+from backend.code import regions
+
+# The regions in which recommendations can be requested are germany and its federal states (see regions.names).
+REGION_GERMANY = regions.GERMANY
+REGION_SAARLAND = "saarland"
+
+# How the Monte Carlo samples are drawn (see sampling.py).
+# uniform: uniformly in the region.
+# adaptive: proportional to the estimated value, then refined around the best candidates.
+SAMPLER_UNIFORM = "uniform"
+SAMPLER_ADAPTIVE = "adaptive"
+SAMPLERS = [SAMPLER_UNIFORM, SAMPLER_ADAPTIVE]
+
+# Use the calibrated sample size of the tags and region (see convergence.py and LocationRecommender.resolve).
+SAMPLE_SIZE_AUTO = "auto"
+
+
+@dataclass(frozen=True)
+class RecommendationQuery:
+    """
+    All parameters of a single recommendation request.
+    Queries are immutable, such that they can be shared between threads and used as keys.
+    """
+    # The target tags, i.e. sectors of companies that are considered for the recommendations.
+    tags: Tuple[str, ...]
+    # The region in which the recommendations are sampled (see regions.names).
+    region: str = REGION_GERMANY
+    # The minimum distance in km between recommendations (𝛿-distinctiveness).
+    delta: float = 20
+    # The maximum number of recommendations.
+    k: int = 20
+    # How many Monte Carlo samples to use, or SAMPLE_SIZE_AUTO.
+    sample_size: Union[int, str] = 10000
+    # The seed of the Monte Carlo samples. If None, every call returns different samples.
+    seed: Optional[int] = None
+    # How the Monte Carlo samples are drawn (see SAMPLERS).
+    sampler: str = SAMPLER_UNIFORM
+
+    def __post_init__(self):
+        # Accept any iterable of tags, but store them as sorted tuple without duplicates,
+        # such that equal requests result in equal (hashable) queries.
+        object.__setattr__(self, "tags", tuple(sorted(set(self.tags))))
+        if self.region not in regions.names():
+            raise ValueError(f"region must be one of {regions.names()}, got {self.region}")
+        if self.sampler not in SAMPLERS:
+            raise ValueError(f"sampler must be one of {SAMPLERS}, got {self.sampler}")
+        if self.k < 0:
+            raise ValueError("k must not be negative")
+        if self.sample_size != SAMPLE_SIZE_AUTO and (isinstance(self.sample_size, str) or self.sample_size < 0):
+            raise ValueError(f"sample_size must be a non-negative number or {SAMPLE_SIZE_AUTO}")
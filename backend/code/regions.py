@@ -0,0 +1,230 @@
+import functools
+import hashlib
+import json
+import math
+import threading
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from backend.code import config
+
+# The region of all states.
+GERMANY = "germany"
+
+# Cell size (in degrees) of the precomputed masks. Only points in cells crossed by the boundary are tested exactly.
+MASK_RESOLUTION = 0.02
+
+# If this many draws in a row contain no location inside the region, sampling gives up.
+MAX_EMPTY_DRAWS = 10
+
+# Mask values
+OUTSIDE = 0
+INSIDE = 1
+BOUNDARY = 2
+
+_regions = {}
+_lock = threading.Lock()
+
+
+class Region:
+    """
+    A region (Germany or a federal state), given by its boundary polygons.
+    Points are tested by a precomputed raster mask, only points near the boundary are tested against the polygons.
+    Hence, every region can be queried at the same speed.
+    """
+
+    def __init__(self, id: str, name: str, parts: List[Tuple[np.ndarray, List[np.ndarray]]]):
+        """
+        :param id: The id of the region (see names).
+        :param name: The display name of the region.
+        :param parts: The polygons of the region as list of (outer ring, list of hole rings).
+        The rings are arrays of (longitude, latitude) rows as in GeoJSON.
+        """
+        self.id = id
+        self.name = name
+        self.parts = parts
+
+        points = np.concatenate([outer for outer, _ in parts])
+        # (lat_min, lat_max, lon_min, lon_max) of the region
+        self.bounds = (float(points[:, 1].min()), float(points[:, 1].max()),
+                       float(points[:, 0].min()), float(points[:, 0].max()))
+        self._mask = None
+        self._mask_lock = threading.Lock()
+
+    def contains_exact(self, latitudes, longitudes) -> np.ndarray:
+        """
+        Tests which points are inside the polygons of the region.
+        :param latitudes: The latitudes of the points.
+        :param longitudes: The longitudes of the points.
+        :return: Boolean array, True for the points inside the region.
+        """
+        from matplotlib.path import Path
+
+        points = np.column_stack((np.asarray(longitudes, dtype=np.float64), np.asarray(latitudes, dtype=np.float64)))
+        inside = np.zeros(len(points), dtype=bool)
+        for outer, holes in self.parts:
+            # only test the points in the bounding box of the part
+            candidates = np.flatnonzero((points[:, 0] >= outer[:, 0].min()) & (points[:, 0] <= outer[:, 0].max()) &
+                                        (points[:, 1] >= outer[:, 1].min()) & (points[:, 1] <= outer[:, 1].max()) &
+                                        ~inside)
+            if len(candidates) == 0:
+                continue
+            in_part = Path(outer).contains_points(points[candidates])
+            for hole in holes:
+                in_part &= ~Path(hole).contains_points(points[candidates])
+            inside[candidates[in_part]] = True
+        return inside
+
+    def mask(self) -> np.ndarray:
+        """
+        The mask of the region, computed on first use.
+        :return: Array of OUTSIDE, INSIDE or BOUNDARY per cell (rows = latitude, columns = longitude),
+        starting at the lower left corner of the bounds.
+        """
+        with self._mask_lock:
+            if self._mask is None:
+                self._mask = self._compute_mask()
+            return self._mask
+
+    def _compute_mask(self) -> np.ndarray:
+        from scipy.ndimage import binary_dilation
+
+        lat_min, lat_max, lon_min, lon_max = self.bounds
+        rows = int(math.ceil((lat_max - lat_min) / MASK_RESOLUTION)) + 1
+        cols = int(math.ceil((lon_max - lon_min) / MASK_RESOLUTION)) + 1
+        row_grid, col_grid = np.mgrid[0:rows, 0:cols]
+        inside = self.contains_exact((lat_min + (row_grid.ravel() + 0.5) * MASK_RESOLUTION),
+                                     (lon_min + (col_grid.ravel() + 0.5) * MASK_RESOLUTION)).reshape(rows, cols)
+
+        # A cell that no edge passes through is entirely inside (or outside), like its center.
+        # The edges are walked in steps shorter than a cell, the cells next to each step are marked, too.
+        crossed = np.zeros((rows, cols), dtype=bool)
+        for outer, holes in self.parts:
+            for ring in [outer] + holes:
+                edges = np.diff(ring, axis=0)
+                steps = np.maximum(np.ceil(np.abs(edges).max(axis=1) / MASK_RESOLUTION), 1).astype(np.int64)
+                edge = np.repeat(np.arange(len(edges)), steps + 1)
+                # position of each point along its edge, from 0 to 1
+                first = np.repeat(np.cumsum(steps + 1) - (steps + 1), steps + 1)
+                fraction = (np.arange(len(edge)) - first) / steps[edge]
+                points = ring[edge] + fraction[:, None] * edges[edge]
+                crossed[np.clip(((points[:, 1] - lat_min) / MASK_RESOLUTION).astype(np.int64), 0, rows - 1),
+                        np.clip(((points[:, 0] - lon_min) / MASK_RESOLUTION).astype(np.int64), 0, cols - 1)] = True
+
+        mask = np.where(inside, INSIDE, OUTSIDE).astype(np.uint8)
+        mask[binary_dilation(crossed, iterations=1)] = BOUNDARY
+        return mask
+
+    def contains(self, latitudes, longitudes) -> np.ndarray:
+        """
+        Tests which points are inside the region.
+        :param latitudes: The latitudes of the points.
+        :param longitudes: The longitudes of the points.
+        :return: Boolean array, True for the points inside the region.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        mask = self.mask()
+        lat_min, _, lon_min, _ = self.bounds
+        rows = np.floor((latitudes - lat_min) / MASK_RESOLUTION).astype(np.int64)
+        cols = np.floor((longitudes - lon_min) / MASK_RESOLUTION).astype(np.int64)
+        in_mask = (rows >= 0) & (rows < mask.shape[0]) & (cols >= 0) & (cols < mask.shape[1])
+
+        state = np.full(len(latitudes), OUTSIDE, dtype=np.uint8)
+        state[in_mask] = mask[rows[in_mask], cols[in_mask]]
+        inside = state == INSIDE
+        boundary = np.flatnonzero(state == BOUNDARY)
+        inside[boundary] = self.contains_exact(latitudes[boundary], longitudes[boundary])
+        return inside
+
+    def sample(self, rng: np.random.Generator, n: int,
+               draw: Callable[[np.random.Generator, int], Tuple[np.ndarray, np.ndarray]] = None):
+        """
+        Samples locations inside the region by rejection.
+        :param rng: The random number generator.
+        :param n: The number of locations to sample.
+        :param draw: Draws the given number of candidate locations, which may be outside the region.
+        Defaults to uniform locations in the bounds of the region, rounded by the rounding policy.
+        :return: Tuple of (latitudes, longitudes) of the locations.
+        Less than n locations, if the draws repeatedly contain no location inside the region.
+        """
+        if draw is None:
+            draw = self.draw_uniform
+
+        latitudes, longitudes = [], []
+        remaining = n
+        batch = n
+        misses = 0
+        while remaining > 0 and misses < MAX_EMPTY_DRAWS:
+            candidate_lats, candidate_lons = draw(rng, batch)
+            inside = np.flatnonzero(self.contains(candidate_lats, candidate_lons))[:remaining]
+            latitudes.append(candidate_lats[inside])
+            longitudes.append(candidate_lons[inside])
+            remaining -= len(inside)
+            if len(inside) == 0:
+                misses += 1
+                batch = min(batch * 2, 100 * n)
+            else:
+                misses = 0
+                # draw the expected number of candidates for the remaining locations (plus a margin)
+                batch = max(int(remaining * batch / len(inside) * 1.1), 1)
+        if not latitudes:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(latitudes), np.concatenate(longitudes)
+
+    def draw_uniform(self, rng: np.random.Generator, n: int):
+        """
+        :param rng: The random number generator.
+        :param n: The number of locations.
+        :return: Tuple of (latitudes, longitudes) uniformly in the bounds of the region,
+        rounded by the rounding policy.
+        """
+        lat_min, lat_max, lon_min, lon_max = self.bounds
+        latitudes = config.rounding_policy_array(rng.uniform(lat_min, lat_max, n))
+        longitudes = config.rounding_policy_array(rng.uniform(lon_min, lon_max, n))
+        return latitudes, longitudes
+
+
+def _load() -> Dict[str, Region]:
+    with open(config.regions_path, encoding="utf-8") as file:
+        features = json.load(file)["features"]
+
+    def parts_of(feature):
+        return [(np.array(polygon[0], dtype=np.float64), [np.array(hole, dtype=np.float64) for hole in polygon[1:]])
+                for polygon in feature["geometry"]["coordinates"]]
+
+    regions = {feature["properties"]["id"]: Region(feature["properties"]["id"], feature["properties"]["name"],
+                                                   parts_of(feature)) for feature in features}
+    regions[GERMANY] = Region(GERMANY, "Germany", [part for feature in features for part in parts_of(feature)])
+    return regions
+
+
+def get(id: str) -> Region:
+    """
+    :param id: The id of the region (see names).
+    :return: The region.
+    """
+    with _lock:
+        if not _regions:
+            _regions.update(_load())
+    if id not in _regions:
+        raise ValueError(f"unknown region {id}, must be one of {names()}")
+    return _regions[id]
+
+
+def names() -> List[str]:
+    """
+    :return: The ids of all regions, i.e. germany and the federal states.
+    """
+    get(GERMANY)
+    return sorted(_regions)
+
+
+@functools.lru_cache(maxsize=1)
+def fingerprint() -> str:
+    """
+    :return: A hash of the boundaries, which changes whenever the regions change.
+    """
+    with open(config.regions_path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
@@ -0,0 +1,264 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Iterator, List
+
+from backend.code import config
+from backend.code.company import Company, CompanyType
+from backend.code.grid_recommender import GridRecommender
+from backend.code.location_recommender import Snapshot
+from backend.code.query import RecommendationQuery, SAMPLER_ADAPTIVE, SAMPLER_UNIFORM
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Caches the recommendations of queries in memory (LRU) and optionally on disk.
+    Results are keyed by the normalized query without k and by the version of the recommender,
+    such that a query with a smaller k is served as prefix of a cached larger result.
+    Results that stopped early are kept under their own key, which includes k, since the stopping criterion
+    compares the top k recommendations. The results of the adaptive sampler are keyed by k as well, since it
+    refines the candidates of the top k (see sampling.adaptive_sample), and so are the results of the grid search,
+    which are ordered by their exact value after the selection (see by_k). Unseeded queries are random and therefore never cached,
+    except for the grid search, which ignores the seed (see normalize).
+    """
+
+    def __init__(self, max_entries: int = 256, persist: bool = False, max_disk_entries: int = 4096):
+        """
+        :param max_entries: The maximum number of results kept in memory.
+        :param persist: If True, results are also stored in the cache folder and survive restarts.
+        :param max_disk_entries: The maximum number of results kept on disk.
+        """
+        self.max_entries = max_entries
+        self.persist = persist
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        self.folder = os.path.join(config.cache_path, "results")
+        if persist and not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+    @staticmethod
+    def key(query: RecommendationQuery, version: str, early_stopped: bool = False, by_k: bool = False):
+        """
+        :param query: The query.
+        :param version: The version of the recommender (see LocationRecommender.version).
+        :param early_stopped: If True, the key of the query's result that stopped early.
+        :param by_k: If True, the result for a smaller k is not a prefix of the result for a larger k (see by_k).
+        :return: The key of the query's result, which does not depend on k unless the result depends on more than
+        the top k recommendations, i.e. if it stopped early, the samples were drawn by the adaptive sampler or by_k.
+        """
+        key = query.tags, query.region, query.delta, query.sample_size, query.seed, query.sampler, version
+        if query.sampler == SAMPLER_ADAPTIVE or early_stopped or by_k:
+            key += (query.k,)
+        if early_stopped:
+            key += ("early_stopped",)
+        return key
+
+    @staticmethod
+    def normalize(recommender, query: RecommendationQuery) -> RecommendationQuery:
+        """
+        :param recommender: The LocationRecommender or GridRecommender.
+        :param query: The query.
+        :return: The query with the parameters the recommender ignores set to fixed values, such that queries
+        which only differ in them share a result. The grid search ignores the sample size, seed and sampler.
+        """
+        if isinstance(recommender, GridRecommender):
+            return replace(query, sample_size=0, seed=0, sampler=SAMPLER_UNIFORM)
+        return query
+
+    @staticmethod
+    def by_k(recommender) -> bool:
+        """
+        :param recommender: The LocationRecommender or GridRecommender.
+        :return: True, if the results of the recommender are keyed by k. The grid search orders the selected cells
+        by their exact value, i.e. the result for a smaller k is not necessarily a prefix of the one for a larger k.
+        """
+        return isinstance(recommender, GridRecommender)
+
+    def get(self, query: RecommendationQuery, version: str, early_stop: bool = False, by_k: bool = False):
+        """
+        Looks up the result of a query.
+        :param query: The query.
+        :param version: The version of the recommender.
+        :param early_stop: If True, a result that stopped early is served if there is no complete one.
+        :param by_k: If True, the result is keyed by k (see key).
+        :return: List of (latitude, longitude, value) of the recommendations or None, if the result is not cached.
+        """
+        if query.seed is None:
+            return None
+
+        keys = [self.key(query, version, by_k=by_k)]
+        if early_stop:
+            keys.append(self.key(query, version, early_stopped=True, by_k=by_k))
+        for key in keys:
+            recommendations = self._lookup(key, query.k)
+            if recommendations is not None:
+                with self.lock:
+                    self.hits += 1
+                return recommendations
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, query: RecommendationQuery, version: str, recommendations, early_stopped: bool = False,
+            by_k: bool = False):
+        """
+        Stores the result of a query, unless a result for a larger k is already cached.
+        :param query: The query.
+        :param version: The version of the recommender.
+        :param recommendations: List of (latitude, longitude, value) of the recommendations.
+        :param early_stopped: If True, the result stopped before all samples were scored.
+        :param by_k: If True, the result is keyed by k (see key).
+        """
+        if query.seed is None:
+            return
+
+        key = self.key(query, version, early_stopped, by_k)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[0] >= query.k:
+            return
+
+        entry = (query.k, list(recommendations))
+        self._put_in_memory(key, entry)
+        if self.persist:
+            self._store(key, entry)
+
+    def recommend(self, recommender, query: RecommendationQuery, progress=None) -> List[Company]:
+        """
+        Returns the cached recommendations of the query or calculates and caches them.
+        :param recommender: The LocationRecommender or GridRecommender.
+        :param query: The query.
+        :param progress: Optional progress callback, only called if the result is calculated
+        (see LocationRecommender.recommend).
+        :return: The list of recommendations (as Company objects).
+        """
+        query = recommender.resolve(query)
+        key_query = self.normalize(recommender, query)
+        version = recommender.version()
+        by_k = self.by_k(recommender)
+        cached = self.get(key_query, version, by_k=by_k)
+        if cached is None:
+            recommendations = recommender.recommend(query, progress=progress)
+            self.put(key_query, version, [(r.latitude, r.longitude, r.value) for r in recommendations], by_k=by_k)
+            return recommendations
+        return self._to_recommendations(cached)
+
+    def recommend_iter(self, recommender, query: RecommendationQuery, early_stop: bool = False) -> Iterator[Snapshot]:
+        """
+        Like ```recommend```, but yields the progressive snapshots of the recommender (see recommend_iter).
+        A cached result is yielded as single snapshot. Results that stopped early are cached separately
+        and only served to queries that allow early stopping.
+        :param recommender: The LocationRecommender or GridRecommender.
+        :param query: The query.
+        :param early_stop: If True, the recommender may stop before all samples are scored.
+        :return: Iterator over the snapshots, the last one is done.
+        """
+        query = recommender.resolve(query)
+        key_query = self.normalize(recommender, query)
+        version = recommender.version()
+        by_k = self.by_k(recommender)
+        cached = self.get(key_query, version, early_stop, by_k)
+        if cached is not None:
+            yield Snapshot(query.sample_size, query.sample_size, self._to_recommendations(cached), 1.0, 1, True)
+            return
+
+        for snapshot in recommender.recommend_iter(query, early_stop=early_stop):
+            if snapshot.done:
+                self.put(key_query, version, [(r.latitude, r.longitude, r.value) for r in snapshot.recommendations],
+                         early_stopped=snapshot.scored < snapshot.total, by_k=by_k)
+            yield snapshot
+
+    @staticmethod
+    def _to_recommendations(cached) -> List[Company]:
+        recommendations = []
+        for latitude, longitude, value in cached:
+            recommendation = Company(latitude=latitude, longitude=longitude, type=CompanyType.RECOMMENDATION)
+            recommendation.value = value
+            recommendations.append(recommendation)
+        return recommendations
+
+    def report(self):
+        """
+        Logs a report about the cache containing the total number of hits and misses and the hit rate.
+        """
+        total = self.hits + self.misses
+        logger.info("Result cache report (%d entries in memory): hits: %d, misses: %d, hit rate: %.1f%%",
+                    len(self.entries), self.hits, self.misses, self.hits / total * 100 if total > 0 else 0)
+
+    def _lookup(self, key, k: int):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is None and self.persist:
+            entry = self._load(key)
+            if entry is not None:
+                self._put_in_memory(key, entry)
+        if entry is None:
+            return None
+
+        # A result for a larger k can serve a smaller k. A result with fewer recommendations than its k
+        # ran out of candidates and can therefore serve any k.
+        entry_k, recommendations = entry
+        if entry_k >= k or len(recommendations) < entry_k:
+            return recommendations[:k]
+        return None
+
+    def _put_in_memory(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _file(self, key) -> str:
+        return os.path.join(self.folder, hashlib.sha1(repr(key).encode()).hexdigest() + ".pkl")
+
+    def _load(self, key):
+        try:
+            with open(self._file(key), 'rb') as file:
+                stored_key, entry = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return entry if stored_key == key else None
+
+    def _store(self, key, entry):
+        # write to a unique temporary file first, such that concurrent readers never see partial files
+        # and concurrent writers of the same key do not write to the same temporary file
+        descriptor, temporary = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                pickle.dump((key, entry), file)
+            os.replace(temporary, self._file(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+        # files may be replaced or evicted by other threads (or processes) in the meantime
+        files = []
+        for name in os.listdir(self.folder):
+            if name.endswith(".pkl"):
+                try:
+                    files.append((os.path.getmtime(os.path.join(self.folder, name)), name))
+                except FileNotFoundError:
+                    pass
+        if len(files) > self.max_disk_entries:
+            files.sort()
+            for _, name in files[:len(files) - self.max_disk_entries]:
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,117 @@
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from backend.code import config
+from backend.code.regions import Region
+from backend.code.selection import select_distinct
+
+# Cell size (in degrees) of the coarse value estimate the first round samples from.
+DENSITY_RESOLUTION = 0.05
+# Share of the first round that is drawn uniformly, such that no part of the region is never sampled.
+UNIFORM_SHARE = 0.1
+# Share of the samples that refine the best candidates of the first round.
+REFINEMENT_SHARE = 0.3
+# How many of the best candidates are refined per requested recommendation.
+REFINED_PER_RECOMMENDATION = 2
+
+
+def density_raster(target_coordinates: List[Tuple[np.ndarray, np.ndarray]], bounds, M: float,
+                   resolution: float = DENSITY_RESOLUTION) -> np.ndarray:
+    """
+    Estimates the value of each cell of a coarse raster over the region (see value_raster.value_raster),
+    which is used as density of the first sampling round.
+    :param target_coordinates: The (latitudes, longitudes) of the target companies of each target tag.
+    :param bounds: (lat_min, lat_max, lon_min, lon_max) of the region.
+    :param M: The maximum distance in km to consider for the value of a founding location.
+    :param resolution: The cell size in degrees.
+    :return: The estimated values (rows = latitude, columns = longitude).
+    """
+    from backend.code.value_raster import value_raster
+
+    lat_min, lat_max, lon_min, lon_max = bounds
+    density = None
+    for latitudes, longitudes in target_coordinates:
+        raster = value_raster(latitudes, longitudes, lat_min, lat_max, lon_min, lon_max, resolution, M)
+        density = raster if density is None else density + raster
+    if density is None:
+        density = value_raster([], [], lat_min, lat_max, lon_min, lon_max, resolution, M)
+    return density
+
+
+def sample_density(rng: np.random.Generator, density: np.ndarray, bounds, n: int,
+                   resolution: float = DENSITY_RESOLUTION, uniform_share: float = UNIFORM_SHARE):
+    """
+    Samples locations with a probability proportional to the density of their cell,
+    mixed with uniform samples over the whole region.
+    :param rng: The random number generator.
+    :param density: The density raster (see density_raster).
+    :param bounds: (lat_min, lat_max, lon_min, lon_max) of the region.
+    :param n: The number of locations to sample.
+    :param resolution: The cell size of the density raster in degrees.
+    :param uniform_share: The share of uniform samples.
+    :return: Tuple of (latitudes, longitudes) as numpy arrays, rounded by the rounding policy.
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds
+    weights = density.ravel().astype(np.float64)
+    probabilities = np.full(len(weights), 1 / len(weights))
+    if weights.sum() > 0:
+        probabilities = (1 - uniform_share) * weights / weights.sum() + uniform_share * probabilities
+
+    cells = rng.choice(len(weights), size=n, p=probabilities)
+    rows, cols = np.divmod(cells, density.shape[1])
+    # the cells at the upper edges may reach beyond the region
+    latitudes = np.minimum(lat_min + (rows + rng.random(n)) * resolution, lat_max)
+    longitudes = np.minimum(lon_min + (cols + rng.random(n)) * resolution, lon_max)
+    return config.rounding_policy_array(latitudes), config.rounding_policy_array(longitudes)
+
+
+def sample_around(rng: np.random.Generator, latitudes, longitudes, bounds, n: int, radius: float):
+    """
+    Samples locations uniformly in the squares around the given centers.
+    :param rng: The random number generator.
+    :param latitudes: The latitudes of the centers.
+    :param longitudes: The longitudes of the centers.
+    :param bounds: (lat_min, lat_max, lon_min, lon_max) of the region, which the samples are clipped to.
+    :param n: The total number of locations to sample, distributed evenly over the centers.
+    :param radius: Half the side length of the squares in degrees.
+    :return: Tuple of (latitudes, longitudes) as numpy arrays, rounded by the rounding policy.
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds
+    centers = np.arange(n) % len(latitudes)
+    sampled_lats = np.clip(np.asarray(latitudes)[centers] + rng.uniform(-radius, radius, n), lat_min, lat_max)
+    sampled_lons = np.clip(np.asarray(longitudes)[centers] + rng.uniform(-radius, radius, n), lon_min, lon_max)
+    return config.rounding_policy_array(sampled_lats), config.rounding_policy_array(sampled_lons)
+
+
+def adaptive_sample(rng: np.random.Generator, density: np.ndarray, region: Region, n: int,
+                    values_of: Callable[[np.ndarray, np.ndarray], np.ndarray], k: int, delta: float,
+                    resolution: float = DENSITY_RESOLUTION):
+    """
+    Samples founding locations in two rounds: The first round samples proportional to the estimated value,
+    instead of wasting samples in empty countryside. The second round samples around the best 𝛿-distinct
+    candidates of the first round, to find the best location in their vicinity.
+    :param rng: The random number generator.
+    :param density: The density raster over the bounds of the region (see density_raster).
+    :param region: The region, only locations inside are sampled.
+    :param n: The total number of locations to sample (and evaluate).
+    :param values_of: Calculates the values of founding locations given as (latitudes, longitudes).
+    :param k: The number of requested recommendations.
+    :param delta: The minimum distance in km between recommendations.
+    :param resolution: The cell size of the density raster in degrees.
+    :return: Tuple of (latitudes, longitudes, values) of all sampled locations.
+    """
+    n_refined = int(n * REFINEMENT_SHARE) if k > 0 else 0
+    latitudes, longitudes = region.sample(rng, n - n_refined, lambda rng, m: sample_density(
+        rng, density, region.bounds, m, resolution))
+    values = values_of(latitudes, longitudes)
+
+    best = select_distinct(latitudes, longitudes, values, k * REFINED_PER_RECOMMENDATION, delta)
+    if n_refined == 0 or not best:
+        return latitudes, longitudes, values
+
+    refined_lats, refined_lons = region.sample(rng, n_refined, lambda rng, m: sample_around(
+        rng, latitudes[best], longitudes[best], region.bounds, m, resolution))
+    refined_values = values_of(refined_lats, refined_lons)
+    return (np.concatenate((latitudes, refined_lats)), np.concatenate((longitudes, refined_lons)),
+            np.concatenate((values, refined_values)))
@@ -0,0 +1,64 @@
+import numpy as np
+
+# Mean earth radius (IUGG) in km.
+EARTH_RADIUS_KM = 6371.0088
+
+# How many (sample, target) pairs are evaluated at once by vicinity_sum.
+# Bounds the size of the intermediate distance matrix (~8 bytes per pair).
+PAIRS_PER_CHUNK = 4_000_000
+
+
+def haversine(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Calculates the great circle distance between coordinates on a sphere with the mean earth radius.
+    All arguments are broadcast against each other, e.g. pass column vectors for the samples and
+    row vectors for the targets to get the full distance matrix.
+    :note: Compared to the geodesic distance on the WGS-84 ellipsoid (geopy's ```geodesic```) the relative error
+    is below 0.6% everywhere on earth and below 0.35% within the bounding box of Germany.
+    For distances up to M = 30 km this is at most ~0.1 km, i.e. the vicinity of a single target
+    differs by at most 0.0035 from the vicinity computed with ```geodesic```.
+    :param lat1: The latitude(s) of the first coordinate(s) in degrees.
+    :param lon1: The longitude(s) of the first coordinate(s) in degrees.
+    :param lat2: The latitude(s) of the second coordinate(s) in degrees.
+    :param lon2: The longitude(s) of the second coordinate(s) in degrees.
+    :return: The distance(s) in km.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def vicinity_sum(sample_lats, sample_lons, target_lats, target_lons, M: float, potentials=None) -> np.ndarray:
+    """
+    Calculates the value of many founding locations at once,
+    i.e. the sum of ```vicinity * potential``` over all targets for every sample.
+    :param sample_lats: The latitudes of the sampled founding locations.
+    :param sample_lons: The longitudes of the sampled founding locations.
+    :param target_lats: The latitudes of the target companies.
+    :param target_lons: The longitudes of the target companies.
+    :param M: The maximum distance in km to consider for the value of a founding location.
+    :param potentials: The potential of each target company. Defaults to 1 for every target.
+    :return: The value of each sampled founding location.
+    """
+    sample_lats = np.asarray(sample_lats, dtype=np.float64)
+    sample_lons = np.asarray(sample_lons, dtype=np.float64)
+    target_lats = np.asarray(target_lats, dtype=np.float64)
+    target_lons = np.asarray(target_lons, dtype=np.float64)
+
+    values = np.zeros(len(sample_lats))
+    if len(sample_lats) == 0 or len(target_lats) == 0:
+        return values
+
+    # Process the samples in chunks, such that the distance matrix stays small.
+    chunk_size = max(1, PAIRS_PER_CHUNK // len(target_lats))
+    for start in range(0, len(sample_lats), chunk_size):
+        end = start + chunk_size
+        distances = haversine(sample_lats[start:end, None], sample_lons[start:end, None], target_lats[None, :],
+                              target_lons[None, :])
+        vicinity = np.maximum((M - distances) / M, 0)
+        if potentials is None:
+            values[start:end] = vicinity.sum(axis=1)
+        else:
+            values[start:end] = vicinity @ np.asarray(potentials, dtype=np.float64)
+
+    return values
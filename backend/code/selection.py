@@ -0,0 +1,147 @@
+import math
+from collections import defaultdict
+from typing import List
+
+import numpy as np
+from geopy.distance import geodesic
+
+from backend.code.scoring import EARTH_RADIUS_KM
+
+# Lower bounds of the length of one degree in km on the WGS-84 ellipsoid (with a small safety margin).
+# Used to choose grid cells, which are at least as large as the minimum distance between recommendations.
+KM_PER_DEGREE_LATITUDE = 110.5
+KM_PER_DEGREE_LONGITUDE_AT_EQUATOR = 111.2
+
+# The great-circle distance on the mean sphere differs by less than 1% from the geodesic distance.
+# Only pairs within this margin around delta need the (slow) geodesic distance to be decided.
+SPHERE_ERROR = 0.01
+
+
+def geodesic_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    :return: The geodesic distance in km between two coordinates.
+    """
+    return geodesic((lat1, lon1), (lat2, lon2)).kilometers
+
+
+def within_geodesic_distance(lat1: float, lon1: float, lat2: float, lon2: float, delta: float) -> bool:
+    """
+    Decides geodesic_distance(lat1, lon1, lat2, lon2) <= delta, but only computes the geodesic distance
+    if the great-circle distance is too close to delta to decide.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    great_circle = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+    if great_circle < delta * (1 - SPHERE_ERROR):
+        return True
+    if great_circle > delta * (1 + SPHERE_ERROR):
+        return False
+    return geodesic_distance(lat1, lon1, lat2, lon2) <= delta
+
+
+def select_distinct(latitudes, longitudes, values, k: int, delta: float, distance=geodesic_distance) -> List[int]:
+    """
+    Greedily selects the k best locations, which are more than delta km apart from each other (𝛿-distinctiveness).
+    Implemented as spatial non-maximum suppression: The accepted locations are stored in a grid with cells
+    of at least delta km, such that each candidate is only compared to the accepted locations in the neighbouring cells.
+    :note: Returns the same result as select_distinct_naive. Does not handle the antimeridian.
+    :param latitudes: The latitudes of the candidate locations.
+    :param longitudes: The longitudes of the candidate locations.
+    :param values: The value of each candidate location.
+    :param k: The maximum number of locations to select.
+    :param delta: The minimum distance in km between two selected locations.
+    :param distance: The distance function (lat1, lon1, lat2, lon2) -> km.
+    :return: The indices of the selected locations, ordered by value (descending).
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    if k <= 0 or len(latitudes) == 0:
+        return []
+
+    # Choose the cell size, such that two locations within delta are at most one cell apart.
+    lat_cell = max(delta, 1e-9) / KM_PER_DEGREE_LATITUDE
+    max_latitude = min(np.abs(latitudes).max() + lat_cell, 90)
+    cos_latitude = math.cos(math.radians(max_latitude))
+    if cos_latitude < 0.01:
+        lon_cell = 360
+    else:
+        lon_cell = min(max(delta, 1e-9) / (KM_PER_DEGREE_LONGITUDE_AT_EQUATOR * cos_latitude), 360)
+
+    rows = np.floor(latitudes / lat_cell).astype(np.int64).tolist()
+    cols = np.floor(longitudes / lon_cell).astype(np.int64).tolist()
+    latitudes, longitudes = latitudes.tolist(), longitudes.tolist()
+
+    if distance is geodesic_distance:
+        def too_close_to(j, i):
+            return within_geodesic_distance(latitudes[j], longitudes[j], latitudes[i], longitudes[i], delta)
+    else:
+        def too_close_to(j, i):
+            return distance(latitudes[j], longitudes[j], latitudes[i], longitudes[i]) <= delta
+
+    grid = defaultdict(list)
+    selected = []
+    for i in np.argsort(-np.asarray(values), kind="stable").tolist():
+        row, col = rows[i], cols[i]
+        too_close = False
+        for neighbour_row in (row - 1, row, row + 1):
+            for neighbour_col in (col - 1, col, col + 1):
+                for j in grid.get((neighbour_row, neighbour_col), ()):
+                    if too_close_to(j, i):
+                        too_close = True
+                        break
+                if too_close:
+                    break
+            if too_close:
+                break
+        if too_close:
+            continue
+
+        selected.append(i)
+        grid[row, col].append(i)
+        if len(selected) == k:
+            break
+
+    return selected
+
+
+def select_distinct_naive(latitudes, longitudes, values, k: int, delta: float,
+                          distance=geodesic_distance) -> List[int]:
+    """
+    The original selection loop of the LocationRecommender. Kept as reference for tests and benchmarks.
+    Repeatedly takes the best remaining location and removes the following locations
+    that are too close to any recommendation.
+    :param latitudes: The latitudes of the candidate locations.
+    :param longitudes: The longitudes of the candidate locations.
+    :param values: The value of each candidate location.
+    :param k: The maximum number of locations to select.
+    :param delta: The minimum distance in km between two selected locations.
+    :param distance: The distance function (lat1, lon1, lat2, lon2) -> km.
+    :return: The indices of the selected locations, ordered by value (descending).
+    """
+    sampled_locations = sorted(range(len(values)), key=lambda x: values[x], reverse=True)
+    recommendations = []
+
+    for _ in range(k):
+        if len(sampled_locations) == 0:
+            break
+
+        recommendations.append(sampled_locations[0])
+
+        found_next_best = False
+        next_sampled_locations = []
+        for i in sampled_locations:
+            if not found_next_best:
+                not_too_close = True
+                for recommendation in recommendations:
+                    if distance(latitudes[recommendation], longitudes[recommendation], latitudes[i],
+                                longitudes[i]) <= delta:
+                        not_too_close = False
+                        break
+                if not_too_close:
+                    found_next_best = True
+            if found_next_best:
+                next_sampled_locations.append(i)
+
+        sampled_locations = next_sampled_locations
+
+    return recommendations
@@ -0,0 +1,85 @@
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from backend.code import metrics
+from backend.code.scoring import EARTH_RADIUS_KM
+
+# How many query points are answered at once by vicinity_sum.
+# Bounds the memory used for the per-point neighbour lists.
+QUERIES_PER_CHUNK = 2048
+
+
+class SpatialIndex:
+    """
+    A spatial index over coordinates, which answers radius queries in km.
+    Uses a ball tree with the haversine metric, i.e. distances are the same as scoring.haversine.
+    """
+
+    def __init__(self, latitudes, longitudes):
+        """
+        :param latitudes: The latitudes of the indexed points in degrees.
+        :param longitudes: The longitudes of the indexed points in degrees.
+        """
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+
+        # BallTree does not support empty data.
+        self.tree = None
+        if len(self.latitudes) > 0:
+            self.tree = BallTree(np.radians(np.column_stack((self.latitudes, self.longitudes))), metric="haversine")
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def query_radius(self, latitudes, longitudes, radius: float):
+        """
+        Finds all indexed points within the given radius of each query point.
+        :param latitudes: The latitudes of the query points.
+        :param longitudes: The longitudes of the query points.
+        :param radius: The radius in km.
+        :return: Tuple of (indices, distances), both containing one array per query point.
+        The distances are given in km.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        if self.tree is None or len(latitudes) == 0:
+            empty = [np.zeros(0, dtype=np.intp) for _ in range(len(latitudes))]
+            return empty, [np.zeros(0) for _ in range(len(latitudes))]
+
+        points = np.radians(np.column_stack((latitudes, longitudes)))
+        indices, distances = self.tree.query_radius(points, r=radius / EARTH_RADIUS_KM, return_distance=True)
+        return list(indices), [d * EARTH_RADIUS_KM for d in distances]
+
+    def vicinity_sum(self, latitudes, longitudes, M: float, potentials=None) -> np.ndarray:
+        """
+        Calculates the value of many founding locations at once (see scoring.vicinity_sum),
+        but only visits the indexed targets within M of each founding location.
+        :param latitudes: The latitudes of the founding locations.
+        :param longitudes: The longitudes of the founding locations.
+        :param M: The maximum distance in km to consider for the value of a founding location.
+        :param potentials: The potential of each indexed target. Defaults to 1 for every target.
+        :return: The value of each founding location.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        values = np.zeros(len(latitudes))
+        if self.tree is None:
+            return values
+
+        for start in range(0, len(latitudes), QUERIES_PER_CHUNK):
+            end = start + QUERIES_PER_CHUNK
+            indices, distances = self.query_radius(latitudes[start:end], longitudes[start:end], M)
+            counts = [len(i) for i in indices]
+            metrics.DISTANCE_COMPUTATIONS.inc(sum(counts))
+            if sum(counts) == 0:
+                continue
+
+            vicinity = np.maximum((M - np.concatenate(distances)) / M, 0)
+            if potentials is not None:
+                vicinity *= np.asarray(potentials, dtype=np.float64)[np.concatenate(indices)]
+
+            # sum up the vicinities of the neighbours of each founding location
+            owners = np.repeat(np.arange(len(counts)), counts)
+            values[start:end] = np.bincount(owners, weights=vicinity, minlength=len(counts))
+
+        return values
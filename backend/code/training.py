@@ -1,13 +1,38 @@
+import argparse
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+from typing import List, Optional
+
+import matplotlib
 import numpy as np
 from sklearn.neural_network import MLPClassifier, MLPRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
+
+from backend.code import config, training_set_generation
+from backend.code.value_cache import ValueCache
+from backend.code.value_predictor import ValuePredictor
+
+# Training runs headless, the curves are written to files instead of shown.
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
-from backend.code.cache import Cache
-from tqdm import tqdm
+HIDDEN_LAYER_SIZES = (200, 200, 200, 200)
 
-from backend.code.value_predictor import ValuePredictor
+# The files written to the output folder of the streamed training (see train).
+CHECKPOINT_FILE = "checkpoint.pkl"
+METRICS_FILE = "metrics.json"
+LOSS_CURVE_FILE = "loss_curve.png"
+SCORE_CURVE_FILE = "r2_curve.png"
+
+# At most this many validation rows are held in memory to score the model after each epoch.
+MAX_VALIDATION_ROWS = 200000
+
+logger = logging.getLogger(__name__)
 
 
 def create_unit_vector(i, size):
@@ -26,11 +51,187 @@ def create_unit_vector(i, size):
     return vector
 
 
+def features(rows: np.ndarray, n_tags: int) -> np.ndarray:
+    """
+    Builds the feature vectors of the value predictor, i.e. (lat, lon) and the one-hot embedding of the tag.
+    The rows only store the tag id, the one-hot vectors are only materialized for one mini-batch at a time.
+    :param rows: Rows of the training set (see training_set_generation.ROW_DTYPE).
+    :param n_tags: The number of tags.
+    :return: The feature vectors.
+    """
+    X = np.zeros((len(rows), 2 + n_tags))
+    X[:, 0] = rows["latitude"]
+    X[:, 1] = rows["longitude"]
+    X[np.arange(len(rows)), 2 + rows["tag"]] = 1
+    return X
+
+
+def save_curves(output: str, loss_curve: List[float], score_curve: List[float], x_label: str = "Iteration"):
+    """
+    Plots the loss and the R2 score curve into files of the output folder.
+    """
+    for curve, y_label, title, file in [(loss_curve, "Loss", "Loss Curve", LOSS_CURVE_FILE),
+                                        (score_curve, "R2 Score", "R2 Score Curve", SCORE_CURVE_FILE)]:
+        figure = plt.figure(figsize=(8, 5))
+        plt.plot(curve)
+        plt.xlabel(x_label)
+        plt.ylabel(y_label)
+        plt.title(title)
+        figure.savefig(os.path.join(output, file))
+        plt.close(figure)
+
+
+def peak_memory_mb() -> Optional[float]:
+    """
+    :return: The peak resident memory of this process in MB or None, if it is not available on this platform.
+    """
+    try:
+        import resource
+    except ImportError:
+        # the resource module is Unix only
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def _save_checkpoint(path: str, state: dict):
+    with open(path + ".tmp", "wb") as file:
+        pickle.dump(state, file)
+    os.replace(path + ".tmp", path)
+
+
+def train(folder: str = None, output: str = None, epochs: int = 5, batch_size: int = 1000,
+          hidden_layer_sizes=HIDDEN_LAYER_SIZES, validation_share: float = 0.1, resume: bool = True,
+          seed: int = 42) -> ValuePredictor:
+    """
+    Trains the value predictor on the generated training set (see training_set_generation.generate)
+    with mini-batches streamed from the memory-mapped shards, i.e. the training set does not need to fit in memory.
+    The first validation_share of each shard is held out. The model is checkpointed after each shard,
+    an interrupted training continues from its last checkpoint. The loss and R2 score curves
+    and the metrics (including wall time and peak memory) are written to the output folder.
+    :param folder: The folder of the training set. Defaults to the training set folder in the cache.
+    :param output: The folder of the checkpoint, metrics and curves. Defaults to the training folder in the cache.
+    :param epochs: The number of passes over the training set.
+    :param batch_size: The number of rows per mini-batch.
+    :param hidden_layer_sizes: The hidden layers of the MLP.
+    :param validation_share: The share of each shard held out for validation.
+    :param resume: If True, continue from the checkpoint in the output folder, if any.
+    :param seed: The seed of the weights and of the order of the shards.
+    :return: The trained value predictor (not saved).
+    """
+    start = time.perf_counter()
+    output = output or os.path.join(config.cache_path, "training/")
+    os.makedirs(output, exist_ok=True)
+    manifest = training_set_generation.load_manifest(folder)
+    shards = list(training_set_generation.shards(folder, manifest))
+    if sum(len(shard) for shard in shards) == 0:
+        raise ValueError("The training set has no rows, generate it first (see training_set_generation.generate).")
+    tags = manifest["tags"]
+    n_tags = len(tags)
+    checkpoint_path = os.path.join(output, CHECKPOINT_FILE)
+    # a checkpoint is only continued with the same hyperparameters
+    hyperparameters = {"hidden_layer_sizes": list(hidden_layer_sizes), "batch_size": batch_size,
+                       "validation_share": validation_share, "seed": seed}
+
+    def split(shard):
+        return int(len(shard) * validation_share)
+
+    # only the first MAX_VALIDATION_ROWS held out rows are read into memory
+    validation_parts = []
+    validation_rows = 0
+    for shard in shards:
+        if validation_rows >= MAX_VALIDATION_ROWS:
+            break
+        part = shard[:min(split(shard), MAX_VALIDATION_ROWS - validation_rows)]
+        validation_parts.append(part)
+        validation_rows += len(part)
+    validation = np.concatenate(validation_parts)
+
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "rb") as file:
+            state = pickle.load(file)
+        if state["tags"] != tags or state["rows"] != manifest["rows"]:
+            raise ValueError("The checkpoint belongs to another training set, train with resume=False.")
+        if state.get("hyperparameters") != hyperparameters:
+            raise ValueError(f"The checkpoint was trained with other hyperparameters ({state.get('hyperparameters')}), "
+                             f"train with resume=False.")
+        logger.info("Resuming from epoch %d, shard %d", state["epoch"], state["shard"])
+    else:
+        # The scaler is fitted in a first pass over the training rows.
+        scaler = StandardScaler()
+        for shard in shards:
+            for batch_start in range(split(shard), len(shard), MAX_VALIDATION_ROWS):
+                scaler.partial_fit(features(shard[batch_start:batch_start + MAX_VALIDATION_ROWS], n_tags))
+        model = MLPRegressor(hidden_layer_sizes=hidden_layer_sizes, batch_size=batch_size, random_state=seed)
+        state = {"tags": tags, "rows": manifest["rows"], "hyperparameters": hyperparameters, "model": model,
+                 "scaler": scaler, "epoch": 0, "shard": 0,
+                 "batch_losses": [], "epoch_losses": [], "validation_scores": [], "seconds": 0.0}
+
+    model, scaler = state["model"], state["scaler"]
+    previous_seconds = state["seconds"]
+
+    def checkpoint():
+        state["seconds"] = previous_seconds + time.perf_counter() - start
+        _save_checkpoint(checkpoint_path, state)
+
+    while state["epoch"] < epochs:
+        order = np.random.default_rng((seed, state["epoch"])).permutation(len(shards))
+        while state["shard"] < len(shards):
+            shard = shards[order[state["shard"]]]
+            for batch_start in range(split(shard), len(shard), batch_size):
+                batch = shard[batch_start:batch_start + batch_size]
+                # one gradient step per mini-batch, including the smaller last one of a shard
+                model.set_params(batch_size=len(batch))
+                model.partial_fit(scaler.transform(features(batch, n_tags)), batch["value"].astype(np.float64))
+                state["batch_losses"].append(float(model.loss_))
+            state["shard"] += 1
+            checkpoint()
+
+        epoch_batches = sum(len(range(split(shard), len(shard), batch_size)) for shard in shards)
+        state["epoch_losses"].append(float(np.mean(state["batch_losses"][-epoch_batches:])))
+        score = float("nan")
+        if len(validation) > 1:
+            score = float(model.score(scaler.transform(features(validation, n_tags)),
+                                      validation["value"].astype(np.float64)))
+        state["validation_scores"].append(score)
+        state["epoch"] += 1
+        state["shard"] = 0
+        checkpoint()
+        logger.info("Epoch %d: loss %.4f, R2 score (validation) %.4f", state["epoch"], state["epoch_losses"][-1],
+                    score)
+
+    seconds = previous_seconds + time.perf_counter() - start
+    save_curves(output, state["epoch_losses"], state["validation_scores"], x_label="Epoch")
+    training_metrics = {
+        "rows": manifest["rows"],
+        "validation_rows": len(validation),
+        "tags": n_tags,
+        "epochs": state["epoch"],
+        "batch_size": batch_size,
+        "hidden_layer_sizes": list(hidden_layer_sizes),
+        "epoch_losses": state["epoch_losses"],
+        "validation_scores": state["validation_scores"],
+        "wall_seconds": seconds,
+        "peak_memory_mb": peak_memory_mb(),
+    }
+    with open(os.path.join(output, METRICS_FILE), "w") as file:
+        json.dump(training_metrics, file, indent=2)
+    logger.info("Trained on %d rows in %.1f seconds, peak memory %s MB", manifest["rows"], seconds,
+                training_metrics["peak_memory_mb"])
+
+    label_embedding = {tag: create_unit_vector(i, n_tags) for i, tag in enumerate(tags)}
+    value_predictor = ValuePredictor(download_model=False)
+    value_predictor.initialize(model, label_embedding, scaler, save=False)
+    return value_predictor
+
+
 def run():
     """
-    Runs the training and saves the model to the cache.
+    Runs the training on the values cache and saves the model to the cache.
+    The whole values cache is loaded into memory, see train for larger training sets.
     """
-    cache = Cache("values")
+    cache = ValueCache("values")
 
     X = []
     y = []
@@ -38,7 +239,7 @@ def run():
     labels = []
 
     # Collect all available labels (sector names)
-    for key in cache.value.keys():
+    for key in cache.keys():
         pos, label = key
         if label not in labels:
             labels.append(label)
@@ -51,7 +252,7 @@ def run():
 
     # Load training data from the values cache, created when running regular Monte Carlo simulations
     # Split it into features (X) and labels (y).
-    for key, value in cache.value.items():
+    for key, value in cache.items():
         pos, label = key
         lat, lon = pos
 
@@ -72,7 +273,7 @@ def run():
     X_test = scaler.transform(X_test)
 
     # Create an instance of the MLPClassifier
-    hidden_layer_sizes = (200, 200, 200, 200)
+    hidden_layer_sizes = HIDDEN_LAYER_SIZES
     mlp = MLPRegressor(hidden_layer_sizes=hidden_layer_sizes, max_iter=10000, random_state=42, verbose=True,
                        early_stopping=True, learning_rate='adaptive', batch_size=1000, tol=1e-5)
 
@@ -81,31 +282,45 @@ def run():
     # Train the model
     mlp.fit(X_train, y_train)
 
-    # Plot the loss over iterations
-    plt.figure(figsize=(8, 5))
-    plt.plot(mlp.loss_curve_)
-    plt.xlabel('Iteration')
-    plt.ylabel('Loss')
-    plt.title('Loss Curve')
-    plt.show()
-
-    # Plot the loss over iterations
-    plt.figure(figsize=(8, 5))
-    plt.plot(mlp.validation_scores_)
-    plt.xlabel('Iteration')
-    plt.ylabel('R2 Score')
-    plt.title('R2 Score Curve')
-    plt.show()
+    # Save the loss and R2 score over iterations
+    output = os.path.join(config.cache_path, "training/")
+    os.makedirs(output, exist_ok=True)
+    save_curves(output, mlp.loss_curve_, mlp.validation_scores_)
 
     # Calculate the R2 score on the test set
     score = mlp.score(X_test, y_test)
     print(f"R2 score (test): {score}")
 
     # Save the model to the cache
-    value_predictor = ValuePredictor()
+    value_predictor = ValuePredictor(download_model=False)
     # Note: we save the scaler, to apply the same normalization to the input data during inference.
     value_predictor.initialize(mlp, label_embedding, scaler)
+    # Export a compact copy of the model, which is used for inference without sklearn.
+    value_predictor.export()
+
+
+def main(arguments: List[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m backend.code.training",
+                                     description="Trains the value predictor.")
+    parser.add_argument("--values-cache", action="store_true",
+                        help="Train on the values cache in memory instead of the generated training set.")
+    parser.add_argument("--training-set", help="The folder of the training set (default: the cache).")
+    parser.add_argument("--output", help="The folder of the checkpoint, metrics and curves (default: the cache).")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of a previous training.")
+    arguments = parser.parse_args(arguments)
+
+    if arguments.values_cache:
+        run()
+        return
+    value_predictor = train(arguments.training_set, arguments.output, arguments.epochs, arguments.batch_size,
+                            resume=not arguments.restart)
+    # Save the model to the cache and export a compact copy of it, which is used for inference without sklearn.
+    value_predictor.save()
+    value_predictor.export()
 
 
 if __name__ == '__main__':
-    run()
+    logging.basicConfig(level=logging.INFO)
+    main()
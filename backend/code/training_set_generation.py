@@ -1,51 +1,149 @@
-import random
+import argparse
+import glob
+import json
+import logging
+import math
+import os
 import time
+from collections import deque
+from typing import Iterator, List
 
-from backend.code import preprocessing, config
+import numpy as np
+
+from backend.code import preprocessing, config, parallel
 from backend.code.location_recommender import LocationRecommender
+from backend.code.query import REGION_GERMANY
+
+# A row of the training set: a founding location, the id of a target tag (see the tags of the manifest)
+# and the exact value of the location for the tag.
+ROW_DTYPE = np.dtype([("latitude", np.float32), ("longitude", np.float32), ("tag", np.int32),
+                      ("value", np.float32)])
+
+# The number of rows per shard, i.e. per .npy file and per task of a worker process.
+SHARD_ROWS = 1000000
 
+# The file describing the training set, written after all shards.
+MANIFEST_FILE = "manifest.json"
 
-def generate():
+logger = logging.getLogger(__name__)
+
+
+def generate(rows: int, folder: str = None, companies=None, workers: int = None, shard_rows: int = SHARD_ROWS,
+             region: str = REGION_GERMANY, seed: int = 0) -> dict:
     """
-    Generates a training set for the location recommender.
-    Values are stored in the normal values cache.
-    This method is just for automizing queries to the recommender.
+    Generates a balanced training set for the value predictor, i.e. the same number of rows for each tag.
+    Each row is a location sampled uniformly from the region together with a tag and the exact value of the
+    location for the tag. The shards are generated by a pool of worker processes, which calculate the values
+    with the spatial index of the tag, and are written to .npy files as they are done.
+    :param rows: The number of rows, rounded up to a multiple of the number of tags.
+    :param folder: The folder of the training set. Defaults to the training set folder in the cache.
+    Existing shards in the folder are replaced.
+    :param companies: The companies. Defaults to the dataset.
+    :param workers: The number of worker processes. Defaults to the number of CPUs.
+    :param shard_rows: The number of rows per shard.
+    :param region: The region the locations are sampled from (see regions.names).
+    :param seed: The seed, the training set is deterministic for a given seed and shard size.
+    :return: The manifest of the training set (see load_manifest).
     """
-    companies = preprocessing.get_companies(config.companies_path)
+    folder = folder or config.training_set_path
+    if companies is None:
+        companies = preprocessing.get_companies(config.companies_path)
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(folder, exist_ok=True)
+    for path in glob.glob(os.path.join(folder, "shard-*.npy")) + [os.path.join(folder, MANIFEST_FILE)]:
+        if os.path.exists(path):
+            os.remove(path)
 
-    labels = []
+    # only used for the coordinates of the target companies, the values are never predicted
+    recommender = LocationRecommender(companies, download_model=False)
+    tags = sorted(recommender.tag_to_coordinates)
+    rows_per_tag = math.ceil(rows / len(tags))
+    n_shards = max(math.ceil(rows_per_tag * len(tags) / shard_rows), 1)
+    # the rows of each tag are spread evenly across the shards
+    sizes = np.array([parallel.shard_sizes(rows_per_tag, n_shards) for _ in tags]).T
+    seeds = parallel.shard_seeds(seed, n_shards)
+    files = [f"shard-{i:05d}.npy" for i in range(n_shards)]
 
-    # Collect all available labels (sector names)
-    for company in companies:
-        for tag in company.tags:
-            if tag not in labels:
-                labels.append(tag)
+    start = time.perf_counter()
+    sampler = parallel.ParallelSampler(recommender.tag_to_coordinates, workers)
+    written = 0
+    # the rows actually written per shard, fewer than planned if the region could not provide enough samples
+    shard_rows_written = [0] * n_shards
+    try:
+        # at most two shards per worker are in flight, such that finished shards are written while others run
+        pending = deque()
+        for i in range(n_shards):
+            pending.append((i, sampler.label(seeds[i], region, sizes[i].tolist(), tags, recommender.M,
+                                             os.path.join(folder, files[i]))))
+            while len(pending) >= 2 * workers or (i == n_shards - 1 and pending):
+                shard, future = pending.popleft()
+                shard_rows_written[shard] = future.result()
+                written += shard_rows_written[shard]
+                seconds = time.perf_counter() - start
+                logger.info("%d of %d rows (%.0f rows/s)", written, rows_per_tag * len(tags), written / seconds)
+    finally:
+        sampler.close()
+    seconds = time.perf_counter() - start
 
-    # Create a location recommender
-    recommender = LocationRecommender(companies, download_model=False)
-    recommender.set_sample_size(100)
+    manifest = {
+        "rows": written,
+        "tags": tags,
+        "shards": [{"file": file, "rows": n} for file, n in zip(files, shard_rows_written)],
+        "dtype": [[name, ROW_DTYPE[name].str] for name in ROW_DTYPE.names],
+        "region": region,
+        "M": recommender.M,
+        "seed": seed,
+        "data": recommender.data_fingerprint,
+        "seconds": seconds,
+        "rows_per_second": written / seconds,
+    }
+    with open(os.path.join(folder, MANIFEST_FILE + ".tmp"), "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(os.path.join(folder, MANIFEST_FILE + ".tmp"), os.path.join(folder, MANIFEST_FILE))
+    logger.info("Generated %d rows in %.1f seconds (%.0f rows/s) with %d workers", written, seconds,
+                written / seconds, workers)
+    return manifest
 
-    time_taken = 0
-    start = time.time()
 
-    # Generate samples for a given amount of hours.
-    hours = 3
-    _n_hours = 60 * 60 * hours
+def load_manifest(folder: str = None) -> dict:
+    """
+    :param folder: The folder of the training set. Defaults to the training set folder in the cache.
+    :return: The manifest, i.e. the number of rows, the tags (indexed by the tag ids of the rows),
+    the shards and the parameters of the generation.
+    """
+    folder = folder or config.training_set_path
+    with open(os.path.join(folder, MANIFEST_FILE)) as file:
+        return json.load(file)
 
-    # Request recommendations for each label, such that we get a balanced training set,
-    # saved into the values cache.
-    while time_taken < _n_hours:
-        for target in labels:
-            recommender.set_target_tags([target])
-            recommendations = recommender.get_attributed_location_recommendations(max_companies=1)
 
-        time_taken = time.time() - start
-        print(f"Time taken: {time_taken / 60} minutes")
-        print(f"Generated samples so far: {len(recommender.values)}")
+def shards(folder: str = None, manifest: dict = None) -> Iterator[np.ndarray]:
+    """
+    :param folder: The folder of the training set. Defaults to the training set folder in the cache.
+    :param manifest: The manifest of the training set. Loaded from the folder if not given.
+    :return: Iterator over the shards as memory-mapped arrays of ROW_DTYPE, i.e. they are read lazily.
+    """
+    folder = folder or config.training_set_path
+    manifest = manifest or load_manifest(folder)
+    for shard in manifest["shards"]:
+        yield np.load(os.path.join(folder, shard["file"]), mmap_mode="r")
 
 
+def main(arguments: List[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m backend.code.training_set_generation",
+                                     description="Generates a balanced training set for the value predictor.")
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument("--output", help="The folder of the training set (default: the cache).")
+    parser.add_argument("--workers", type=int, help="The number of worker processes (default: the number of CPUs).")
+    parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    parser.add_argument("--region", default=REGION_GERMANY)
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args(arguments)
 
+    manifest = generate(arguments.rows, arguments.output, workers=arguments.workers, shard_rows=arguments.shard_rows,
+                        region=arguments.region, seed=arguments.seed)
+    print(f"{manifest['rows']} rows in {manifest['seconds']:.1f} seconds ({manifest['rows_per_second']:.0f} rows/s)")
 
 
 if __name__ == '__main__':
-    generate()
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    main()
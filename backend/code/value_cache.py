@@ -0,0 +1,355 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from backend.code import config
+
+logger = logging.getLogger(__name__)
+
+# How many written or accessed entries are buffered in memory before they are written to the database.
+FLUSH_SIZE = 10000
+
+_MISSING = object()
+
+
+def quantize(x) -> int:
+    """
+    Converts a coordinate to the integer key used by the caches, i.e. the coordinate in units of the rounding_policy.
+    :param x: The coordinate.
+    :return: The quantized coordinate.
+    """
+    return int(round(x * 10 ** config.rounding_digits))
+
+
+def quantize_array(x) -> np.ndarray:
+    """
+    quantize for numpy arrays.
+    """
+    return np.round(np.asarray(x, dtype=np.float64) * 10 ** config.rounding_digits).astype(np.int64)
+
+
+def dequantize(x: int) -> float:
+    """
+    :param x: The quantized coordinate.
+    :return: The coordinate.
+    """
+    return config.rounding_policy(x / 10 ** config.rounding_digits)
+
+
+class LRUCache:
+    """
+    A bounded in-memory cache, which evicts the least recently used entry when it is full.
+    Counts hits and misses of ```get```.
+    """
+
+    def __init__(self, max_entries: int):
+        """
+        :param max_entries: The maximum number of entries.
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Looks up a key and marks it as recently used.
+        :param key: The key.
+        :param default: Returned if the key is not cached.
+        :return: The cached value or default.
+        """
+        value = self.entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def pop(self, key, default=None):
+        return self.entries.pop(key, default)
+
+    def clear(self):
+        self.entries.clear()
+
+    def hit_rate(self) -> float:
+        """
+        :return: The share of ```get``` calls that were hits (0 if there were none).
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0
+
+    def report(self, name: str = "LRU cache"):
+        """
+        Logs a report about the cache containing the number of entries, hits, misses, evictions and the hit rate.
+        :param name: The name of the cache in the report.
+        """
+        logger.info("Cache report for %s: entries: %d (max: %s), hits: %d, misses: %d, evictions: %d, "
+                    "hit rate: %.1f%%", name, len(self), self.max_entries, self.hits, self.misses, self.evictions,
+                    self.hit_rate() * 100)
+
+
+class ValueCache:
+    """
+    A bounded, persistent cache of the values of (location, tag) pairs, i.e. the training set of the value predictor.
+    Keys are ((lat, lon), tag) like in the former pickled dict. They are stored compactly as quantized integer
+    coordinates and a tag id in an SQLite table in the cache folder.
+    New entries and accesses are buffered and appended in batches instead of rewriting the whole cache.
+    If the table exceeds max_entries, the least recently used entries are evicted.
+    """
+
+    def __init__(self, id: str = "values", max_entries: int = None, memory_entries: int = 100000,
+                 persist: bool = True):
+        """
+        :param id: The id of the cache. The cache will be saved in the cache folder with the name <id>.sqlite
+        :param max_entries: The maximum number of entries on disk. Defaults to config.value_cache_max_entries.
+        :param memory_entries: The maximum number of entries kept in memory in front of the database.
+        :param persist: If False, the cache only lives in memory (but is still bounded).
+        """
+        self.max_entries = max_entries if max_entries is not None else config.value_cache_max_entries
+        self.memory = LRUCache(memory_entries)
+        self.lock = threading.RLock()
+
+        # entries and accesses not yet written to the database
+        self.pending = {}
+        self.touched = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if persist:
+            if not os.path.exists(config.cache_path):
+                os.makedirs(config.cache_path)
+            self.cache_file = os.path.join(config.cache_path, id + ".sqlite")
+        else:
+            self.cache_file = ":memory:"
+        migrate = persist and not os.path.exists(self.cache_file)
+
+        self.connection = sqlite3.connect(self.cache_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tags (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS entries (lat INTEGER NOT NULL, lon INTEGER NOT NULL, "
+                                "tag INTEGER NOT NULL, value REAL NOT NULL, last_access INTEGER NOT NULL, "
+                                "PRIMARY KEY (lat, lon, tag)) WITHOUT ROWID")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self.connection.commit()
+
+        self.tag_to_id = dict(self.connection.execute("SELECT name, id FROM tags"))
+        # logical clock of the accesses, used for LRU eviction
+        self.clock = self.connection.execute("SELECT COALESCE(MAX(last_access), 0) FROM entries").fetchone()[0]
+        self.count = self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+        # Import the values cached as pickle by previous versions.
+        old_file = os.path.join(config.cache_path, id + ".pkl")
+        if migrate and os.path.exists(old_file):
+            logger.info("Migrating %s to %s...", old_file, self.cache_file)
+            with open(old_file, "rb") as file:
+                for ((lat, lon), tag), value in pickle.load(file).items():
+                    self.pending[self._key((lat, lon), tag)] = value
+            self.flush()
+
+    def _tag_id(self, tag: str) -> int:
+        tag_id = self.tag_to_id.get(tag)
+        if tag_id is None:
+            # another process may have registered the tag in the meantime
+            with self.connection:
+                self.connection.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (tag,))
+            tag_id = self.connection.execute("SELECT id FROM tags WHERE name = ?", (tag,)).fetchone()[0]
+            self.tag_to_id[tag] = tag_id
+        return tag_id
+
+    def _key(self, position, tag: str):
+        lat, lon = position
+        return quantize(lat), quantize(lon), self._tag_id(tag)
+
+    def _lookup(self, key):
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.pending.get(key, _MISSING)
+        if value is _MISSING:
+            row = self.connection.execute("SELECT value FROM entries WHERE lat = ? AND lon = ? AND tag = ?",
+                                          key).fetchone()
+            if row is None:
+                return _MISSING
+            value = row[0]
+            self.memory[key] = value
+        self.touched.add(key)
+        return value
+
+    def get(self, key, default=None):
+        """
+        Looks up the value of a ((lat, lon), tag) key and counts the hit or miss.
+        :param key: The key.
+        :param default: Returned if the key is not cached.
+        :return: The cached value or default.
+        """
+        with self.lock:
+            value = self._lookup(self._key(*key))
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._maybe_flush()
+            return value
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        with self.lock:
+            found = self._lookup(self._key(*key)) is not _MISSING
+            self._maybe_flush()
+            return found
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            key = self._key(*key)
+            self.memory[key] = value
+            self.pending[key] = value
+            self._maybe_flush()
+
+    def put_many(self, latitudes, longitudes, tag: str, values):
+        """
+        Caches the values of many locations for the same tag.
+        The entries are only buffered for the database, i.e. they do not displace the entries kept in memory.
+        :param latitudes: The latitudes of the locations.
+        :param longitudes: The longitudes of the locations.
+        :param tag: The tag.
+        :param values: The value of each location.
+        """
+        with self.lock:
+            tag_id = self._tag_id(tag)
+            for lat, lon, value in zip(quantize_array(latitudes).tolist(), quantize_array(longitudes).tolist(),
+                                       np.asarray(values, dtype=np.float64).tolist()):
+                key = (lat, lon, tag_id)
+                self.pending[key] = value
+                self.memory.pop(key)
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self.pending) + len(self.touched) >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered entries and accesses to the database and evicts the least recently used entries,
+        if the cache is too large.
+        """
+        with self.lock:
+            if not self.pending and not self.touched:
+                return
+            self.clock += 1
+            clock = self.clock
+            with self.connection:
+                # the new entries are inserted first, such that the row count is tracked without counting the table
+                inserted = self.connection.executemany(
+                    "INSERT OR IGNORE INTO entries (lat, lon, tag, value, last_access) VALUES (?, ?, ?, ?, ?)",
+                    ((*key, value, clock) for key, value in self.pending.items())).rowcount
+                self.count += inserted
+                if inserted < len(self.pending):
+                    self.connection.executemany(
+                        "UPDATE entries SET value = ?, last_access = ? WHERE lat = ? AND lon = ? AND tag = ? "
+                        "AND last_access < ?",
+                        ((value, clock, *key, clock) for key, value in self.pending.items()))
+                self.connection.executemany(
+                    "UPDATE entries SET last_access = ? WHERE lat = ? AND lon = ? AND tag = ?",
+                    ((clock, *key) for key in self.touched if key not in self.pending))
+
+                if self.count > self.max_entries:
+                    # selected and deleted in the same transaction (DELETE ... RETURNING needs SQLite 3.35)
+                    evicted = self.connection.execute(
+                        "SELECT lat, lon, tag FROM entries ORDER BY last_access LIMIT ?",
+                        (self.count - self.max_entries,)).fetchall()
+                    self.connection.executemany("DELETE FROM entries WHERE lat = ? AND lon = ? AND tag = ?", evicted)
+                    for key in evicted:
+                        self.memory.pop(tuple(key))
+                    self.evictions += len(evicted)
+                    self.count -= len(evicted)
+
+            self.pending.clear()
+            self.touched.clear()
+
+    def save(self):
+        """
+        Writes the buffered entries to the database (see ```flush```).
+        """
+        self.flush()
+
+    def __len__(self):
+        with self.lock:
+            self.flush()
+            return self.count
+
+    def items(self):
+        """
+        :return: Iterator over all (((lat, lon), tag), value) pairs in the cache.
+        """
+        self.flush()
+        for lat, lon, tag, value in self.connection.execute(
+                "SELECT entries.lat, entries.lon, tags.name, entries.value FROM entries JOIN tags ON entries.tag = tags.id"):
+            yield ((dequantize(lat), dequantize(lon)), tag), value
+
+    def keys(self):
+        """
+        :return: Iterator over all ((lat, lon), tag) keys in the cache.
+        """
+        for key, _ in self.items():
+            yield key
+
+    def clear(self):
+        """
+        Removes all entries from the cache (including the database).
+        """
+        with self.lock:
+            self.memory.clear()
+            self.pending.clear()
+            self.touched.clear()
+            with self.connection:
+                self.connection.execute("DELETE FROM entries")
+            self.count = 0
+
+    def close(self):
+        """
+        Writes the buffered entries and closes the database.
+        """
+        self.flush()
+        self.connection.close()
+
+    def hit_rate(self) -> float:
+        """
+        :return: The share of ```get``` calls that were hits (0 if there were none).
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0
+
+    def report(self):
+        """
+        Logs a report about the cache containing the number of entries, hits, misses, evictions and the hit rate.
+        """
+        logger.info("Cache report for %s: entries: %d (max: %s), hits: %d, misses: %d, evictions: %d, "
+                    "hit rate: %.1f%%", self.cache_file, len(self), self.max_entries, self.hits, self.misses,
+                    self.evictions, self.hit_rate() * 100)
@@ -1,6 +1,18 @@
+import hashlib
+import logging
+import os
 import pickle
 
+import numpy as np
+
+from backend.code import artifacts, config, metrics
 from backend.code.cache import Cache
+from backend.code.numpy_predictor import NumpyValuePredictor
+
+# How many feature vectors are passed to the model at once.
+PREDICTION_CHUNK_SIZE = 65536
+
+logger = logging.getLogger(__name__)
 
 
 class ValuePredictor:
@@ -8,42 +20,68 @@ class ValuePredictor:
     A class which can predict the value of a given founding location and label (sector).
     """
     def __init__(self, download_model=True):
+        """
+        :param download_model: If True, use the model of the hub from the artifact registry, otherwise the locally
+        generated one. If the model is not available (or corrupt), the predictor is not initialized,
+        i.e. the values are calculated by the Monte Carlo simulation.
+        """
+        model, label_embedding, scalar = [], [], []
         if download_model:
-            from huggingface_hub import hf_hub_download
-
-            REPO_ID = "grasper/market-segmentation"
-            FILENAME = "value_predictor_model.pkl"
-
-            path = hf_hub_download(repo_id=REPO_ID, filename=FILENAME)
-            print("Using value_predictor_model downloaded from HuggingFace Hub.")
-            with open(path, "rb") as file:
-                model, label_embedding, scalar = pickle.load(file)
+            # The model of the hub is fetched by the warmup command, never at startup (see artifacts.py).
+            if artifacts.registry().entry(artifacts.MODEL) is not None:
+                try:
+                    path = artifacts.registry().path(artifacts.MODEL)
+                    with open(path, "rb") as file:
+                        model, label_embedding, scalar = pickle.load(file)
+                    logger.info("Using value_predictor_model %s from the hub.",
+                                artifacts.registry().version(artifacts.MODEL))
+                except (artifacts.ArtifactError, OSError, pickle.UnpicklingError, EOFError) as e:
+                    logger.error("The value_predictor_model of the hub cannot be loaded, falling back to "
+                                 "Monte Carlo: %s", e)
+            else:
+                logger.warning("The value_predictor_model of the hub is not available locally, "
+                               "run python -m backend.code.artifacts warmup.")
         else:
-            print("Trying to use locally generated value_predictor_model.")
+            logger.info("Trying to use locally generated value_predictor_model.")
             model, label_embedding, scalar = Cache("value_predictor_model", ([], [], []), verbose=False).value
 
 
         self.model = model
         self.label_embedding = label_embedding
         self.scalar = scalar
+        self._index_labels()
 
         if self.is_initialized():
-            print("[OK] ValuePredictor initialized successfully.")
+            logger.info("ValuePredictor initialized successfully.")
         else:
-            print("[ERROR] No ValuePredictor model available.")
+            logger.warning("No ValuePredictor model available.")
 
-    def initialize(self, model, label_embedding, scalar):
+    def initialize(self, model, label_embedding, scalar, save=True):
         """
         Initializes the ValuePredictor with the given model, label embedding and scalar.
         :param model: The model to use for prediction.
         :param label_embedding: The label embedding to use for prediction.
         :param scalar: The scalar to use for normalization before prediction.
+        :param save: If True, save the ValuePredictor to the cache.
         :return:
         """
         self.model = model
         self.label_embedding = label_embedding
         self.scalar = scalar
-        self.save()
+        self._index_labels()
+        if save:
+            self.save()
+
+    def _index_labels(self):
+        """
+        Stacks the label embeddings into a matrix, such that labels can be embedded by indexing.
+        """
+        self.label_to_index = {}
+        self.embedding_matrix = None
+        if self.label_embedding:
+            self.label_to_index = {label: i for i, label in enumerate(self.label_embedding)}
+            self.embedding_matrix = np.stack([np.asarray(self.label_embedding[label], dtype=np.float64)
+                                              for label in self.label_embedding])
 
     def is_initialized(self):
         """
@@ -52,21 +90,52 @@ class ValuePredictor:
         """
         return self.model
 
+    def fingerprint(self) -> str:
+        """
+        :return: A hash of the model, which changes whenever the predictions may change.
+        """
+        if not self.is_initialized():
+            return "none"
+        model_hash = hashlib.sha1()
+        for array in self.model.coefs_ + self.model.intercepts_ + [self.scalar.mean_, self.scalar.scale_]:
+            model_hash.update(np.ascontiguousarray(array).tobytes())
+        model_hash.update(",".join(self.label_to_index).encode())
+        return model_hash.hexdigest()
+
     def predict(self, data):
         """
         Predicts the value of the given data.
         :param data: Tuple of (lat, lon, label) to predict the value for.
         :return: The predicted value.
         """
-        feature_vectors = []
-        for x in data:
-            lat, lon, label = x
-            embedded_label = self.label_embedding[label]
-            feature_vector = [lat, lon] + embedded_label.tolist()
-            feature_vectors.append(feature_vector)
+        latitudes = [lat for lat, _, _ in data]
+        longitudes = [lon for _, lon, _ in data]
+        labels = [label for _, _, label in data]
+        return self.predict_arrays(latitudes, longitudes, labels)
+
+    def predict_arrays(self, latitudes, longitudes, labels, chunk_size: int = PREDICTION_CHUNK_SIZE):
+        """
+        Predicts the values of many (lat, lon, label) triples given as arrays.
+        :param latitudes: The latitudes of the founding locations.
+        :param longitudes: The longitudes of the founding locations.
+        :param labels: The label of each founding location.
+        :param chunk_size: How many feature vectors are passed to the model at once.
+        :return: The predicted values as numpy array.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        # look up each distinct label only once
+        unique_labels, inverse = np.unique(np.asarray(labels), return_inverse=True)
+        label_indices = np.array([self.label_to_index[label] for label in unique_labels], dtype=np.intp)[inverse]
 
-        feature_vectors = self.scalar.transform(feature_vectors)
-        predictions = self.model.predict(feature_vectors)
+        predictions = np.zeros(len(latitudes))
+        for start in range(0, len(latitudes), chunk_size):
+            end = start + chunk_size
+            feature_vectors = np.column_stack((latitudes[start:end], longitudes[start:end],
+                                               self.embedding_matrix[label_indices[start:end]]))
+            feature_vectors = self.scalar.transform(feature_vectors)
+            metrics.MODEL_BATCH_SIZE.observe(len(feature_vectors))
+            predictions[start:end] = self.model.predict(feature_vectors)
 
         return predictions
 
@@ -81,8 +150,61 @@ class ValuePredictor:
         x = self.predict([(lat, lon, label)])[0]
         return x
 
+    def export(self, path: str = None):
+        """
+        Exports the weights, biases, scaler and label embedding as compact .npz file,
+        which can be used for inference without sklearn (see NumpyValuePredictor).
+        :param path: The path of the .npz file. Defaults to the path of the locally generated model.
+        """
+        if path is None:
+            path = export_path(download_model=False)
+        if self.model.activation != "relu" or self.model.out_activation_ != "identity":
+            raise ValueError("only MLPs with relu activation and identity output can be exported")
+
+        arrays = {f"weight_{i}": w for i, w in enumerate(self.model.coefs_)}
+        arrays.update({f"bias_{i}": b for i, b in enumerate(self.model.intercepts_)})
+        np.savez(path, n_layers=len(self.model.coefs_), scaler_mean=self.scalar.mean_,
+                 scaler_scale=self.scalar.scale_, labels=np.array(list(self.label_to_index)),
+                 embedding_matrix=self.embedding_matrix, **arrays)
+
     def save(self):
         """
         Saves the ValuePredictor to the cache.
         """
         Cache("value_predictor_model", (self.model, self.label_embedding, self.scalar)).save()
+
+
+def export_path(download_model: bool) -> str:
+    """
+    :param download_model: Whether the path of the downloaded or of the locally generated model is requested.
+    :return: The path of the exported (.npz) value predictor model in the cache folder.
+    The export of the downloaded model is keyed by its artifact version, such that a new version is exported again.
+    """
+    if not download_model:
+        return os.path.join(config.cache_path, "value_predictor_model.npz")
+    version = artifacts.registry().version(artifacts.MODEL)
+    file_name = f"value_predictor_model_hub-{version}.npz" if version else "value_predictor_model_hub.npz"
+    return os.path.join(config.cache_path, file_name)
+
+
+def load_value_predictor(download_model=True):
+    """
+    Loads the value predictor used for inference.
+    Prefers the exported model, which runs without sklearn. Otherwise, the pickled model is loaded
+    (and downloaded if requested) and exported, such that the next start is faster.
+    :param download_model: If True, use the model from the cloud. If False, use a self trained model.
+    :return: A NumpyValuePredictor or a ValuePredictor, which is not initialized if no model is available.
+    """
+    path = export_path(download_model)
+    if os.path.exists(path):
+        logger.info("Using exported value_predictor_model %s.", os.path.basename(path))
+        return NumpyValuePredictor.load(path)
+
+    value_predictor = ValuePredictor(download_model=download_model)
+    if not value_predictor.is_initialized():
+        return value_predictor
+
+    if not os.path.exists(config.cache_path):
+        os.makedirs(config.cache_path)
+    value_predictor.export(path)
+    return NumpyValuePredictor.load(path)
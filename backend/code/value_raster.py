@@ -0,0 +1,211 @@
+import json
+import math
+import os
+import time
+from typing import List
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+from backend.code import config, preprocessing
+from backend.code.company import Company
+from backend.code.company_store import as_store
+from backend.code.location_recommender import GERMANY_LAT_MIN, GERMANY_LAT_MAX, GERMANY_LON_MIN, GERMANY_LON_MAX
+from backend.code.scoring import haversine
+
+RASTERS_FILE = "value_rasters.npy"
+MANIFEST_FILE = "value_rasters.json"
+
+# The kernel depends on the latitude, since longitudes get closer towards the poles.
+# The rows of the raster are convolved in bands of this height (in degrees), each with the kernel of its center.
+BAND_HEIGHT = 1.0
+
+
+def cone_kernel(resolution: float, M: float, latitude: float) -> np.ndarray:
+    """
+    Creates the linear vicinity kernel, i.e. the value a target contributes to the surrounding cells.
+    :param resolution: The cell size in degrees.
+    :param M: The maximum distance in km to consider for the value of a founding location.
+    :param latitude: The latitude at which the kernel is evaluated.
+    :return: The kernel as 2D array (rows = latitude, columns = longitude) with the target in its center.
+    """
+    # number of cells covered by M in each direction (generous, the cone is 0 outside of M)
+    lat_radius = int(math.ceil(M / haversine(latitude, 0, latitude + resolution, 0)))
+    lon_radius = int(math.ceil(M / haversine(latitude, 0, latitude, resolution)))
+
+    lat_offsets = np.arange(-lat_radius, lat_radius + 1) * resolution
+    lon_offsets = np.arange(-lon_radius, lon_radius + 1) * resolution
+    distances = haversine(latitude, 0, latitude + lat_offsets[:, None], lon_offsets[None, :])
+    return np.maximum((M - distances) / M, 0)
+
+
+def count_raster(latitudes, longitudes, lat_min: float, lon_min: float, shape, resolution: float) -> np.ndarray:
+    """
+    Counts the companies per cell.
+    :param latitudes: The latitudes of the companies.
+    :param longitudes: The longitudes of the companies.
+    :param lat_min: The latitude of the lower edge of the raster.
+    :param lon_min: The longitude of the left edge of the raster.
+    :param shape: The shape (rows, columns) of the raster.
+    :param resolution: The cell size in degrees.
+    :return: The number of companies per cell. Companies outside the raster are ignored.
+    """
+    rows = np.floor((np.asarray(latitudes) - lat_min) / resolution).astype(np.int64)
+    cols = np.floor((np.asarray(longitudes) - lon_min) / resolution).astype(np.int64)
+    inside = (rows >= 0) & (rows < shape[0]) & (cols >= 0) & (cols < shape[1])
+
+    counts = np.zeros(shape, dtype=np.float64)
+    np.add.at(counts, (rows[inside], cols[inside]), 1)
+    return counts
+
+
+def value_raster(latitudes, longitudes, lat_min: float, lat_max: float, lon_min: float, lon_max: float,
+                 resolution: float, M: float) -> np.ndarray:
+    """
+    Calculates the value of founding a company in each cell of the bounding box,
+    by convolving the company counts with the linear vicinity kernel.
+    :note: Targets and founding locations are snapped to the cell centers,
+    so a single target contributes an error of at most (cell diagonal / M) to the value of a cell.
+    :param latitudes: The latitudes of the target companies.
+    :param longitudes: The longitudes of the target companies.
+    :param lat_min: The lower latitude of the bounding box.
+    :param lat_max: The upper latitude of the bounding box.
+    :param lon_min: The lower longitude of the bounding box.
+    :param lon_max: The upper longitude of the bounding box.
+    :param resolution: The cell size in degrees.
+    :param M: The maximum distance in km to consider for the value of a founding location.
+    :return: The value raster (rows = latitude, columns = longitude) as float32 array.
+    """
+    rows = int(math.ceil((lat_max - lat_min) / resolution))
+    cols = int(math.ceil((lon_max - lon_min) / resolution))
+
+    # Targets outside the bounding box contribute to the cells at its border.
+    # Hence, count the companies on a raster padded by the largest kernel.
+    widest = cone_kernel(resolution, M, max(abs(lat_min), abs(lat_max)))
+    pad_rows, pad_cols = widest.shape[0] // 2, widest.shape[1] // 2
+    counts = count_raster(latitudes, longitudes, lat_min - pad_rows * resolution, lon_min - pad_cols * resolution,
+                          (rows + 2 * pad_rows, cols + 2 * pad_cols), resolution)
+
+    raster = np.zeros((rows, cols), dtype=np.float32)
+    band_rows = max(1, int(round(BAND_HEIGHT / resolution)))
+    for start in range(0, rows, band_rows):
+        end = min(start + band_rows, rows)
+        center = lat_min + (start + end) / 2 * resolution
+        kernel = cone_kernel(resolution, M, center)
+        kernel_rows = kernel.shape[0] // 2
+
+        # only convolve the rows of the band and the rows the kernel reaches from there
+        slab = counts[pad_rows + start - kernel_rows:pad_rows + end + kernel_rows]
+        values = fftconvolve(slab, kernel, mode="same")
+        raster[start:end] = values[kernel_rows:kernel_rows + end - start, pad_cols:pad_cols + cols]
+
+    # FFT round-off may produce tiny negative values for empty regions
+    np.maximum(raster, 0, out=raster)
+    return raster
+
+
+def build(companies: List[Company], resolution: float = config.raster_resolution, M: float = 30):
+    """
+    Precomputes the value raster of every tag in the dataset over the bounding box of Germany
+    and saves them (memory mappable) to the cache folder.
+    :param companies: All companies in the dataset (CompanyStore or list of Company objects).
+    :param resolution: The cell size in degrees.
+    :param M: The maximum distance in km to consider for the value of a founding location.
+    """
+    store = as_store(companies)
+    owners, tag_ids = store.tag_owners(), np.asarray(store.tag_ids)
+    tags = sorted(store.tags)
+    rows = int(math.ceil((GERMANY_LAT_MAX - GERMANY_LAT_MIN) / resolution))
+    cols = int(math.ceil((GERMANY_LON_MAX - GERMANY_LON_MIN) / resolution))
+
+    if not os.path.exists(config.cache_path):
+        os.makedirs(config.cache_path)
+
+    print(f"Building value rasters for {len(tags)} tags with shape {(rows, cols)}...")
+    start = time.time()
+    rasters = np.lib.format.open_memmap(os.path.join(config.cache_path, RASTERS_FILE), mode="w+", dtype=np.float32,
+                                        shape=(len(tags), rows, cols))
+    for i, tag in enumerate(tags):
+        targets = np.unique(owners[tag_ids == store.tags.index(tag)])
+        rasters[i] = value_raster(store.latitudes[targets], store.longitudes[targets],
+                                  GERMANY_LAT_MIN, GERMANY_LAT_MAX, GERMANY_LON_MIN, GERMANY_LON_MAX, resolution, M)
+    rasters.flush()
+    del rasters
+
+    manifest = {
+        "tags": tags,
+        "lat_min": GERMANY_LAT_MIN,
+        "lon_min": GERMANY_LON_MIN,
+        "resolution": resolution,
+        "M": M,
+    }
+    with open(os.path.join(config.cache_path, MANIFEST_FILE), "w") as file:
+        json.dump(manifest, file)
+
+    print(f"Value rasters built in {config.rounding_policy(time.time() - start)} seconds")
+
+
+class ValueRasters:
+    """
+    The precomputed value rasters of all tags, which answer value queries by a lookup.
+    """
+
+    def __init__(self, rasters: np.ndarray, tags: List[str], lat_min: float, lon_min: float, resolution: float,
+                 M: float):
+        """
+        :param rasters: The rasters as array of shape (tags, rows, columns).
+        :param tags: The tag of each raster.
+        :param lat_min: The latitude of the lower edge of the rasters.
+        :param lon_min: The longitude of the left edge of the rasters.
+        :param resolution: The cell size in degrees.
+        :param M: The maximum distance in km the rasters were built with.
+        """
+        self.rasters = rasters
+        self.tag_to_raster = {tag: i for i, tag in enumerate(tags)}
+        self.lat_min = lat_min
+        self.lon_min = lon_min
+        self.resolution = resolution
+        self.M = M
+
+    @staticmethod
+    def load():
+        """
+        Loads the value rasters built by ```build``` from the cache folder (memory mapped).
+        :return: The value rasters or None, if they were not built yet.
+        """
+        rasters_file = os.path.join(config.cache_path, RASTERS_FILE)
+        manifest_file = os.path.join(config.cache_path, MANIFEST_FILE)
+        if not os.path.exists(rasters_file) or not os.path.exists(manifest_file):
+            return None
+
+        with open(manifest_file) as file:
+            manifest = json.load(file)
+        rasters = np.load(rasters_file, mmap_mode="r")
+        return ValueRasters(rasters, manifest["tags"], manifest["lat_min"], manifest["lon_min"],
+                            manifest["resolution"], manifest["M"])
+
+    def has_tag(self, tag: str) -> bool:
+        return tag in self.tag_to_raster
+
+    def lookup(self, latitudes, longitudes, tags: List[str]) -> np.ndarray:
+        """
+        Looks up the values of founding locations, summed over the given tags.
+        :param latitudes: The latitudes of the founding locations.
+        :param longitudes: The longitudes of the founding locations.
+        :param tags: The target tags.
+        :return: The value of each founding location. Locations outside the rasters have a value of 0.
+        """
+        shape = self.rasters.shape[1:]
+        rows = np.floor((np.asarray(latitudes) - self.lat_min) / self.resolution).astype(np.int64)
+        cols = np.floor((np.asarray(longitudes) - self.lon_min) / self.resolution).astype(np.int64)
+        inside = (rows >= 0) & (rows < shape[0]) & (cols >= 0) & (cols < shape[1])
+
+        values = np.zeros(len(rows))
+        for tag in tags:
+            if tag in self.tag_to_raster:
+                values[inside] += self.rasters[self.tag_to_raster[tag]][rows[inside], cols[inside]]
+        return values
+
+
+if __name__ == '__main__':
+    build(preprocessing.get_companies(config.companies_path))
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from backend.code import artifacts, config
+from backend.code.artifacts import ArtifactRegistry, ArtifactError, MANIFEST_FILE, MODEL
+from backend.code.value_predictor import load_value_predictor
+
+
+class TestArtifacts(unittest.TestCase):
+    """
+    Tests the local registry of the dataset and model files.
+    """
+
+    def test_registry(self):
+        """
+        Tests that artifacts are stored content-hashed, versioned in the manifest and verified on use.
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            source = os.path.join(folder, "model.pkl")
+            with open(source, "wb") as file:
+                file.write(b"first")
+            registry = ArtifactRegistry(os.path.join(folder, "artifacts"))
+            with self.assertRaises(ArtifactError):
+                registry.path(MODEL)
+            assert registry.version(MODEL) is None
+
+            first = registry.add(MODEL, source)
+            assert first["file"] == f"model-{first['version']}.pkl"
+            with open(registry.path(MODEL), "rb") as file:
+                assert file.read() == b"first"
+
+            # a new version replaces the old file, the manifest is shared by all registries of the folder
+            with open(source, "wb") as file:
+                file.write(b"second")
+            second = registry.add(MODEL, source)
+            assert second["version"] != first["version"]
+            assert not os.path.exists(os.path.join(registry.folder, first["file"]))
+            reloaded = ArtifactRegistry(registry.folder)
+            assert reloaded.versions() == {MODEL: second["version"]}
+            with open(os.path.join(registry.folder, MANIFEST_FILE)) as file:
+                assert json.load(file)[MODEL]["sha256"] == second["sha256"]
+
+            # files which do not match their checksum are rejected
+            with open(reloaded.path(MODEL), "wb") as file:
+                file.write(b"corrupted")
+            with self.assertRaises(ArtifactError):
+                reloaded.path(MODEL)
+
+    def test_corrupt_model(self):
+        """
+        Tests that a model, which does not match its checksum, falls back to Monte Carlo instead of failing.
+        """
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(config, "cache_path", folder):
+            source = os.path.join(folder, "model.pkl")
+            with open(source, "wb") as file:
+                file.write(b"model")
+            registry = ArtifactRegistry(os.path.join(folder, "artifacts"))
+            with open(os.path.join(registry.folder, registry.add(MODEL, source)["file"]), "wb") as file:
+                file.write(b"corrupted")
+
+            with mock.patch.object(artifacts, "_registry", registry):
+                assert not load_value_predictor(download_model=True).is_initialized()
@@ -0,0 +1,41 @@
+import unittest
+
+from backend.benchmark import suite
+from backend.code.query import REGION_GERMANY, REGION_SAARLAND
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    """
+    Tests the configurations and the regression check of the benchmark suite.
+    """
+
+    def test_configurations(self):
+        """
+        Tests that the configurations vary one parameter at a time and contain the baseline once.
+        """
+        profile = {"sample_size": [1000, suite.BASELINE["sample_size"]], "tags": [3], "k": [suite.BASELINE["k"]],
+                   "region": [REGION_SAARLAND, REGION_GERMANY], "engine": [suite.ENGINE_GRID]}
+        configurations = suite.configurations(profile)
+
+        assert configurations[0] == suite.BASELINE
+        assert configurations[1:] == [dict(suite.BASELINE, sample_size=1000), dict(suite.BASELINE, tags=3),
+                                      dict(suite.BASELINE, region=REGION_SAARLAND),
+                                      dict(suite.BASELINE, engine=suite.ENGINE_GRID)]
+        for configuration in configurations:
+            assert sum(configuration[parameter] != suite.BASELINE[parameter]
+                       for parameter in suite.PARAMETERS) <= 1
+
+    def test_compare(self):
+        """
+        Tests that only configurations, which are slower than the threshold, are regressions.
+        """
+        def results(*medians):
+            return {"timestamp": "", "environment": {},
+                    "results": [dict(suite.BASELINE, k=k, median_seconds=median) for k, median in enumerate(medians)]}
+
+        baseline = results(1.0, 1.0, 1.0)
+        current = results(1.2, 1.3, 0.5, 2.0)
+        # the last configuration is not in the baseline
+        assert suite.compare(baseline, current) == [(suite.key(dict(suite.BASELINE, k=1)), 1.0, 1.3)]
+        assert [regression[0] for regression in suite.compare(baseline, current, threshold=1.1)] == \
+               [suite.key(dict(suite.BASELINE, k=0)), suite.key(dict(suite.BASELINE, k=1))]
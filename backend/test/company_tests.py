@@ -0,0 +1,34 @@
+import pickle
+import unittest
+
+from backend.code.company import Company, CompanyType
+
+
+class TestCompany(unittest.TestCase):
+    """
+    Tests the compact representation of companies.
+    """
+
+    def test_slots_and_interned_tags(self):
+        """
+        Tests that companies have no __dict__ and that companies with the same tags share them.
+        """
+        first = Company(type=CompanyType.TARGET, tags=["IT", "Bau"], latitude=49.2, longitude=7.0)
+        second = Company(type=CompanyType.TARGET, tags=("IT", "Bau"), latitude=49.3, longitude=7.1)
+        assert not hasattr(first, "__dict__")
+        assert first.tags == ("IT", "Bau") and first.tags is second.tags
+        assert Company(type=CompanyType.TARGET, tags="IT", latitude=49.2, longitude=7.0).tags == ("IT",)
+        assert "'latitude': 49.2" in str(first)
+
+        restored = pickle.loads(pickle.dumps(first))
+        assert restored.get_lat_long() == first.get_lat_long() and restored.tags is first.tags
+
+    def test_unpickle_dict_state(self):
+        """
+        Tests that companies pickled before __slots__ (with a __dict__ state) can still be loaded.
+        """
+        company = Company.__new__(Company)
+        company.__setstate__({"name": "A", "type": CompanyType.TARGET, "tags": ["IT"], "latitude": 49.2,
+                              "longitude": 7.0, "value": 1.0})
+        assert company.tags == ("IT",) and company.targets is None
+        assert company.to_map() == {"geolocation": {"latitude": 49.2, "longitude": 7.0}, "value": 1.0}
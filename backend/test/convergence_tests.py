@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from backend.code.company import Company, CompanyType
+from backend.code.convergence import calibrate, SampleSizeCalibration
+from backend.code.location_recommender import LocationRecommender
+from backend.code.query import RecommendationQuery, REGION_GERMANY, REGION_SAARLAND, SAMPLE_SIZE_AUTO
+
+
+class TestConvergence(unittest.TestCase):
+    """
+    Tests the calibration of the sample sizes.
+    """
+
+    recommender = LocationRecommender([Company(type=CompanyType.TARGET, tags=["IT" if i % 2 else "Food"],
+                                               latitude=49.2 + i / 100, longitude=6.5 + i / 50) for i in range(60)],
+                                      download_model=False, sample_size=1234)
+
+    def test_calibrate(self):
+        """
+        Tests that the calibrated sample sizes are measured ones meeting the tolerances, if any does.
+        """
+        sample_sizes = (200, 1000, 3000)
+        calibration = calibrate(self.recommender, regions=[REGION_SAARLAND], k=3, sample_sizes=sample_sizes,
+                                seeds=range(2), reference_size=10000)
+
+        assert calibration.data == self.recommender.data_fingerprint
+        for tag in ["IT", "Food"]:
+            size = calibration.sizes[REGION_SAARLAND][tag]
+            assert size in sample_sizes
+            curve = calibration.curves[REGION_SAARLAND][tag]
+            assert [entry[0] for entry in curve] == list(sample_sizes)
+            _, error, stable = curve[sample_sizes.index(size)]
+            assert (error <= 0.05 and stable >= 0.8) or size == sample_sizes[-1]
+
+    def test_resolve(self):
+        """
+        Tests that automatic sample sizes use the largest calibrated size of the tags, and the default otherwise.
+        """
+        calibration = SampleSizeCalibration({REGION_GERMANY: {"IT": 5000, "Food": 2000},
+                                             REGION_SAARLAND: {"IT": 1000}}, data="test")
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "sample_sizes.json")
+            calibration.save(path)
+            calibration = SampleSizeCalibration.load(path)
+            assert SampleSizeCalibration.load(os.path.join(folder, "missing.json")) is None
+
+        recommender = LocationRecommender(self.recommender.companies, download_model=False, sample_size=1234)
+        recommender.set_sample_size_calibration(calibration)
+
+        def resolved(tags, region, sample_size=SAMPLE_SIZE_AUTO):
+            query = RecommendationQuery(tags=tags, region=region, sample_size=sample_size)
+            return recommender.resolve(query).sample_size
+
+        assert resolved(["IT", "Food"], REGION_GERMANY) == 5000
+        assert resolved(["IT"], REGION_SAARLAND) == 1000
+        # uncalibrated regions use the sizes of Germany, uncalibrated tags the default
+        assert resolved(["Food"], "bavaria") == 2000
+        assert resolved(["IT", "Food"], REGION_SAARLAND) == 1234
+        assert resolved(["IT"], REGION_SAARLAND, 777) == 777
+
+        assert len(recommender.recommend(RecommendationQuery(tags=["IT"], region=REGION_SAARLAND, k=2,
+                                                             sample_size=SAMPLE_SIZE_AUTO, seed=0))) == 2
+        with self.assertRaises(ValueError):
+            RecommendationQuery(tags=["IT"], sample_size="many")
@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+
+from backend.code.company import Company, CompanyType
+from backend.code.grid_recommender import GridRecommender
+from backend.code import regions
+from backend.code.location_recommender import LocationRecommender
+from backend.code.query import RecommendationQuery, REGION_SAARLAND, SAMPLER_ADAPTIVE
+from backend.code.result_cache import ResultCache
+from backend.code.selection import geodesic_distance
+
+
+class TestGridRecommender(unittest.TestCase):
+    """
+    Tests the grid search recommender.
+    """
+
+    def test_grid_recommendations(self):
+        """
+        Tests that the grid recommendations are 𝛿-distinct, have exact values
+        and are at least as good as Monte Carlo recommendations (up to the lattice resolution).
+        """
+        rng = np.random.default_rng(0)
+        lat_min, lat_max, lon_min, lon_max = regions.get(REGION_SAARLAND).bounds
+        companies = [Company(type=CompanyType.TARGET, tags=[tag], latitude=round(rng.uniform(lat_min, lat_max), 3),
+                             longitude=round(rng.uniform(lon_min, lon_max), 3))
+                     for tag in ["A", "B"] for _ in range(200)]
+        recommender = LocationRecommender(companies, download_model=False)
+        grid_recommender = GridRecommender(recommender, resolution=0.005)
+
+        query = RecommendationQuery(tags=["A", "B"], region=REGION_SAARLAND, delta=10, k=5, sample_size=5000, seed=0)
+        recommendations = grid_recommender.recommend(query)
+        assert len(recommendations) == 5
+
+        values = [r.value for r in recommendations]
+        assert values == sorted(values, reverse=True)
+        np.testing.assert_allclose(values, grid_recommender.exact_values([r.latitude for r in recommendations],
+                                                                         [r.longitude for r in recommendations],
+                                                                         ["A", "B"]))
+        for i, first in enumerate(recommendations):
+            assert lat_min <= first.latitude <= lat_max and lon_min <= first.longitude <= lon_max
+            for second in recommendations[i + 1:]:
+                assert geodesic_distance(*first.get_lat_long(), *second.get_lat_long()) > query.delta
+
+        if not recommender.value_predictor.is_initialized():
+            monte_carlo = recommender.recommend(query)
+            # a cell center is at most ~0.4km from any sample, i.e. each target contributes at most 0.4 / M less
+            assert values[0] >= monte_carlo[0].value - 0.4 / recommender.M * len(companies)
+
+    def test_result_cache_key(self):
+        """
+        Tests that grid queries, which only differ in the ignored sample size, seed and sampler, share a cached result,
+        while Monte Carlo queries do not.
+        """
+        recommender = LocationRecommender([Company(type=CompanyType.TARGET, tags=["A"], latitude=49.3 + i / 100,
+                                                   longitude=7 + i / 50) for i in range(50)], download_model=False)
+        grid_recommender = GridRecommender(recommender, resolution=0.01)
+        cache = ResultCache()
+        queries = [RecommendationQuery(tags=["A"], region=REGION_SAARLAND, k=3, sample_size=1000, seed=1),
+                   RecommendationQuery(tags=["A"], region=REGION_SAARLAND, k=3, sample_size=5000,
+                                       sampler=SAMPLER_ADAPTIVE)]
+        results = [[r.to_map() for r in cache.recommend(grid_recommender, query)] for query in queries]
+        assert results[0] == results[1]
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        for query in queries:
+            cache.recommend(recommender, query)
+        assert (cache.hits, cache.misses) == (1, 2)
+
+        # the result for a smaller k is not served as prefix of a larger one, but equals the direct result
+        small = RecommendationQuery(tags=["A"], region=REGION_SAARLAND, k=1, seed=1)
+        assert [r.to_map() for r in cache.recommend(grid_recommender, small)] == \
+               [r.to_map() for r in grid_recommender.recommend(small)]
+        assert (cache.hits, cache.misses) == (1, 3)
@@ -0,0 +1,119 @@
+import threading
+import unittest
+
+from backend.code.company import Company, CompanyType
+from backend.code.jobs import JobManager, QueueFullError, DONE, CANCELLED, LANE_INTERACTIVE, LANE_HEAVY, lane_of
+from backend.code.location_recommender import LocationRecommender
+from backend.code.query import RecommendationQuery, REGION_SAARLAND
+from backend.code.result_cache import ResultCache
+from backend.test.result_cache_tests import EarlyStoppingRecommender
+
+
+class BlockingRecommender:
+    """
+    Reports progress until it is released, such that jobs can be observed while they run.
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def version(self):
+        return "blocking"
+
+    def resolve(self, query):
+        return query
+
+    def recommend(self, query, progress=None):
+        self.started.set()
+        while not self.release.wait(0.01):
+            progress(0, query.sample_size, [])
+        return []
+
+
+class TestJobs(unittest.TestCase):
+    """
+    Tests the background jobs.
+    """
+
+    def test_result_and_deduplication(self):
+        """
+        Tests that a job returns the same recommendations as the recommender
+        and that identical in-flight queries share a job.
+        """
+        recommender = LocationRecommender([Company(type=CompanyType.TARGET, tags=["IT"], latitude=49.3 + i / 100,
+                                                   longitude=7 + i / 50) for i in range(50)], download_model=False)
+        manager = JobManager(recommender)
+        query = RecommendationQuery(tags=["IT"], region=REGION_SAARLAND, k=3, sample_size=25000, seed=1)
+        job = manager.submit(query)
+        assert manager.submit(RecommendationQuery(tags=["IT", "IT"], region=REGION_SAARLAND, k=3,
+                                                  sample_size=25000, seed=1)) is job
+        job.future.result()
+        manager.shutdown()
+
+        assert job.status == DONE and job.scored == job.total == 25000
+        assert job.to_map()["recommendations"] == [r.to_map() for r in recommender.recommend(query)]
+        assert lane_of(query) == LANE_INTERACTIVE
+        assert lane_of(RecommendationQuery(tags=["IT"])) == LANE_HEAVY
+
+    def test_cancel_and_queue_limit(self):
+        """
+        Tests that running and queued jobs can be cancelled and that a full queue rejects jobs.
+        """
+        recommender = BlockingRecommender()
+        manager = JobManager(recommender, lanes={LANE_INTERACTIVE: 1}, max_queued=1)
+        running = manager.submit(RecommendationQuery(tags=["A"], region=REGION_SAARLAND, seed=0))
+        recommender.started.wait(5)
+        queued = manager.submit(RecommendationQuery(tags=["A"], region=REGION_SAARLAND, seed=1))
+        with self.assertRaises(QueueFullError):
+            manager.submit(RecommendationQuery(tags=["A"], region=REGION_SAARLAND, seed=2))
+
+        manager.cancel(queued.id)
+        assert queued.status == CANCELLED
+        manager.cancel(running.id)
+        # resubmitting a cancelled query, which is still running, starts a new job
+        resubmitted = manager.submit(RecommendationQuery(tags=["A"], region=REGION_SAARLAND, seed=0))
+        assert resubmitted is not running
+        running.future.result(5)
+        assert running.status == CANCELLED
+        recommender.release.set()
+        resubmitted.future.result(5)
+        assert resubmitted.status == DONE
+        manager.shutdown()
+
+    def test_follow(self):
+        """
+        Tests that a followed job streams its states until it is done
+        and that it is cancelled once its last follower stops following it.
+        """
+        recommender = EarlyStoppingRecommender(LocationRecommender(
+            [Company(type=CompanyType.TARGET, tags=["IT"], latitude=49.3 + i / 100, longitude=7 + i / 50)
+             for i in range(50)], download_model=False))
+        manager = JobManager(recommender, ResultCache())
+        query = RecommendationQuery(tags=["IT"], region=REGION_SAARLAND, k=1, sample_size=2000, seed=1)
+        states = list(manager.follow(manager.submit(query, early_stop=True, followed=True)))
+        assert states[-1]["status"] == DONE and states[-1]["done"]
+        assert not any(state["done"] for state in states[:-1])
+        assert 0 < states[-1]["scored"] < states[-1]["total"]
+        # the early stopped result is cached
+        cached = list(manager.follow(manager.submit(query, early_stop=True, followed=True)))
+        assert cached[-1]["recommendations"] == states[-1]["recommendations"]
+        assert recommender.runs == 1
+        manager.shutdown()
+
+        recommender = BlockingRecommender()
+        manager = JobManager(recommender, lanes={LANE_INTERACTIVE: 1})
+        followed = manager.submit(RecommendationQuery(tags=["A"], region=REGION_SAARLAND, seed=0), followed=True)
+        pinned = manager.submit(RecommendationQuery(tags=["A"], region=REGION_SAARLAND, seed=1), followed=True)
+        assert manager.submit(RecommendationQuery(tags=["A"], region=REGION_SAARLAND, seed=1)) is pinned
+        for job in [followed, pinned]:
+            stream = manager.follow(job)
+            next(stream)
+            stream.close()
+        assert followed.cancel_requested.is_set()
+        assert not pinned.cancel_requested.is_set()
+        followed.future.result(5)
+        recommender.release.set()
+        pinned.future.result(5)
+        assert followed.status == CANCELLED and pinned.status == DONE
+        manager.shutdown()
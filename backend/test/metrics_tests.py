@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+
+from backend.code import metrics, regions
+from backend.code.company import Company, CompanyType
+from backend.code.location_recommender import LocationRecommender
+from backend.code.query import RecommendationQuery, REGION_SAARLAND
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Tests the instrumentation of the recommendations.
+    """
+
+    def test_render(self):
+        """
+        Tests the Prometheus text format of counters and histograms.
+        """
+        registry = metrics.Registry()
+        counter = registry.counter("test_total", "A counter.", ("kind",))
+        histogram = registry.histogram("test_seconds", "A histogram.", buckets=(0.1, 1))
+        counter.inc(2, kind="a")
+        histogram.observe(0.5)
+        histogram.observe(2)
+
+        lines = registry.render().splitlines()
+        assert "# TYPE test_total counter" in lines
+        assert 'test_total{kind="a"} 2' in lines
+        assert ['test_seconds_bucket{le="0.1"} 0', 'test_seconds_bucket{le="1"} 1', 'test_seconds_bucket{le="+Inf"} 2',
+                'test_seconds_sum 2.5', 'test_seconds_count 2'] == [line for line in lines if
+                                                                   line.startswith("test_seconds_")]
+        with self.assertRaises(ValueError):
+            registry.counter("test_total", "Registered twice.")
+
+    def test_recommendation_stages(self):
+        """
+        Tests that the stages and samples of a recommendation are recorded.
+        """
+        recommender = LocationRecommender([Company(type=CompanyType.TARGET, tags=["IT"], latitude=49.3 + i / 100,
+                                                   longitude=7 + i / 50) for i in range(50)], download_model=False)
+        query = RecommendationQuery(tags=["IT"], region=REGION_SAARLAND, k=3, sample_size=2000, seed=0)
+        samples = metrics.SAMPLES_EVALUATED.get()
+        recommendations = metrics.RECOMMENDATIONS.get()
+
+        with metrics.collect_timings() as timings:
+            recommender.recommend(query)
+        assert set(timings) == {"sampling", "scoring", "selection"}
+        assert metrics.SAMPLES_EVALUATED.get() - samples == 2000
+        assert metrics.RECOMMENDATIONS.get() - recommendations == 1
+        assert "sampling;dur=" in metrics.server_timing(timings)
+
+        # outside of collect_timings, the stages are only recorded in the histogram
+        count = metrics.STAGE_SECONDS.count(stage="scoring")
+        list(recommender.recommend_iter(query))
+        assert metrics.STAGE_SECONDS.count(stage="scoring") > count
+        assert metrics.RECOMMENDATIONS.get() - recommendations == 2
+
+        # only the samples the region provided are counted
+        sample = regions.Region.sample
+        samples = metrics.SAMPLES_EVALUATED.get()
+        with mock.patch.object(regions.Region, "sample", lambda region, rng, n, draw=None: sample(region, rng, n // 2)):
+            recommender.recommend(query)
+        assert metrics.SAMPLES_EVALUATED.get() - samples == 1000
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from backend.code import parallel, regions
+from backend.code.company import Company, CompanyType
+from backend.code.location_recommender import LocationRecommender, ENGINE_INDEXED, ENGINE_VECTORIZED
+from backend.code.query import RecommendationQuery, REGION_SAARLAND
+from backend.code.selection import select_distinct
+
+
+class TestParallel(unittest.TestCase):
+    """
+    Tests the Monte Carlo sampling sharded across worker processes.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        lat_min, lat_max, lon_min, lon_max = regions.get(REGION_SAARLAND).bounds
+        companies = [Company(type=CompanyType.TARGET, tags=[tag], latitude=round(rng.uniform(lat_min, lat_max), 3),
+                             longitude=round(rng.uniform(lon_min, lon_max), 3))
+                     for tag in ["A", "B"] for _ in range(300)]
+        self.recommender = LocationRecommender(companies, download_model=False)
+        if self.recommender.value_predictor.is_initialized():
+            self.skipTest("A locally trained value predictor is used instead of the engines.")
+
+    def tearDown(self):
+        self.recommender.set_workers(1)
+
+    def test_parallel_equals_serial(self):
+        """
+        Tests that the merged candidates of the shards result in the same recommendations
+        as selecting from all samples of all shards, and that the result is deterministic.
+        """
+        workers = 3
+        # few candidates per shard, such that the shards are asked for more
+        parallel.MIN_CANDIDATES, minimum = 1, parallel.MIN_CANDIDATES
+        parallel.CANDIDATES_PER_RECOMMENDATION, per_recommendation = 1, parallel.CANDIDATES_PER_RECOMMENDATION
+        try:
+            for engine in [ENGINE_INDEXED, ENGINE_VECTORIZED]:
+                self.recommender.set_engine(engine)
+                self.recommender.set_workers(workers)
+                query = RecommendationQuery(tags=["A", "B"], region=REGION_SAARLAND, delta=5, k=10, sample_size=3000,
+                                            seed=42)
+                recommendations = self.recommender.recommend(query)
+                assert [r.get_lat_long() for r in self.recommender.recommend(query)] == \
+                       [r.get_lat_long() for r in recommendations]
+
+                # select from all samples of all shards in this process
+                shards = [parallel.sample_shard(seed, REGION_SAARLAND, n) for seed, n in
+                          zip(parallel.shard_seeds(query.seed, workers), parallel.shard_sizes(query.sample_size, workers))]
+                latitudes = np.concatenate([shard[0] for shard in shards])
+                longitudes = np.concatenate([shard[1] for shard in shards])
+                values = self.recommender.values_of(latitudes, longitudes, list(query.tags))
+                selected = select_distinct(latitudes, longitudes, values, query.k, query.delta)
+
+                assert [r.get_lat_long() for r in recommendations] == \
+                       [(latitudes[i], longitudes[i]) for i in selected]
+                np.testing.assert_allclose([r.value for r in recommendations], values[selected])
+        finally:
+            parallel.MIN_CANDIDATES = minimum
+            parallel.CANDIDATES_PER_RECOMMENDATION = per_recommendation
+
+    def test_label_shard_short_region(self):
+        """
+        Tests that a shard of the training set only contains the locations the region provided,
+        if it provided fewer than requested.
+        """
+        sample = regions.Region.sample
+
+        def short_sample(region, rng, n, draw=None):
+            return sample(region, rng, n // 2, draw)
+
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(regions.Region, "sample", short_sample), \
+                mock.patch.dict(parallel._worker, tag_slices={}, indexes={}):
+            path = os.path.join(folder, "shard.npy")
+            assert parallel._label_shard(0, REGION_SAARLAND, [10, 20], ["A", "B"], 1.0, path) == 15
+            rows = np.load(path)
+        assert np.bincount(rows["tag"]).tolist() == [5, 10]
+        assert regions.get(REGION_SAARLAND).contains(rows["latitude"], rows["longitude"]).all()
+
+    def test_run_shard_short_region(self):
+        """
+        Tests that a shard reports the number of samples it scored and returns at most all of them as candidates,
+        if the region provided fewer than requested.
+        """
+        sample = regions.Region.sample
+
+        def short_sample(region, rng, n, draw=None):
+            return sample(region, rng, n // 2, draw)
+
+        with mock.patch.object(regions.Region, "sample", short_sample), \
+                mock.patch.dict(parallel._worker, tag_slices={}, indexes={}, predictor=None):
+            latitudes, longitudes, values, truncated, scored = parallel._run_shard(0, REGION_SAARLAND, 100, ["A"], 1.0,
+                                                                                   True, 10)
+            assert scored == 50 and len(values) == 10 and truncated == 0
+            # more candidates than samples
+            _, _, values, truncated, scored = parallel._run_shard(0, REGION_SAARLAND, 100, ["A"], 1.0, True, 60)
+            assert scored == len(values) == 50 and truncated is None
+
+        def empty_sample(region, rng, n, draw=None):
+            return np.zeros(0), np.zeros(0)
+
+        with mock.patch.object(regions.Region, "sample", empty_sample), \
+                mock.patch.dict(parallel._worker, tag_slices={}, indexes={}, predictor=None):
+            _, _, values, truncated, scored = parallel._run_shard(0, REGION_SAARLAND, 100, ["A"], 1.0, True, 10)
+        assert scored == len(values) == 0 and truncated is None
@@ -1,7 +1,13 @@
+import os
+import tempfile
 import unittest
-from hypothesis import given, strategies as st, assume
 
-from backend.code import preprocessing
+import pandas as pd
+from hypothesis import given, strategies as st, assume, settings
+
+from backend.code import preprocessing, config, ingestion
+from backend.code.company import Company, CompanyType
+from backend.code.company_store import CompanyStore
 
 
 class TestProprocessing(unittest.TestCase):
@@ -24,4 +30,94 @@ class TestProprocessing(unittest.TestCase):
 
         lat_rs, lon_rs = preprocessing.string_to_tuple(input_string)
         assert lat == lat_rs
-        assert lon == lon_rs
\ No newline at end of file
+        assert lon == lon_rs
+
+class TestCompanyStore(unittest.TestCase):
+    """
+    Tests the columnar company store.
+    """
+
+    @given(st.lists(st.tuples(st.text(), st.lists(st.text(), max_size=3),
+                              st.floats(min_value=-90, max_value=90), st.floats(min_value=-180, max_value=180)),
+                    max_size=30))
+    @settings(deadline=None)
+    def test_round_trip(self, rows):
+        """
+        Tests that the companies materialized from a saved and memory mapped store equal the original companies.
+        """
+        companies = [Company(name=name, type=CompanyType.TARGET, tags=tags, latitude=config.rounding_policy(lat),
+                             longitude=config.rounding_policy(lon)) for name, tags, lat, lon in rows]
+        with tempfile.TemporaryDirectory() as folder:
+            CompanyStore.from_companies(companies).save(folder)
+            store = CompanyStore.load(folder)
+
+            assert len(store) == len(companies)
+            for original, materialized in zip(companies, store):
+                assert materialized.name == original.name
+                assert materialized.tags == original.tags
+                assert materialized.get_lat_long() == original.get_lat_long()
+
+    @given(st.lists(st.lists(st.sampled_from(["A", "B", "C", "D"]), max_size=3), max_size=30),
+           st.lists(st.sampled_from(["A", "B", "C", "D", "E"]), max_size=3))
+    @settings(deadline=None)
+    def test_inverted_index(self, company_tags, target_tags):
+        """
+        Tests that the inverted index returns the same companies as scanning the tags of all companies,
+        also after saving and loading the store, for stores saved without (or with a partial) index
+        and if the index cannot be added to the folder.
+        """
+        companies = [Company(type=CompanyType.TARGET, tags=tags, latitude=49, longitude=7) for tags in company_tags]
+        expected = [i for i, tags in enumerate(company_tags) if set(tags).intersection(target_tags)]
+        store = CompanyStore.from_companies(companies)
+        assert store.rows_with_tags(target_tags).tolist() == expected
+
+        with tempfile.TemporaryDirectory() as folder:
+            store.save(folder)
+            assert CompanyStore.load(folder).rows_with_tags(target_tags).tolist() == expected
+            for name in ["tag_row_offsets", "tag_rows"]:
+                os.remove(os.path.join(folder, name + ".npy"))
+            assert CompanyStore.load(folder).rows_with_tags(target_tags).tolist() == expected
+            assert os.path.exists(os.path.join(folder, "tag_rows.npy"))
+            assert not any(name.endswith(".tmp") for name in os.listdir(folder))
+
+            os.remove(os.path.join(folder, "tag_rows.npy"))
+            # the temporary file cannot be written, the index is only kept in memory
+            os.mkdir(os.path.join(folder, "tag_row_offsets.npy.tmp"))
+            assert CompanyStore.load(folder).rows_with_tags(target_tags).tolist() == expected
+            assert not os.path.exists(os.path.join(folder, "tag_rows.npy"))
+
+
+class TestIngestion(unittest.TestCase):
+    """
+    Tests the streaming ingestion of datasets.
+    """
+
+    rows = [("A", "(49.2345678, 6.9876543)", "Bakery"),
+            ("B", "(91.0, 6.0)", "Bakery"),
+            ("C", "(nan, nan)", "Butcher"),
+            ("D", "(50.0, 7.0)", None),
+            ("E", "(48.1, 11.5)", "Butcher"),
+            (None, "(52.5, 13.4)", "Bakery"),
+            ("G", "invalid", "Bakery")]
+
+    def check(self, store):
+        """
+        Checks that the store contains the valid rows: rows with invalid coordinates are skipped, missing names
+        become "Unknown" and missing (NaN) or other non-string sectors become an empty tag list.
+        """
+        assert [company.name for company in store] == ["A", "D", "E", "Unknown"]
+        assert [company.tags for company in store] == [("Bakery",), (), ("Butcher",), ("Bakery",)]
+        assert store[0].get_lat_long() == (49.235, 6.988)
+
+    def test_csv_and_xlsx(self):
+        """
+        Tests that .csv and .xlsx datasets result in the same store, independent of the chunk size.
+        """
+        df = pd.DataFrame(self.rows, columns=[ingestion.NAME_COLUMN, ingestion.COORDINATES_COLUMN,
+                                              ingestion.SECTOR_COLUMN])
+        with tempfile.TemporaryDirectory() as folder:
+            df.to_csv(os.path.join(folder, "companies.csv"), index=False)
+            df.to_excel(os.path.join(folder, "companies.xlsx"), index=False)
+            for file_name in ["companies.csv", "companies.xlsx"]:
+                for chunk_size in [1, 3, 100]:
+                    self.check(ingestion.ingest(os.path.join(folder, file_name), chunk_size=chunk_size))
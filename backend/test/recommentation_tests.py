@@ -5,8 +5,10 @@ from typing import List, Tuple
 from hypothesis import given, strategies as st, settings
 
 from backend.code import preprocessing, config
+from backend.code.artifacts import ArtifactError
 from backend.code.company import CompanyType, Company
 from backend.code.location_recommender import LocationRecommender
+from backend.code.query import RecommendationQuery, REGION_SAARLAND
 
 
 @st.composite
@@ -37,15 +39,65 @@ class TestRecommendations(unittest.TestCase):
     """
 
     @given(company_strategy(), st.integers(min_value=0, max_value=50))
-    @settings(max_examples=50)
+    @settings(max_examples=50, deadline=None)
     def test_generated_no_crash(self, fuzz: Tuple[List[Company], str], max_companies):
         companies, target = fuzz
-        recommender = LocationRecommender(companies)
+        # without a model, the values are calculated by the Monte Carlo simulation, which needs a small sample size
+        recommender = LocationRecommender(companies, sample_size=1000, download_model=False)
         recommender.set_target_tags([target])
         recommendations = recommender.get_attributed_location_recommendations(max_companies=max_companies)
 
+    @given(company_strategy(), st.integers(min_value=0, max_value=50), st.integers(min_value=0, max_value=1000))
+    @settings(max_examples=20, deadline=None)
+    def test_stateless_recommend(self, fuzz: Tuple[List[Company], str], max_companies, seed):
+        companies, target = fuzz
+        recommender = LocationRecommender(companies, download_model=False)
+        query = RecommendationQuery(tags=[target], region=REGION_SAARLAND, k=max_companies, sample_size=1000,
+                                    seed=seed)
+        first = [company.to_map() for company in recommender.recommend(query)]
+        second = [company.to_map() for company in recommender.recommend(query)]
+        # seeded queries are reproducible and do not change the recommender
+        assert first == second
+        assert recommender.target_tags == []
+
+    def test_set_target_tags(self):
+        """
+        Tests that the targets are the companies with any of the target tags and do not accumulate across calls.
+        """
+        companies = [Company(type=CompanyType.TARGET, tags=tags, latitude=49.3, longitude=7)
+                     for tags in [["IT"], ["Bau"], ["IT", "Bau"], ["Logistik"], []]]
+        recommender = LocationRecommender(companies, download_model=False)
+        for _ in range(2):
+            recommender.set_target_tags(["IT", "Bau", "IT"])
+            assert [company.tags for company in recommender.targets] == [("IT",), ("Bau",), ("IT", "Bau")]
+        recommender.set_target_tags(["Unknown"])
+        assert recommender.targets == []
+
+    @given(company_strategy(), st.integers(min_value=0, max_value=20), st.integers(min_value=0, max_value=1000))
+    @settings(max_examples=10, deadline=None)
+    def test_progressive_recommend(self, fuzz: Tuple[List[Company], str], max_companies, seed):
+        """
+        Tests that the snapshots score more and more samples and that the last one equals the complete result.
+        """
+        companies, target = fuzz
+        recommender = LocationRecommender(companies, download_model=False)
+        query = RecommendationQuery(tags=[target], region=REGION_SAARLAND, k=max_companies, sample_size=5000,
+                                    seed=seed)
+        snapshots = list(recommender.recommend_iter(query, report_interval=0))
+        assert [snapshot.scored for snapshot in snapshots] == sorted({snapshot.scored for snapshot in snapshots})
+        assert [snapshot.done for snapshot in snapshots] == [False] * (len(snapshots) - 1) + [True]
+        assert snapshots[-1].scored == 5000
+        assert [company.to_map() for company in snapshots[-1].recommendations] == \
+               [company.to_map() for company in recommender.recommend(query)]
+
+        early = list(recommender.recommend_iter(query, early_stop=True, report_interval=0))
+        assert early[-1].done and (early[-1].stable_batches >= 3 or early[-1].scored == 5000)
+
     def test_dataset_recommendation(self):
-        companies = preprocessing.get_companies(config.companies_path)
+        try:
+            companies = preprocessing.get_companies(config.companies_path)
+        except ArtifactError as e:
+            self.skipTest(f"The dataset is not available: {e}")
         size = len(companies)
         id = random.randint(0, size-1)
         target = companies[id].tags[0]
@@ -0,0 +1,74 @@
+import unittest
+
+import numpy as np
+from hypothesis import given, strategies as st, settings
+
+from backend.code import regions
+from backend.code.query import REGION_GERMANY, REGION_SAARLAND
+
+
+class TestRegions(unittest.TestCase):
+    """
+    Tests the region boundaries and the point-in-region test.
+    """
+
+    def test_known_locations(self):
+        """
+        Tests that known cities are located in their region and foreign cities are not.
+        """
+        cities = {"berlin": (52.52, 13.405), "bavaria": (48.137, 11.575), "hamburg": (53.551, 9.994),
+                  REGION_SAARLAND: (49.234, 6.997), "north-rhine-westphalia": (50.938, 6.96)}
+        foreign = [(48.857, 2.352), (52.23, 21.012), (54.5, 5.5), (47.376, 8.541)]  # Paris, Warsaw, North Sea, Zurich
+
+        germany = regions.get(REGION_GERMANY)
+        for region, (latitude, longitude) in cities.items():
+            assert regions.get(region).contains([latitude], [longitude])[0], region
+            assert germany.contains([latitude], [longitude])[0], region
+        latitudes, longitudes = np.array(foreign).T
+        assert not germany.contains(latitudes, longitudes).any()
+        assert not regions.get(REGION_SAARLAND).contains([52.52], [13.405])[0]
+
+    def test_unknown_region(self):
+        with self.assertRaises(ValueError):
+            regions.get("atlantis")
+
+    @given(st.sampled_from([REGION_GERMANY, REGION_SAARLAND, "bremen", "schleswig-holstein"]),
+           st.integers(min_value=0, max_value=2 ** 32 - 1))
+    @settings(max_examples=20, deadline=None)
+    def test_mask_matches_polygons(self, region, seed):
+        """
+        Tests that the mask gives the same result as the exact polygon test.
+        """
+        region = regions.get(region)
+        latitudes, longitudes = region.draw_uniform(np.random.default_rng(seed), 2000)
+        np.testing.assert_array_equal(region.contains(latitudes, longitudes),
+                                      region.contains_exact(latitudes, longitudes))
+
+    def test_samples_inside(self):
+        """
+        Tests that all samples are inside the region and that the requested number is sampled.
+        """
+        for region in [REGION_GERMANY, REGION_SAARLAND, "berlin"]:
+            region = regions.get(region)
+            latitudes, longitudes = region.sample(np.random.default_rng(0), 1000)
+            assert len(latitudes) == len(longitudes) == 1000
+            assert region.contains_exact(latitudes, longitudes).all()
+
+    def test_low_hit_rate(self):
+        """
+        Tests that sampling only gives up after MAX_EMPTY_DRAWS empty draws in a row,
+        i.e. a region with a low hit rate is sampled completely.
+        """
+        draws = []
+
+        def draw(rng, n):
+            # every other draw contains a single location inside the region (Saarbrücken)
+            draws.append(n)
+            latitudes, longitudes = np.zeros(n), np.zeros(n)
+            if len(draws) % 2 == 0:
+                latitudes[0], longitudes[0] = 49.234, 6.997
+            return latitudes, longitudes
+
+        latitudes, longitudes = regions.get(REGION_SAARLAND).sample(np.random.default_rng(0), 20, draw)
+        assert len(latitudes) == 20 and len(draws) > 2 * regions.MAX_EMPTY_DRAWS
+        assert regions.get(REGION_SAARLAND).contains_exact(latitudes, longitudes).all()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from backend.code import config
+from backend.code.company import Company, CompanyType
+from backend.code.location_recommender import LocationRecommender, Snapshot
+from backend.code.query import RecommendationQuery, SAMPLER_ADAPTIVE
+from backend.code.result_cache import ResultCache
+
+
+class EarlyStoppingRecommender:
+    """
+    Stops after half of the samples if early stopping is allowed, with the recommendations of the wrapped recommender.
+    """
+
+    def __init__(self, recommender):
+        self.recommender = recommender
+        self.runs = 0
+
+    def version(self):
+        return "early-stopping"
+
+    def resolve(self, query):
+        return self.recommender.resolve(query)
+
+    def recommend_iter(self, query, early_stop=False):
+        self.runs += 1
+        scored = query.sample_size // 2 if early_stop else query.sample_size
+        yield Snapshot(scored, query.sample_size, self.recommender.recommend(query), 1.0, 1, True)
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    Tests the result cache.
+    """
+
+    recommender = LocationRecommender([Company(type=CompanyType.TARGET, tags=["IT"], latitude=49.3 + i / 100,
+                                               longitude=7 + i / 50) for i in range(50)], download_model=False)
+
+    def test_prefix(self):
+        """
+        Tests that smaller k are served as prefix of a cached result and equal the uncached result.
+        """
+        cache = ResultCache()
+        large = RecommendationQuery(tags=["IT"], k=10, sample_size=2000, seed=1)
+        small = RecommendationQuery(tags=["IT", "IT"], k=3, sample_size=2000, seed=1)
+
+        expected = [company.to_map() for company in self.recommender.recommend(small)]
+        cache.recommend(self.recommender, large)
+        actual = [company.to_map() for company in cache.recommend(self.recommender, small)]
+
+        assert actual == expected
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_eviction(self):
+        """
+        Tests that the least recently used result is evicted and that unseeded queries are not cached.
+        """
+        cache = ResultCache(max_entries=2)
+        queries = [RecommendationQuery(tags=["IT"], k=1, sample_size=100, seed=seed) for seed in range(3)]
+        for query in queries:
+            cache.recommend(self.recommender, query)
+        assert cache.get(queries[0], self.recommender.version()) is None
+        assert cache.get(queries[2], self.recommender.version()) is not None
+
+        unseeded = RecommendationQuery(tags=["IT"], k=1, sample_size=100)
+        cache.recommend(self.recommender, unseeded)
+        assert cache.get(unseeded, self.recommender.version()) is None
+
+    def test_early_stopped(self):
+        """
+        Tests that a result that stopped early is cached under its own key
+        and only served to queries that allow early stopping.
+        """
+        cache = ResultCache()
+        recommender = EarlyStoppingRecommender(self.recommender)
+        query = RecommendationQuery(tags=["IT"], k=1, sample_size=2000, seed=1)
+        snapshots = list(cache.recommend_iter(recommender, query, early_stop=True))
+        assert snapshots[-1].scored < snapshots[-1].total
+
+        cached = list(cache.recommend_iter(recommender, query, early_stop=True))
+        assert recommender.runs == 1
+        assert [r.to_map() for r in cached[-1].recommendations] == [r.to_map() for r in snapshots[-1].recommendations]
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert cache.get(query, recommender.version()) is None
+
+        # a complete result is preferred, but never replaced by an early stopped one
+        list(cache.recommend_iter(recommender, query))
+        assert recommender.runs == 2
+        assert cache.get(query, recommender.version(), early_stop=True) is not None
+
+    def test_adaptive_k(self):
+        """
+        Tests that the adaptive sampler, whose samples depend on k, does not serve smaller k as prefix.
+        """
+        cache = ResultCache()
+        large = RecommendationQuery(tags=["IT"], k=10, sample_size=2000, seed=1, sampler=SAMPLER_ADAPTIVE)
+        small = RecommendationQuery(tags=["IT"], k=2, sample_size=2000, seed=1, sampler=SAMPLER_ADAPTIVE)
+
+        cache.recommend(self.recommender, large)
+        actual = [company.to_map() for company in cache.recommend(self.recommender, small)]
+        assert actual == [company.to_map() for company in self.recommender.recommend(small)]
+        assert (cache.hits, cache.misses) == (0, 2)
+        assert cache.recommend(self.recommender, small) and (cache.hits, cache.misses) == (1, 2)
+
+    def test_concurrent_store(self):
+        """
+        Tests that threads storing the same and different results on disk do not interfere.
+        """
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(config, "cache_path", folder):
+            cache = ResultCache(persist=True, max_disk_entries=4)
+            queries = [RecommendationQuery(tags=["IT"], k=1, sample_size=100, seed=seed % 8) for seed in range(64)]
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda query: cache.put(query, "version", [(49.0, 7.0, 1.0)]), queries))
+
+            assert sorted(os.listdir(cache.folder)) == sorted(name for name in os.listdir(cache.folder)
+                                                              if name.endswith(".pkl"))
+            assert len(os.listdir(cache.folder)) <= 4
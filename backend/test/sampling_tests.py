@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+from hypothesis import given, strategies as st, settings
+
+from backend.code import regions, sampling
+from backend.code.company import Company, CompanyType
+from backend.code.location_recommender import LocationRecommender
+from backend.code.query import RecommendationQuery, REGION_GERMANY, REGION_SAARLAND, SAMPLER_ADAPTIVE
+from backend.code.selection import geodesic_distance
+
+
+class TestSampling(unittest.TestCase):
+    """
+    Tests the adaptive sampler.
+    """
+
+    @given(st.lists(st.tuples(st.floats(min_value=47, max_value=56), st.floats(min_value=5, max_value=16)),
+                    max_size=50),
+           st.sampled_from([REGION_GERMANY, REGION_SAARLAND]), st.integers(min_value=0, max_value=2 ** 32 - 1))
+    @settings(max_examples=30, deadline=None)
+    def test_samples_in_bounds(self, targets, region, seed):
+        """
+        Tests that the density samples are located in the bounding box of the region.
+        """
+        bounds = regions.get(region).bounds
+        latitudes, longitudes = np.array(targets).reshape(-1, 2).T
+        density = sampling.density_raster([(latitudes, longitudes)], bounds, 30)
+        sampled_lats, sampled_lons = sampling.sample_density(np.random.default_rng(seed), density, bounds, 500)
+
+        lat_min, lat_max, lon_min, lon_max = bounds
+        assert np.all((sampled_lats >= round(lat_min, 3)) & (sampled_lats <= round(lat_max, 3)))
+        assert np.all((sampled_lons >= round(lon_min, 3)) & (sampled_lons <= round(lon_max, 3)))
+
+    def test_adaptive_recommendations(self):
+        """
+        Tests that the adaptive sampler samples near the targets and returns valid, deterministic recommendations.
+        """
+        rng = np.random.default_rng(0)
+        companies = [Company(type=CompanyType.TARGET, tags=["A"], latitude=round(52.5 + rng.normal(0, 0.05), 3),
+                             longitude=round(13.4 + rng.normal(0, 0.05), 3)) for _ in range(200)]
+        recommender = LocationRecommender(companies, download_model=False)
+        if recommender.value_predictor.is_initialized():
+            self.skipTest("A locally trained value predictor is used instead of the engines.")
+
+        density = recommender.density(["A"], REGION_GERMANY)
+        latitudes, longitudes = sampling.sample_density(rng, density, regions.get(REGION_GERMANY).bounds, 1000)
+        near = np.array([geodesic_distance(lat, lon, 52.5, 13.4) <= 30 for lat, lon in zip(latitudes, longitudes)])
+        # the area within 30km is ~0.5% of Germany's bounding box
+        assert near.mean() > 0.5
+
+        query = RecommendationQuery(tags=["A"], k=5, delta=10, sample_size=2000, seed=1, sampler=SAMPLER_ADAPTIVE)
+        recommendations = recommender.recommend(query)
+        assert [r.get_lat_long() for r in recommendations] == \
+               [r.get_lat_long() for r in recommender.recommend(query)]
+        assert len(recommendations) == 5
+        np.testing.assert_allclose([r.value for r in recommendations],
+                                   recommender.values_of([r.latitude for r in recommendations],
+                                                         [r.longitude for r in recommendations], ["A"]))
+        for i, first in enumerate(recommendations):
+            for second in recommendations[i + 1:]:
+                assert geodesic_distance(*first.get_lat_long(), *second.get_lat_long()) > query.delta
@@ -0,0 +1,96 @@
+import unittest
+
+import numpy as np
+from geopy.distance import geodesic
+from hypothesis import given, strategies as st, settings
+
+from backend.code import scoring, value_raster
+from backend.code.company import Company, CompanyType
+from backend.code.location_recommender import LocationRecommender, ENGINE_REFERENCE, ENGINE_VECTORIZED, \
+    GERMANY_LAT_MIN, GERMANY_LAT_MAX, GERMANY_LON_MIN, GERMANY_LON_MAX
+from backend.code.spatial_index import SpatialIndex
+from backend.code.value_cache import ValueCache
+
+latitudes = st.floats(min_value=GERMANY_LAT_MIN, max_value=GERMANY_LAT_MAX)
+longitudes = st.floats(min_value=GERMANY_LON_MIN, max_value=GERMANY_LON_MAX)
+
+
+class TestScoring(unittest.TestCase):
+    """
+    Tests the vectorized scoring engine against the geodesic reference.
+    """
+
+    @given(latitudes, longitudes, latitudes, longitudes)
+    def test_haversine_error_bound(self, lat1, lon1, lat2, lon2):
+        """
+        Tests the documented error bound of the haversine distance within Germany.
+        """
+        expected = geodesic((lat1, lon1), (lat2, lon2)).kilometers
+        actual = scoring.haversine(lat1, lon1, lat2, lon2)
+        assert abs(actual - expected) <= 0.0035 * expected + 1e-9
+
+    @given(st.lists(st.tuples(latitudes, longitudes), min_size=0, max_size=30), st.integers(min_value=0, max_value=1000))
+    @settings(max_examples=30, deadline=None)
+    def test_engines_agree(self, coordinates, seed):
+        """
+        Tests that the vectorized engine calculates the same values as the reference engine.
+        """
+        rng = np.random.default_rng(seed)
+        # cluster the targets, such that most samples have targets within M
+        companies = [Company(type=CompanyType.TARGET, tags=["A"], latitude=49.3 + rng.normal(0, 0.1),
+                             longitude=7.0 + rng.normal(0, 0.1)) for _ in range(20)]
+        companies += [Company(type=CompanyType.TARGET, tags=["B"], latitude=lat, longitude=lon)
+                      for lat, lon in coordinates]
+
+        recommender = LocationRecommender(companies, download_model=False)
+        if recommender.value_predictor.is_initialized():
+            self.skipTest("A locally trained value predictor is used instead of the engines.")
+        recommender.set_target_tags(["A", "B"])
+
+        sample_lats = np.round(49.3 + rng.normal(0, 0.2, 50), 3)
+        sample_lons = np.round(7.0 + rng.normal(0, 0.2, 50), 3)
+
+        recommender.set_engine(ENGINE_VECTORIZED)
+        vectorized = recommender.values_of(sample_lats, sample_lons)
+        # the reference engine must not read the values cached by the vectorized engine
+        recommender.values = ValueCache(persist=False)
+        recommender.set_engine(ENGINE_REFERENCE)
+        reference = recommender.values_of(sample_lats, sample_lons)
+
+        # every target contributes at most 0.0035 error (see scoring.haversine)
+        np.testing.assert_allclose(vectorized, reference, atol=0.0035 * len(companies) + 1e-9)
+
+    @given(st.lists(st.tuples(latitudes, longitudes), min_size=0, max_size=200),
+           st.lists(st.tuples(latitudes, longitudes), min_size=1, max_size=50),
+           st.floats(min_value=1, max_value=100))
+    @settings(max_examples=50, deadline=None)
+    def test_spatial_index(self, targets, samples, M):
+        """
+        Tests that the spatial index calculates the same values as the dense vectorized engine.
+        """
+        target_lats, target_lons = np.array(targets).reshape(-1, 2).T
+        sample_lats, sample_lons = np.array(samples).T
+
+        expected = scoring.vicinity_sum(sample_lats, sample_lons, target_lats, target_lons, M)
+        actual = SpatialIndex(target_lats, target_lons).vicinity_sum(sample_lats, sample_lons, M)
+        np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+    @given(st.lists(st.tuples(st.floats(min_value=49, max_value=50), st.floats(min_value=6, max_value=8)),
+                    min_size=0, max_size=100), st.integers(min_value=0, max_value=1000))
+    @settings(max_examples=20, deadline=None)
+    def test_value_raster(self, targets, seed):
+        """
+        Tests that the raster lookup approximates the exact values within the documented error bound.
+        """
+        resolution, M = 0.01, 30
+        target_lats, target_lons = np.array(targets).reshape(-1, 2).T
+        raster = value_raster.value_raster(target_lats, target_lons, 49.2, 49.8, 6.5, 7.5, resolution, M)
+        rasters = value_raster.ValueRasters(raster[None], ["A"], 49.2, 6.5, resolution, M)
+
+        rng = np.random.default_rng(seed)
+        sample_lats, sample_lons = rng.uniform(49.2, 49.8, 100), rng.uniform(6.5, 7.5, 100)
+        expected = scoring.vicinity_sum(sample_lats, sample_lons, target_lats, target_lons, M)
+        actual = rasters.lookup(sample_lats, sample_lons, ["A", "unknown"])
+
+        diagonal = scoring.haversine(49.2, 6.5, 49.2 + resolution, 6.5 + resolution)
+        np.testing.assert_allclose(actual, expected, atol=len(targets) * diagonal / M + 1e-4)
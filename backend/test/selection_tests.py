@@ -0,0 +1,32 @@
+import unittest
+
+import numpy as np
+from hypothesis import given, strategies as st, settings
+
+from backend.code.selection import select_distinct, select_distinct_naive
+
+
+class TestSelection(unittest.TestCase):
+    """
+    Tests the spatial non-maximum suppression against the original selection loop.
+    """
+
+    @given(st.integers(min_value=0, max_value=10000), st.integers(min_value=0, max_value=300),
+           st.integers(min_value=0, max_value=60), st.floats(min_value=0, max_value=200),
+           st.sampled_from([(47.2701, 55.0991, 5.8663, 15.0419), (49.1769, 49.657, 6.2032, 7.5014),
+                            (-80, 80, -170, 170)]))
+    @settings(max_examples=50, deadline=None)
+    def test_identical_results(self, seed, n, k, delta, bounds):
+        """
+        Tests that both selections return the same recommendations in the same order.
+        """
+        lat_min, lat_max, lon_min, lon_max = bounds
+        rng = np.random.default_rng(seed)
+        latitudes = np.round(rng.uniform(lat_min, lat_max, n), 3)
+        longitudes = np.round(rng.uniform(lon_min, lon_max, n), 3)
+        # few distinct values, such that ties are resolved in the same order
+        values = rng.integers(0, 20, n).astype(float)
+
+        expected = select_distinct_naive(latitudes, longitudes, values, k, delta)
+        actual = select_distinct(latitudes, longitudes, values, k, delta)
+        assert actual == expected
@@ -0,0 +1,45 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from backend.code import regions, training_set_generation
+from backend.code.company import Company, CompanyType
+from backend.code.location_recommender import LocationRecommender, ENGINE_VECTORIZED
+from backend.code.query import REGION_SAARLAND
+
+
+class TestTrainingSetGeneration(unittest.TestCase):
+    """
+    Tests the generation of the training set of the value predictor.
+    """
+
+    def test_generate(self):
+        """
+        Tests that the training set is balanced, inside the region and has the exact values.
+        """
+        rng = np.random.default_rng(0)
+        lat_min, lat_max, lon_min, lon_max = regions.get(REGION_SAARLAND).bounds
+        companies = [Company(type=CompanyType.TARGET, tags=[tag], latitude=rng.uniform(lat_min, lat_max),
+                             longitude=rng.uniform(lon_min, lon_max)) for tag in ["A", "B", "C"] for _ in range(100)]
+
+        with tempfile.TemporaryDirectory() as folder:
+            manifest = training_set_generation.generate(1000, folder, companies, workers=2, shard_rows=300,
+                                                        region=REGION_SAARLAND)
+            rows = np.concatenate(list(training_set_generation.shards(folder)))
+            assert manifest == training_set_generation.load_manifest(folder)
+
+        assert manifest["tags"] == ["A", "B", "C"]
+        assert manifest["rows"] == len(rows) == 1002
+        assert len(manifest["shards"]) == 4
+        assert np.bincount(rows["tag"]).tolist() == [334, 334, 334]
+        assert regions.get(REGION_SAARLAND).contains(rows["latitude"], rows["longitude"]).all()
+
+        recommender = LocationRecommender(companies, download_model=False, engine=ENGINE_VECTORIZED)
+        if recommender.value_predictor.is_initialized():
+            self.skipTest("A locally trained value predictor is used instead of the engines.")
+        for tag_id, tag in enumerate(manifest["tags"]):
+            tag_rows = rows[rows["tag"] == tag_id]
+            assert (tag_rows["value"] > 0).any()
+            expected = recommender.values_of(tag_rows["latitude"], tag_rows["longitude"], [tag])
+            np.testing.assert_allclose(tag_rows["value"], expected, rtol=1e-4, atol=1e-4)
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from backend.code import training
+from backend.code.training_set_generation import ROW_DTYPE, MANIFEST_FILE
+
+TAGS = ["IT", "Bau", "Logistik"]
+
+
+def write_training_set(folder: str, n_shards: int = 3, shard_rows: int = 600):
+    """
+    Writes a synthetic training set in the format of training_set_generation.generate.
+    """
+    rng = np.random.default_rng(0)
+    shards = []
+    for i in range(n_shards):
+        rows = np.zeros(shard_rows, dtype=ROW_DTYPE)
+        rows["latitude"] = rng.uniform(47, 55, shard_rows)
+        rows["longitude"] = rng.uniform(6, 15, shard_rows)
+        rows["tag"] = rng.integers(len(TAGS), size=shard_rows)
+        rows["value"] = rows["latitude"] * (rows["tag"] + 1) - rows["longitude"]
+        np.save(os.path.join(folder, f"shard-{i:05d}.npy"), rows)
+        shards.append({"file": f"shard-{i:05d}.npy", "rows": shard_rows})
+    with open(os.path.join(folder, MANIFEST_FILE), "w") as file:
+        json.dump({"rows": n_shards * shard_rows, "tags": TAGS, "shards": shards}, file)
+
+
+class TestTraining(unittest.TestCase):
+    """
+    Tests the training of the value predictor on streamed mini-batches.
+    """
+
+    def test_train_and_resume(self):
+        """
+        Tests that the training writes its metrics and curves, and that it continues from its checkpoint.
+        """
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as output:
+            write_training_set(folder)
+            training.train(folder, output, epochs=2, batch_size=100, hidden_layer_sizes=(16,))
+            for file in [training.CHECKPOINT_FILE, training.LOSS_CURVE_FILE, training.SCORE_CURVE_FILE]:
+                assert os.path.exists(os.path.join(output, file))
+            with open(os.path.join(output, training.METRICS_FILE)) as file:
+                first = json.load(file)
+            assert first["epochs"] == 2 and first["validation_rows"] == 180
+            assert first["peak_memory_mb"] > 0
+
+            # only the third epoch is trained, the first two are restored from the checkpoint
+            predictor = training.train(folder, output, epochs=3, batch_size=100, hidden_layer_sizes=(16,))
+            with open(os.path.join(output, training.METRICS_FILE)) as file:
+                second = json.load(file)
+            assert second["epoch_losses"][:2] == first["epoch_losses"]
+            assert len(second["validation_scores"]) == 3
+            assert second["wall_seconds"] >= first["wall_seconds"]
+
+        predictions = predictor.predict_arrays([50, 50], [10, 10], ["IT", "Logistik"])
+        assert predictions.shape == (2,) and np.isfinite(predictions).all()
+
+    def test_validation_cap(self):
+        """
+        Tests that at most MAX_VALIDATION_ROWS validation rows are held, taken from the first shards.
+        """
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as output, \
+                mock.patch.object(training, "MAX_VALIDATION_ROWS", 100):
+            write_training_set(folder)
+            training.train(folder, output, epochs=1, batch_size=100, hidden_layer_sizes=(16,))
+            with open(os.path.join(output, training.METRICS_FILE)) as file:
+                assert json.load(file)["validation_rows"] == 100
+
+    def test_invalid_training(self):
+        """
+        Tests that an empty training set and resuming with other hyperparameters are rejected.
+        """
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as output:
+            write_training_set(folder, n_shards=1, shard_rows=0)
+            with self.assertRaises(ValueError):
+                training.train(folder, output, epochs=1, hidden_layer_sizes=(16,))
+
+        with tempfile.TemporaryDirectory() as folder, tempfile.TemporaryDirectory() as output:
+            write_training_set(folder, n_shards=1)
+            training.train(folder, output, epochs=1, batch_size=100, hidden_layer_sizes=(16,))
+            with self.assertRaises(ValueError):
+                training.train(folder, output, epochs=2, batch_size=100, hidden_layer_sizes=(32,))
+            with self.assertRaises(ValueError):
+                training.train(folder, output, epochs=2, batch_size=50, hidden_layer_sizes=(16,))
+            training.train(folder, output, epochs=2, batch_size=50, hidden_layer_sizes=(16,), resume=False)
@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+from unittest import mock
+
+from hypothesis import given, strategies as st, settings
+
+from backend.code import config, value_cache
+from backend.code.value_cache import LRUCache, ValueCache
+
+coordinates = st.tuples(st.integers(-90000, 90000), st.integers(-180000, 180000)).map(
+    lambda position: (position[0] / 1000, position[1] / 1000))
+keys = st.tuples(coordinates, st.sampled_from(["A", "B", "C"]))
+
+
+class TestValueCache(unittest.TestCase):
+    """
+    Tests the bounded caches of the regular Monte Carlo simulation.
+    """
+
+    @given(st.lists(st.tuples(keys, st.floats(allow_nan=False)), max_size=50))
+    @settings(deadline=None)
+    def test_dict_behaviour(self, entries):
+        """
+        Tests that the cache behaves like the former dict, as long as it is not full.
+        """
+        expected = dict(entries)
+        with mock.patch.object(value_cache, "FLUSH_SIZE", 7):
+            cache = ValueCache(persist=False)
+            for key, value in entries:
+                cache[key] = value
+
+            assert len(cache) == len(expected)
+            assert dict(cache.items()) == expected
+            for key, value in expected.items():
+                assert key in cache
+                assert cache[key] == value
+
+    def test_persistence_and_eviction(self):
+        """
+        Tests that the cache survives a restart and evicts the least recently used entries.
+        """
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(config, "cache_path", folder):
+            cache = ValueCache("values", max_entries=3, memory_entries=2)
+            cache[(49.001, 7.0), "A"] = 1.0
+            cache[(49.002, 7.0), "A"] = 2.0
+            cache.flush()
+            cache[(49.003, 7.0), "B"] = 3.0
+            cache.flush()
+            # access the oldest entry, such that the second oldest is evicted next
+            assert cache.get(((49.001, 7.0), "A")) == 1.0
+            cache.flush()
+            cache.put_many([49.004], [7.0], "B", [4.0])
+            # rewriting an entry does not change the number of entries
+            cache[(49.003, 7.0), "B"] = 3.0
+            assert len(cache) == 3 and cache.evictions == 1
+            cache.close()
+
+            cache = ValueCache("values", max_entries=3)
+            assert dict(cache.items()) == {((49.001, 7.0), "A"): 1.0, ((49.003, 7.0), "B"): 3.0,
+                                           ((49.004, 7.0), "B"): 4.0}
+            assert cache.get(((49.002, 7.0), "A")) is None
+            assert cache.hits == 0 and cache.misses == 1
+            cache.close()
+
+    def test_lru(self):
+        """
+        Tests the eviction and the metrics of the in-memory LRU cache.
+        """
+        cache = LRUCache(2)
+        cache["a"] = 1
+        cache["b"] = 2
+        assert cache.get("a") == 1
+        cache["c"] = 3
+        assert "b" not in cache and "a" in cache and "c" in cache
+        assert cache.get("b") is None
+        assert (cache.hits, cache.misses, cache.evictions) == (1, 1, 1)
@@ -0,0 +1,97 @@
+import itertools
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from hypothesis import given, strategies as st, settings
+from sklearn.neural_network import MLPRegressor
+from sklearn.preprocessing import StandardScaler
+
+from backend.code import config
+from backend.code.company import Company, CompanyType
+from backend.code.location_recommender import LocationRecommender
+from backend.code.numpy_predictor import NumpyValuePredictor
+from backend.code.training import create_unit_vector
+from backend.code.value_cache import ValueCache
+from backend.code.value_predictor import ValuePredictor
+
+LABELS = ["IT", "Bau", "Logistik"]
+
+
+def train_small_predictor() -> ValuePredictor:
+    """
+    Trains a small model on synthetic data, such that the tests do not depend on a downloaded model.
+    """
+    rng = np.random.default_rng(42)
+    label_embedding = {label: create_unit_vector(i, len(LABELS)) for i, label in enumerate(LABELS)}
+    labels = rng.integers(len(LABELS), size=500)
+    X = np.column_stack((rng.uniform(47, 55, 500), rng.uniform(6, 15, 500), np.eye(len(LABELS))[labels]))
+    y = X[:, 0] * (labels + 1) - X[:, 1]
+
+    scaler = StandardScaler()
+    model = MLPRegressor(hidden_layer_sizes=(20, 20), max_iter=50, random_state=42)
+    model.fit(scaler.fit_transform(X), y)
+
+    predictor = ValuePredictor(download_model=False)
+    predictor.initialize(model, label_embedding, scaler, save=False)
+    return predictor
+
+
+class TestValuePredictor(unittest.TestCase):
+    """
+    Tests the batched inference of the value predictor.
+    """
+
+    predictor = train_small_predictor()
+
+    @given(st.lists(st.tuples(st.floats(min_value=47, max_value=55), st.floats(min_value=6, max_value=15),
+                              st.sampled_from(LABELS)), min_size=1, max_size=100))
+    @settings(max_examples=30, deadline=None)
+    def test_batched_prediction(self, data):
+        """
+        Tests that predicting a batch (in chunks) gives the same values as predicting each row on its own.
+        """
+        model, scaler, label_embedding = self.predictor.model, self.predictor.scalar, self.predictor.label_embedding
+        expected = [model.predict(scaler.transform([[lat, lon] + label_embedding[label].tolist()]))[0]
+                    for lat, lon, label in data]
+        actual = self.predictor.predict_arrays([x[0] for x in data], [x[1] for x in data], [x[2] for x in data],
+                                               chunk_size=7)
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
+
+    def test_recommender_batch(self):
+        """
+        Tests that the recommender sums up the batched predictions of all target tags.
+        """
+        companies = [Company(type=CompanyType.TARGET, tags=[label], latitude=50, longitude=8) for label in LABELS]
+        recommender = LocationRecommender(companies, download_model=False)
+        recommender.value_predictor = self.predictor
+        recommender.set_target_tags(LABELS[:2])
+
+        latitudes, longitudes = np.linspace(47, 55, 10), np.linspace(6, 15, 10)
+        expected = [sum(self.predictor.predict_single(lat, lon, label) for label in LABELS[:2])
+                    for lat, lon in zip(latitudes, longitudes)]
+        np.testing.assert_allclose(recommender.values_of(latitudes, longitudes), expected, rtol=1e-9)
+
+    def test_numpy_parity(self):
+        """
+        Tests that the exported NumPy model predicts the same values as the sklearn model.
+        Uses the locations of the cached values (the training data) if available.
+        """
+        rng = np.random.default_rng(0)
+        latitudes, longitudes = rng.uniform(47, 55, 1000), rng.uniform(6, 15, 1000)
+        if os.path.exists(os.path.join(config.cache_path, "values.sqlite")):
+            positions = [pos for pos, _ in itertools.islice(ValueCache("values").keys(), 1000)]
+            if positions:
+                latitudes, longitudes = np.array(positions).T
+        labels = rng.choice(LABELS, size=len(latitudes))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.npz")
+            self.predictor.export(path)
+            numpy_predictor = NumpyValuePredictor.load(path)
+
+        expected = self.predictor.predict_arrays(latitudes, longitudes, labels)
+        actual = numpy_predictor.predict_arrays(latitudes, longitudes, labels)
+        # float32 arithmetic
+        np.testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-4 * np.abs(expected).max())
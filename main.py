@@ -1,39 +1,90 @@
+import logging
 from typing import List
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 
 import json
 import backend.code.preprocessing as preprocessing
 import backend.code.config as config
+from backend.code import metrics, regions
 from backend.code.company import Company
-from backend.code.location_recommender import LocationRecommender
+from backend.code.convergence import SampleSizeCalibration
+from backend.code.grid_recommender import GridRecommender
+from backend.code.jobs import JobManager, QueueFullError
+from backend.code.location_recommender import LocationRecommender, ENGINE_REFERENCE
+from backend.code.query import RecommendationQuery, REGION_GERMANY, REGION_SAARLAND, SAMPLER_UNIFORM, \
+    SAMPLE_SIZE_AUTO
+from backend.code.result_cache import ResultCache
 
 
+# The level of the log, DEBUG also logs the parameters and recommendations of each request.
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__, static_url_path='/static')
+# Nothing is downloaded at startup, the dataset and model are fetched by python -m backend.code.artifacts warmup.
 companies = preprocessing.get_companies(config.companies_path)
-sample_size = 10000
-recommender = LocationRecommender(companies, sample_size=sample_size)
+# SAMPLE_SIZE_AUTO uses the calibrated sample size of the tags and region (python -m backend.code.convergence),
+# and default_sample_size if they are not calibrated.
+sample_size = SAMPLE_SIZE_AUTO
+default_sample_size = 10000
+# The number of processes the Monte Carlo samples are sharded across, e.g. os.cpu_count() for large sample sizes.
+workers = 1
+# How the samples are drawn, SAMPLER_ADAPTIVE reaches the same quality with far fewer samples (see sampling.py).
+sampler = SAMPLER_UNIFORM
+# Fixed seed, such that identical requests get identical (cacheable) answers.
+seed = 0
+# Shared by all requests, but never modified by them (see LocationRecommender.recommend).
+recommender = LocationRecommender(companies, sample_size=default_sample_size)
+recommender.set_workers(workers)
+recommender.set_sample_size_calibration(SampleSizeCalibration.load())
+# If True, the values are evaluated on a lattice instead of Monte Carlo samples (see grid_recommender.py).
+use_grid_search = False
+query_recommender = GridRecommender(recommender) if use_grid_search else recommender
+# Serves repeated requests (or requests for fewer recommendations) without rerunning the Monte Carlo simulation.
+result_cache = ResultCache(max_entries=256, persist=True)
+# Runs queries in the background for the /jobs and /stream APIs, heavy (national) queries get their own lane.
+job_manager = JobManager(query_recommender, result_cache)
+# If True, the responses of /save_parameters contain a Server-Timing header with the time spent per stage.
+timing_header = True
+metrics.register_cache("results", result_cache)
+# the values cache is only opened if it is used, i.e. by the reference engine or to record values
+if not recommender.value_predictor.is_initialized() and (recommender.record_values or
+                                                        recommender.engine == ENGINE_REFERENCE):
+    metrics.register_cache("values", recommender.values)
+metrics.register_cache("distances", recommender.distances)
 
 @app.route('/')
 def index():
     return send_from_directory('templates', 'index.html')
 
 
-@app.route('/save_parameters', methods=['POST'])
-def get_recommendations():
-    # Retrieve parameters from the request
-    parameters = request.json
+def request_parameters() -> dict:
+    """
+    Returns the parameters of the request, i.e. its JSON body.
+    :raises ValueError: If the body is missing, not JSON or not a JSON object.
+    """
+    # silent, such that a missing body or a wrong content type is a bad request instead of an unsupported media type
+    parameters = request.get_json(silent=True)
+    if not isinstance(parameters, dict):
+        raise ValueError("expected a JSON object")
+    return parameters
+
+
+def query_from_parameters(parameters) -> RecommendationQuery:
     """
     parameters that we get from javascript:
         "key": value,
         "yourCompany": our company's sector,
         "selectedTargetCompanies": target companies
         "saarlandOnly": if only saarland,
+        "region": optional id of the region (see regions.names), overrides saarlandOnly,
         "maxRecommendations": number of recommendations #PS: i think we need to change its name to min recommendations
         "detailsRadius": radius specified by client
+    :raises KeyError: If a required parameter is missing.
+    :raises ValueError: If a parameter is invalid, e.g. an unknown region.
     """
-    
-    print('Parameters printed: ', parameters)
+    logger.debug("Parameters: %s", parameters)
 
     # Extract parameters
     the_target = parameters['selectedTargetCompanies']
@@ -41,24 +92,28 @@ def get_recommendations():
     #radius = int(parameters['detailsRadius'])
     max_recommendations = int(parameters['maxRecommendations'])
     saarland_only = bool(parameters['saarlandOnly'])
+    # Any federal state can be requested by its id (see regions.names), saarlandOnly is kept for the frontend.
+    region = parameters.get('region') or (REGION_SAARLAND if saarland_only else REGION_GERMANY)
+    # raises a ValueError for unknown regions
+    regions.get(region)
 
 
     # use a small sample size for testing
 
 
-    # Set the target tags, minimum distance, and radius
-    recommender.set_saarland_only(saarland_only)
-    recommender.set_target_tags(the_target)
-    recommender.set_min_recommendation_distance(min_distance)
-    #recommender.set_detailed_view_radius(radius)
-
-    # Get recommendations
-    recommendations: List[Company] = recommender.get_location_recommendations(max_companies=max_recommendations)
-
-    # Convert recommendations to JSON
-    recommendations = [company.to_map() for company in recommendations]
+    # Collect all parameters of this request in a query, the recommender itself is not modified.
+    query = RecommendationQuery(tags=the_target,
+                                region=region,
+                                delta=min_distance,
+                                k=max_recommendations,
+                                sample_size=sample_size,
+                                seed=seed,
+                                sampler=sampler)
+    return recommender.resolve(query)
 
 
+@app.route('/save_parameters', methods=['POST'])
+def get_recommendations():
     """
     recommendations should be in this format:
     {
@@ -70,32 +125,104 @@ def get_recommendations():
     }
     This returned to js and drawn on the map
     """
-    recommendations2 = [{
-        "geolocation": {
-        "latitude": 51.3396,
-        "longitude": 12.3713
-      },
-        },
-           {
-        "geolocation": {
-        "latitude": 44.1396,
-        "longitude": 18.3713
-      },
-        },
-           {
-        "geolocation": {
-        "latitude": 42.3396,
-        "longitude": 15.3713
-      },
-        },                 
-    ]
-        
+    try:
+        # Retrieve parameters from the request
+        query = query_from_parameters(request_parameters())
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"invalid parameters: {e}"}), 400
+
+    with metrics.collect_timings() as timings:
+
+        # Get recommendations
+        recommendations: List[Company] = result_cache.recommend(query_recommender, query)
+
+        # Convert recommendations to JSON
+        with metrics.stage("serialization"):
+            recommendations = [company.to_map() for company in recommendations]
+            json_recommendations = json.dumps(recommendations, indent=4)
+    logger.debug("Recommendations: %s", json_recommendations)
+
     # Return recommendations as JSON response
-    json_recommendations = json.dumps(recommendations, indent=4)
-    print(json_recommendations)
-    return json_recommendations
+    response = Response(json_recommendations, mimetype='application/json')
+    if timing_header:
+        response.headers['Server-Timing'] = metrics.server_timing(timings)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Returns the metrics (stage timings, samples evaluated, cache hits, ...) in the Prometheus text format.
+    """
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/stream', methods=['POST'])
+def stream_recommendations():
+    """
+    Streams progressive recommendations as newline delimited JSON, one state of the job per line
+    (see Job.to_map, which contains the fields of Snapshot.to_map).
+    The query runs as job (see /jobs), i.e. in the lanes and within the queue limits of the job manager.
+    The first snapshot is available after a small batch of samples, regardless of the sample size.
+    Takes the parameters of /save_parameters and optionally "earlyStop", to stop once the recommendations are stable.
+    """
+    try:
+        parameters = request_parameters()
+        query = query_from_parameters(parameters)
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"invalid parameters: {e}"}), 400
+    early_stop = bool(parameters.get('earlyStop', False))
+    try:
+        job = job_manager.submit(query, early_stop=early_stop, followed=True)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429
+
+    def generate():
+        # closing the connection closes the generator, i.e. cancels the job unless someone else waits for it
+        for state in job_manager.follow(job):
+            yield json.dumps(state) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Submits a query (same parameters as /save_parameters) and returns the job immediately.
+    The job is polled by GET /jobs/<id> until its status is done, failed or cancelled.
+    """
+    try:
+        query = query_from_parameters(request_parameters())
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"invalid parameters: {e}"}), 400
+    try:
+        job = job_manager.submit(query)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429
+    return jsonify(job.to_map()), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Returns the status, progress (samples scored) and the current recommendations of a job.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job.to_map())
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "unknown job"}), 404
+    return jsonify(job.to_map())
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Requests are served in parallel threads, which share the recommender.
+    app.run(debug=True, threaded=True)
     #set(['A', 'B', 'C'])
     #run()